@@ -0,0 +1,56 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Executável a partir de qualquer diretório: python Teste1_ANS_Integration/benchmark_conversao.py [linhas]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from conversao import apenas_digitos, valores_ptbr
+
+def cnpj_legado(serie):
+    # Expressão original de normalizar
+    return serie.astype(str).str.replace(r'\D', '', regex=True).replace('', pd.NA)
+
+def valores_legado(serie):
+    # Expressão original de normalizar
+    return pd.to_numeric(
+        serie.astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+        errors='coerce'
+    )
+
+def gerar_colunas(linhas, seed=42):
+    # REG_ANS / CNPJ formatados e valores pt-BR com e sem separador de milhar, com uma fração de lixo e vazios
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, 10**8, linhas)
+    cnpjs = [f"{x:08d}"[:2] + f".{x % 1000:03d}.{x % 777:03d}/0001-{x % 97:02d}" if x % 2 else str(x % 1000000) for x in ids]
+    inteiros = rng.integers(-10**9, 10**10, linhas)
+    centavos = rng.integers(0, 100, linhas)
+    valores = [f"{i:,}".replace(',', '.') + f",{c:02d}" if k % 3 else f"{i},{c}" for k, (i, c) in enumerate(zip(inteiros, centavos))]
+    for k in range(0, linhas, 1000):
+        cnpjs[k], valores[k] = '', 'n/d'
+    return pd.Series(cnpjs, dtype=str), pd.Series(valores, dtype=str)
+
+def medir(funcao, serie, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(serie)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+if __name__ == "__main__":
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cnpjs, valores = gerar_colunas(linhas)
+
+    t_cnpj_legado, cnpj_a = medir(cnpj_legado, cnpjs)
+    t_cnpj_novo, cnpj_b = medir(apenas_digitos, cnpjs)
+    assert cnpj_a.isna().equals(cnpj_b.isna()) and (cnpj_a.dropna() == cnpj_b.dropna()).all()
+
+    t_valor_legado, valor_a = medir(valores_legado, valores)
+    t_valor_novo, valor_b = medir(valores_ptbr, valores)
+    assert valor_a.dtype == valor_b.dtype and np.array_equal(valor_a.to_numpy(), valor_b.to_numpy(), equal_nan=True)
+
+    print(f"\n{linhas} linhas (pandas {pd.__version__}), resultados idênticos às expressões originais")
+    for rotulo, legado, novo in [("CNPJ (\\D -> '')", t_cnpj_legado, t_cnpj_novo), ("Valor ('.', ',' -> '.')", t_valor_legado, t_valor_novo)]:
+        print(f"  {rotulo:<26}{legado:6.2f}s -> {novo:6.2f}s ({legado / novo:.1f}x)")
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Conversões vetorizadas sobre os buffers Arrow das colunas de texto, sem passar por objetos str do Python
+# nem pelas Series intermediárias de str.replace. Resultados idênticos às expressões pandas originais.
+
+_ZERO, _NOVE = ord('0'), ord('9')
+# [-]dígitos com no máximo uma vírgula (pontos de milhar já removidos)
+_FORMATO_SIMPLES = r'^-?(?:[0-9]+,?[0-9]*|,[0-9]+)$'
+# Até 15 dígitos, o cast do Arrow e o parser do pandas produzem exatamente o mesmo float64
+_MAX_DIGITOS = 15
+
+def _buffers(serie):
+    # Array Arrow (large_string) da série, com deslocamentos relativos ao início dos dados e os bytes
+    if not (pd.api.types.is_string_dtype(serie.dtype) or serie.dtype == object):
+        serie = serie.astype(str)
+    arr = pa.array(serie, type=pa.large_string(), from_pandas=True)
+    if isinstance(arr, pa.ChunkedArray): arr = arr.combine_chunks()
+    _, buf_offsets, buf_dados = arr.buffers()
+    offsets = np.frombuffer(buf_offsets, dtype=np.int64)[arr.offset:arr.offset + len(arr) + 1]
+    dados = np.frombuffer(buf_dados, dtype=np.uint8)[offsets[0]:offsets[-1]] if buf_dados is not None else np.zeros(0, np.uint8)
+    return arr, offsets - offsets[0], dados
+
+def apenas_digitos(serie):
+    # Equivalente a serie.astype(str).str.replace(r'\D', '', regex=True).replace('', pd.NA):
+    # mantém apenas os bytes 0-9; nulos e textos sem dígitos viram NA
+    arr, offsets, dados = _buffers(serie)
+    manter = (dados >= _ZERO) & (dados <= _NOVE)
+    acumulado = np.concatenate([[0], np.cumsum(manter, dtype=np.int64)])
+    novos_offsets = acumulado[offsets]
+    vazios = arr.is_null().to_numpy(zero_copy_only=False) | (np.diff(novos_offsets) == 0)
+    resultado = pa.LargeStringArray.from_buffers(
+        len(arr), pa.py_buffer(novos_offsets), pa.py_buffer(dados[manter].tobytes()),
+        pa.py_buffer(np.packbits(~vazios, bitorder='little').tobytes()), int(vazios.sum())
+    )
+    return resultado.to_pandas().set_axis(serie.index).rename(serie.name)
+
+def valores_ptbr(serie):
+    # Equivalente a pd.to_numeric(texto sem '.' e com ',' -> '.', errors='coerce'), inclusive no dtype:
+    # int64 quando todos os valores são inteiros, float64 caso contrário.
+    # Linhas fora do formato simples ([-]dígitos, pontos de milhar, uma vírgula) usam a expressão original.
+    arr, offsets, _ = _buffers(serie)
+    texto = pc.replace_substring(arr, '.', '') if pc.any(pc.match_substring(arr, '.')).as_py() else arr
+
+    # No formato simples todo byte é ASCII: dígitos = bytes - sinal - vírgula
+    formato = pc.fill_null(pc.match_substring_regex(texto, _FORMATO_SIMPLES), False).to_numpy(zero_copy_only=False)
+    virgula = pc.fill_null(pc.match_substring(texto, ','), False).to_numpy(zero_copy_only=False)
+    sinal = pc.fill_null(pc.starts_with(texto, '-'), False).to_numpy(zero_copy_only=False)
+    qtd_digitos = pc.binary_length(texto).to_numpy(zero_copy_only=False) - sinal - virgula
+    simples = formato & (qtd_digitos <= _MAX_DIGITOS)
+    nulo = arr.is_null().to_numpy(zero_copy_only=False) | (np.diff(offsets) == 0)
+
+    restantes = ~simples & ~nulo
+    originais = _expressao_original(serie[restantes]) if restantes.any() else pd.Series(dtype=np.int64)
+    if originais.dtype.kind not in 'if':
+        return _expressao_original(serie)
+
+    if not nulo.any() and not virgula[simples].any() and originais.dtype.kind == 'i':
+        # Só inteiros, sem nulos: to_numeric devolveria int64
+        inteiros = pc.cast(pc.if_else(pa.array(simples), texto, '0'), pa.int64()).to_numpy(zero_copy_only=False, writable=True)
+        inteiros[restantes] = originais.to_numpy()
+        return pd.Series(inteiros, index=serie.index, name=serie.name)
+
+    decimais = pc.replace_substring(pc.if_else(pa.array(simples), texto, None), ',', '.')
+    valores = pc.cast(decimais, pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+    valores[restantes] = originais.to_numpy(dtype=np.float64)
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+def _expressao_original(serie):
+    return pd.to_numeric(
+        serie.astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+        errors='coerce'
+    )
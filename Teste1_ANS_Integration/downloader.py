@@ -0,0 +1,208 @@
+import time
+import hashlib
+import logging
+import threading
+import requests
+from dataclasses import dataclass
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ResultadoDownload:
+    # Resultado de um download individual, com métricas de vazão
+    url: str
+    destino: Path
+    bytes_baixados: int = 0
+    segundos: float = 0.0
+    sucesso: bool = False
+    erro: str = ""
+    # Validadores HTTP, tamanho e hash do arquivo completo, usados pelo manifesto de ingestão incremental
+    tamanho: int = 0
+    etag: str = ""
+    last_modified: str = ""
+    sha256: str = ""
+
+    @property
+    def throughput_mb_s(self):
+        if self.segundos <= 0: return 0.0
+        return (self.bytes_baixados / (1024 * 1024)) / self.segundos
+
+@dataclass
+class MetadadosRemotos:
+    # Validadores de um arquivo remoto obtidos via HEAD, sem baixar o conteúdo
+    tamanho: int = 0
+    etag: str = ""
+    last_modified: str = ""
+
+def sha256_arquivo(path, bloco=1024 * 1024):
+    # Hash do arquivo completo, lido em blocos
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while bloco_lido := f.read(bloco):
+            h.update(bloco_lido)
+    return h.hexdigest()
+
+class MotorDownload:
+    # Downloads concorrentes com pool limitado de threads e retomada de arquivos parciais via HTTP Range
+
+    SUFIXO_PARCIAL = ".part"
+
+    def __init__(self, headers=None, max_workers=4, chunk_size=1024 * 1024, timeout=180, tentativas=3, verify=False):
+        self.headers = headers or {}
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = max(1, chunk_size)
+        self.timeout = timeout
+        self.tentativas = max(1, tentativas)
+        self.verify = verify
+        self._local = threading.local()
+
+    def _sessao(self):
+        # requests.Session não é thread-safe: cada worker mantém a sua própria sessão (keep-alive por thread)
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = requests.Session()
+            sessao.headers.update(self.headers)
+            sessao.verify = self.verify
+            self._local.sessao = sessao
+        return sessao
+
+    def baixar(self, url, destino):
+        # Baixa uma URL para o destino, retomando de onde parou em caso de timeout ou queda de conexão
+        destino = Path(destino)
+        parcial = destino.with_name(destino.name + self.SUFIXO_PARCIAL)
+        resultado = ResultadoDownload(url=url, destino=destino)
+        inicio = time.monotonic()
+
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                self._transferir(url, parcial, resultado)
+                parcial.replace(destino)
+                parcial.with_name(parcial.name + ".validador").unlink(missing_ok=True)
+                resultado.tamanho = destino.stat().st_size
+                resultado.sha256 = sha256_arquivo(destino)
+                resultado.sucesso = True
+                resultado.erro = ""
+                break
+            except (requests.RequestException, OSError) as e:
+                resultado.erro = str(e)
+                logger.warning(f"Falha ao baixar {destino.name} (tentativa {tentativa}/{self.tentativas}): {e}")
+
+        resultado.segundos = time.monotonic() - inicio
+        if resultado.sucesso:
+            logger.info(
+                f"Concluído: {destino.name} - {resultado.bytes_baixados / (1024 * 1024):.1f} MB "
+                f"em {resultado.segundos:.1f}s ({resultado.throughput_mb_s:.2f} MB/s)"
+            )
+        else:
+            logger.error(f"Download não concluído após {self.tentativas} tentativas: {destino.name}. Arquivo parcial mantido para retomada.")
+        return resultado
+
+    def _transferir(self, url, parcial, resultado):
+        # Executa uma requisição, pedindo apenas os bytes que faltam quando existe arquivo parcial.
+        # O validador (ETag ou Last-Modified) da resposta que começou o parcial fica ao lado dele e vai no If-Range:
+        # se o arquivo remoto mudou, o servidor responde 200 com o corpo novo em vez de 206.
+        validador_path = parcial.with_name(parcial.name + ".validador")
+        offset = parcial.stat().st_size if parcial.exists() else 0
+        validador = validador_path.read_text(encoding='utf-8') if offset and validador_path.exists() else ""
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        if validador: headers['If-Range'] = validador
+
+        with self._sessao().get(url, headers=headers, timeout=self.timeout, stream=True) as r:
+            if r.status_code == 416 and offset:
+                # Range fora do arquivo: o parcial já está completo ou o arquivo remoto mudou
+                total = r.headers.get('Content-Range', '').rpartition('/')[2]
+                if total.isdigit() and int(total) == offset:
+                    return
+                self._descartar_parcial(parcial, validador_path)
+                raise requests.HTTPError(f"Arquivo remoto alterado (Content-Range: {r.headers.get('Content-Range')})", response=r)
+            r.raise_for_status()
+            resultado.etag = r.headers.get('ETag', '')
+            resultado.last_modified = r.headers.get('Last-Modified', '')
+
+            # Servidores sem suporte a Range respondem 200 com o corpo completo: recomeça do zero
+            retomando = bool(offset) and r.status_code == 206
+            if retomando:
+                # Um 206 que não começa no offset pedido, ou de outra versão do arquivo (servidor que ignora If-Range),
+                # não pode ser anexado ao parcial: ele é descartado e a próxima tentativa baixa tudo sem Range
+                intervalo = r.headers.get('Content-Range', '')
+                if not intervalo.startswith(f'bytes {offset}-'):
+                    self._descartar_parcial(parcial, validador_path)
+                    raise requests.HTTPError(f"Resposta parcial fora do offset {offset} (Content-Range: {intervalo})", response=r)
+                if validador and validador not in (resultado.etag, resultado.last_modified):
+                    self._descartar_parcial(parcial, validador_path)
+                    raise requests.HTTPError(f"Arquivo remoto alterado durante a retomada ({validador})", response=r)
+                logger.info(f"Retomando {parcial.name} a partir de {offset} bytes")
+            else:
+                # ETags fracas (W/) não valem no If-Range
+                forte = resultado.etag if not resultado.etag.startswith('W/') else ""
+                validador_path.write_text(forte or resultado.last_modified, encoding='utf-8')
+
+            with open(parcial, 'ab' if retomando else 'wb') as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        resultado.bytes_baixados += len(chunk)
+
+    def _descartar_parcial(self, parcial, validador_path):
+        parcial.unlink(missing_ok=True)
+        validador_path.unlink(missing_ok=True)
+
+    def consultar(self, url):
+        # HEAD com os validadores do arquivo remoto; None se o servidor não responder
+        try:
+            r = self._sessao().head(url, timeout=self.timeout, allow_redirects=True)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Não foi possível consultar {url}: {e}")
+            return None
+        tamanho = r.headers.get('Content-Length', '')
+        return MetadadosRemotos(
+            tamanho=int(tamanho) if tamanho.isdigit() else 0,
+            etag=r.headers.get('ETag', ''),
+            last_modified=r.headers.get('Last-Modified', ''),
+        )
+
+    def consultar_todos(self, urls):
+        # Consulta os validadores de várias URLs em paralelo, devolvendo-os na ordem de entrada
+        urls = list(urls)
+        if not urls: return []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="consulta") as pool:
+            return list(pool.map(self.consultar, urls))
+
+    def baixar_em_fluxo(self, tarefas):
+        # Gera (índice, resultado) à medida que os downloads terminam.
+        # Novas tarefas só são submetidas quando o consumidor pede o próximo item (backpressure).
+        tarefas = iter(enumerate(tarefas))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="download") as pool:
+            em_andamento = {}
+
+            def submeter():
+                for indice, (url, destino) in tarefas:
+                    em_andamento[pool.submit(self.baixar, url, destino)] = indice
+                    if len(em_andamento) >= self.max_workers: break
+
+            submeter()
+            while em_andamento:
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    yield em_andamento.pop(futuro), futuro.result()
+                submeter()
+
+    def baixar_todos(self, tarefas):
+        # Baixa todas as tarefas (url, destino) no pool de threads e devolve os resultados na ordem de entrada
+        tarefas = list(tarefas)
+        if not tarefas: return []
+
+        resultados = [None] * len(tarefas)
+        inicio = time.monotonic()
+        for indice, resultado in self.baixar_em_fluxo(tarefas):
+            resultados[indice] = resultado
+
+        total = sum(r.bytes_baixados for r in resultados)
+        segundos = time.monotonic() - inicio
+        vazao = (total / (1024 * 1024)) / segundos if segundos > 0 else 0.0
+        logger.info(f"Downloads finalizados: {sum(r.sucesso for r in resultados)}/{len(resultados)} arquivos, "
+                    f"{total / (1024 * 1024):.1f} MB em {segundos:.1f}s ({vazao:.2f} MB/s agregados)")
+        return resultados
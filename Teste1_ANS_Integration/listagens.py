@@ -0,0 +1,78 @@
+import json
+import logging
+import requests
+import lxml.html
+from lxml.etree import ParserError
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def extrair_links(conteudo):
+    # Hrefs de todas as âncoras da página. lxml é bem mais rápido que o html.parser do BeautifulSoup
+    if not conteudo.strip(): return []
+    try:
+        return [str(href) for href in lxml.html.fromstring(conteudo).xpath('//a/@href')]
+    except ParserError:
+        return []
+
+class CacheListagens:
+    # Listagens de diretório do servidor da ANS, revalidadas com GET condicional (ETag/Last-Modified).
+    # Cada URL é consultada no máximo uma vez por execução; entre execuções, uma resposta 304
+    # reaproveita os links já extraídos sem baixar nem parsear a página de novo.
+
+    def __init__(self, caminho=None, headers=None, timeout=30, verify=False):
+        self.caminho = Path(caminho) if caminho else None
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.verify = verify
+        self._listagens = {}
+        self._revalidadas = set()
+        self._sessao = None
+        self._carregar()
+
+    def _carregar(self):
+        if not (self.caminho and self.caminho.exists()): return
+        try:
+            self._listagens = json.loads(self.caminho.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache de listagens ignorado: {e}")
+
+    def links(self, url):
+        # Links da listagem em `url`, vindos do cache quando o servidor confirma que nada mudou
+        entrada = self._listagens.get(url)
+        if url in self._revalidadas and entrada is not None:
+            return entrada['links']
+
+        headers = {}
+        if entrada and entrada.get('etag'): headers['If-None-Match'] = entrada['etag']
+        if entrada and entrada.get('last_modified'): headers['If-Modified-Since'] = entrada['last_modified']
+
+        if self._sessao is None:
+            self._sessao = requests.Session()
+            self._sessao.headers.update(self.headers)
+            self._sessao.verify = self.verify
+        res = self._sessao.get(url, headers=headers, timeout=self.timeout)
+
+        if res.status_code == 304 and entrada is not None:
+            logger.info(f"Listagem inalterada (cache): {url}")
+        else:
+            res.raise_for_status()
+            entrada = {
+                'etag': res.headers.get('ETag', ''),
+                'last_modified': res.headers.get('Last-Modified', ''),
+                'links': extrair_links(res.content),
+            }
+            self._listagens[url] = entrada
+            self._persistir()
+        self._revalidadas.add(url)
+        return entrada['links']
+
+    def _persistir(self):
+        # Escrita atômica, como nos demais caches em output/
+        if not self.caminho: return
+        tmp = self.caminho.with_name(self.caminho.name + '.tmp')
+        try:
+            tmp.write_text(json.dumps(self._listagens, indent=2, ensure_ascii=False), encoding='utf-8')
+            tmp.replace(self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o cache de listagens: {e}")
@@ -1,11 +1,28 @@
+import os
+import re
+import sys
+import queue
 import zipfile
 import logging
+import threading
+import multiprocessing
 import requests
 import pandas as pd
 import urllib3
 import shutil
-from pathlib import Path
-from bs4 import BeautifulSoup
+from pathlib import Path, PurePosixPath
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
+from downloader import MotorDownload
+from listagens import CacheListagens
+from manifesto import Manifesto, EntradaManifesto
+from conversao import apenas_digitos, valores_ptbr
+
+# Módulos compartilhados entre os testes ficam em comum/, na raiz do repositório (ou em /app/comum no Docker)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from comum.dialeto import CacheDialetos, AMOSTRA_BYTES
+from comum.consolidado import COLUNAS, csv_para_parquet, iterar_consolidado, marcar_status, arquivos_parquet, diretorio_particao
+from comum.esquema import dtypes_leitura
 
 # Desabilita avisos SSL apenas para a API da ANS (Bypass necessário para endpoints governamentais)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -13,133 +30,466 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _get_env_int(env_name, default_value):
+    # Obtém um valor inteiro positivo de variável de ambiente com fallback seguro
+    env_val = os.getenv(env_name)
+    if env_val is None:
+        return default_value
+    try:
+        val = int(env_val)
+        return val if val > 0 else default_value
+    except ValueError:
+        logger.warning(f"Valor inválido para {env_name} ({env_val}). Usando padrão {default_value}.")
+        return default_value
+
 class ANSIntegration:
     # Pipeline de integração com tratamento de Registro ANS, CNPJ e segurança Zip-Slip.
     BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
+    COLUNAS_SAIDA = COLUNAS
+
+    # Configurações do motor de download (configuráveis via Docker/Ambiente)
+    DOWNLOAD_WORKERS = _get_env_int("DOWNLOAD_WORKERS", 4)
+    DOWNLOAD_CHUNK_KB = _get_env_int("DOWNLOAD_CHUNK_KB", 1024)
+    DOWNLOAD_TENTATIVAS = _get_env_int("DOWNLOAD_TENTATIVAS", 3)
+    TIMEOUT_DOWNLOAD = _get_env_int("TIMEOUT_DOWNLOAD_SEG", 180)
+
+    # Configurações do pipeline download -> parse -> escrita
+    PARSE_WORKERS = _get_env_int("PARSE_WORKERS", os.cpu_count() or 1)
+    FILA_PIPELINE = _get_env_int("FILA_PIPELINE", 4)
+
+    # Leitura dos CSVs: streaming direto do ZIP (padrão) ou extração para temp/ (STREAM_ZIP=false)
+    STREAM_ZIP = os.getenv("STREAM_ZIP", "true").lower() == "true"
+    CHUNK_LINHAS = _get_env_int("CHUNK_LINHAS", 200000)
+    EXTENSOES_DADOS = ['.csv', '.txt']
+
+    # Formato do consolidado: CSV único (padrão) ou dataset Parquet particionado por Ano/Trimestre
+    FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "csv").lower()
+
+    # Descoberta de trimestres: os N mais recentes publicados no ano de referência, ou todos de um intervalo de anos
+    # (backfill). O padrão 2024 é o ano analisado por 04_queries_analiticas.sql; ANO_REFERENCIA=0 não restringe o ano
+    ULTIMOS_TRIMESTRES = _get_env_int("ULTIMOS_TRIMESTRES", 3)
+    ANO_REFERENCIA = _get_env_int("ANO_REFERENCIA", 2024)
+    ANO_INICIAL = _get_env_int("ANO_INICIAL", 0)
+    ANO_FINAL = _get_env_int("ANO_FINAL", 0)
+
+    # Ingestão incremental: REPROCESSAR=true ignora o manifesto e refaz todos os trimestres
+    REPROCESSAR = os.getenv("REPROCESSAR", "false").lower() == "true"
     
-    def __init__(self):
+    def __init__(self, base_url=None):
+        # base_url permite apontar o pipeline para um servidor HTTP local (testes/espelhos)
+        self.base_url = base_url or self.BASE_URL
         self.output_dir = Path("output")
         self.temp_dir = Path("temp")
         self.output_dir.mkdir(exist_ok=True)
         self.temp_dir.mkdir(exist_ok=True)
         self.headers = {'User-Agent': 'Mozilla/5.0'}
         self.csv_final = self.output_dir / "consolidado_despesas.csv"
-        self.dtypes = {
-            'CNPJ': str, 
-            'RazaoSocial': str, 
-            'Trimestre': str, 
-            'Ano': str, 
-            'StatusValidacao': str
-        }
+        self.parquet_final = self.output_dir / "consolidado_despesas"
+        if self.FORMATO_SAIDA not in ('csv', 'parquet'):
+            raise ValueError(f"FORMATO_SAIDA inválido: {self.FORMATO_SAIDA}. Use 'csv' ou 'parquet'.")
+        self.saida_final = self.parquet_final if self.FORMATO_SAIDA == 'parquet' else self.csv_final
+        # Índice CNPJ -> razões sociais, alimentado durante a ingestão (pares distintos por arquivo)
+        self.pares_razao = []
+        self._pares_arquivo = []
+        self.dialetos = CacheDialetos(self.output_dir / "dialetos.json")
+        # Segmentos: CSV normalizado de cada ZIP (status originais), base para remontar o consolidado
+        self.segmentos_dir = self.output_dir / "segmentos"
+        self.segmentos_dir.mkdir(exist_ok=True)
+        self.manifesto = Manifesto(self.output_dir / "manifesto.json")
+        # verify=False é utilizado devido a instabilidades de CA nos endpoints da ANS
+        self.listagens = CacheListagens(self.output_dir / "listagens.json", headers=self.headers, verify=False)
+        # verify=False é utilizado devido a instabilidades de CA nos endpoints da ANS
+        self.motor_download = MotorDownload(
+            headers=self.headers,
+            max_workers=self.DOWNLOAD_WORKERS,
+            chunk_size=self.DOWNLOAD_CHUNK_KB * 1024,
+            timeout=self.TIMEOUT_DOWNLOAD,
+            tentativas=self.DOWNLOAD_TENTATIVAS,
+            verify=False
+        )
 
     def buscar_trimestres(self):
-        # Retorna uma lista de trimestres disponíveis (ano, trimestre)
-        return [('2024', '3'), ('2024', '2'), ('2024', '1')]
+        # Descobre os trimestres publicados (ano, trimestre), do mais recente ao mais antigo, a partir das
+        # listagens do servidor. Só as páginas de ano necessárias são consultadas, cada uma uma única vez.
+        try:
+            anos = sorted({nome for href in self.listagens.links(self.base_url)
+                           if re.fullmatch(r'\d{4}', nome := PurePosixPath(urlparse(href).path).name)}, reverse=True)
+        except requests.RequestException as e:
+            logger.error(f"Erro ao listar os anos disponíveis em {self.base_url}: {e}")
+            return []
 
-    def baixar_arquivos(self, ano, trimestre):
-        # Baixa arquivos ZIP do site da ANS para o ano e trimestre especificados
-        url_ano = f"{self.BASE_URL}{ano}/"
+        intervalo = bool(self.ANO_INICIAL or self.ANO_FINAL)
+        inicial, final = (self.ANO_INICIAL, self.ANO_FINAL) if intervalo else (self.ANO_REFERENCIA, self.ANO_REFERENCIA)
+        trimestres = []
+        for ano in anos:
+            if final and int(ano) > final: continue
+            if inicial and int(ano) < inicial: break
+            try:
+                trimestres.extend(sorted(self._trimestres_do_ano(ano), key=lambda t: int(t[1]), reverse=True))
+            except requests.RequestException as e:
+                logger.error(f"Erro ao listar os trimestres de {ano}: {e}")
+                continue
+            if not intervalo and len(trimestres) >= self.ULTIMOS_TRIMESTRES: break
+
+        if not intervalo: trimestres = trimestres[:self.ULTIMOS_TRIMESTRES]
+        logger.info(f"Trimestres selecionados: {', '.join(f'{t}T{a}' for a, t in trimestres) or 'nenhum'}")
+        return trimestres
+
+    def _trimestres_do_ano(self, ano):
+        # Trimestres com ao menos um ZIP no padrão nTAAAA na listagem do ano
+        trimestres = set()
+        for href in self.listagens.links(f"{self.base_url}{ano}/"):
+            if not href.lower().endswith('.zip'): continue
+            for tri, ano_zip in re.findall(r'([1-4])T(\d{4})', Path(href).name.upper()):
+                if ano_zip == ano: trimestres.add((ano, tri))
+        return trimestres
+
+    def listar_arquivos(self, ano, trimestre):
+        # Lista os ZIPs do trimestre no índice do ano, retornando tuplas (url, caminho local seguro).
+        # A listagem do ano vem do cache: é baixada e parseada uma única vez para todos os trimestres.
+        url_ano = f"{self.base_url}{ano}/"
         logger.info(f"Buscando arquivos em {url_ano}...")
-        baixados = []
+        tarefas = []
+
+        padrao = f"{trimestre}T{ano}".upper()
+        temp_root = self.temp_dir.resolve()
         
-        try:
-            # verify=False é utilizado devido a instabilidades de CA nos endpoints da ANS
-            res = requests.get(url_ano, headers=self.headers, verify=False, timeout=30)
-            res.raise_for_status() 
-            
-            soup = BeautifulSoup(res.text, 'html.parser')
-            padrao = f"{trimestre}T{ano}".upper()
-            
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                if href.endswith('.zip') and padrao in href.upper():
-                    # Proteção contra Path Traversal: extrai apenas o nome base do arquivo
-                    safe_name = Path(href).name
-                    local = (self.temp_dir / f"{ano}_Q{trimestre}_{safe_name}").resolve()
-                    
-                    # Valida se o caminho resolvido permanece dentro de temp_dir
-                    temp_root = self.temp_dir.resolve()
-                    if temp_root != local and temp_root not in local.parents:
-                        logger.warning(f"Ignorando caminho potencialmente inseguro em href: {href}")
-                        continue
+        for href in self.listagens.links(url_ano):
+            if href.lower().endswith('.zip') and padrao in href.upper():
+                # Proteção contra Path Traversal: extrai apenas o nome base do arquivo
+                safe_name = Path(href).name
+                local = (self.temp_dir / f"{ano}_Q{trimestre}_{safe_name}").resolve()
+                
+                # Valida se o caminho resolvido permanece dentro de temp_dir
+                if temp_root != local and temp_root not in local.parents:
+                    logger.warning(f"Ignorando caminho potencialmente inseguro em href: {href}")
+                    continue
 
-                    logger.info(f"Baixando: {safe_name}")
-                    
-                    with requests.get(url_ano + href, headers=self.headers, verify=False, timeout=180, stream=True) as r:
-                        r.raise_for_status()
-                        with open(local, 'wb') as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                if chunk: f.write(chunk)
-                    baixados.append(local)
-            return baixados
-        except Exception as e:
-            logger.error(f"Erro no download: {e}")
-            return []
+                tarefas.append((url_ano + href, local))
+        return tarefas
+
+    def baixar_arquivos(self, ano, trimestre):
+        # Baixa arquivos ZIP do site da ANS para o ano e trimestre especificados
+        return self.baixar_todos([(ano, trimestre)]).get((ano, trimestre), [])
+
+    def baixar_todos(self, trimestres):
+        # Baixa os ZIPs de todos os trimestres em paralelo, com pool limitado de workers
+        tarefas = []
+        for ano, trimestre in trimestres:
+            try:
+                tarefas.extend(((ano, trimestre), url, local) for url, local in self.listar_arquivos(ano, trimestre))
+            except requests.RequestException as e:
+                logger.error(f"Erro ao listar arquivos de {trimestre}T{ano}: {e}")
+
+        resultados = self.motor_download.baixar_todos((url, local) for _, url, local in tarefas)
+
+        baixados = {(ano, trimestre): [] for ano, trimestre in trimestres}
+        for (chave, _, _), resultado in zip(tarefas, resultados):
+            if resultado.sucesso:
+                baixados[chave].append(resultado.destino)
+        return baixados
 
     def processar_e_salvar_incremental(self, zip_path, ano, trimestre):
         # Processa o arquivo ZIP e salva os dados no CSV final de forma incremental
+        parcial, _, pares = self.processar_zip(zip_path, ano, trimestre)
+        self.anexar_ao_consolidado(parcial, ano, trimestre)
+        self.registrar_pares_razao(pares)
+
+    def processar_zip(self, zip_path, ano, trimestre):
+        # Normaliza um ZIP, gravando o resultado em um CSV parcial (sem cabeçalho) em temp/.
+        # Não toca no CSV final, por isso pode rodar em paralelo em processos distintos.
+        # Retorna também os pares distintos (CNPJ, RazaoSocial) vistos, para o índice de duplicados.
         logger.info(f"Processando incrementalmente: {zip_path.name}")
         extract_path = self.temp_dir / zip_path.stem
+        parcial = self.temp_dir / f"{zip_path.stem}.normalizado.csv"
+        linhas = 0
+        self._pares_arquivo = []
         
         try:
+            if parcial.exists(): parcial.unlink()
             with zipfile.ZipFile(zip_path, 'r') as z:
-                base_path = extract_path.resolve()
-                for member in z.infolist():
-                    member_path = (extract_path / member.filename).resolve()
-                    # Proteção Zip-Slip com Logging
-                    if base_path not in member_path.parents and member_path != base_path:
-                        logger.warning(f"Proteção Zip-Slip: ignorando membro suspeito '{member.filename}'")
-                        continue
-                    z.extract(member, extract_path)
-                
-                for f in extract_path.rglob('*'):
-                    if f.suffix.lower() in ['.csv', '.txt']:
-                        df = self.ler_arquivo_resiliente(f, ano, trimestre)
-                        if not df.empty:
-                            header = not self.csv_final.exists()
-                            df.to_csv(self.csv_final, mode='a', index=False, header=header, encoding='utf-8')
+                membros = self._membros_seguros(z, extract_path)
+
+                if self.STREAM_ZIP:
+                    # Lê os membros direto do ZIP, sem gravar a versão descompactada em disco
+                    for member in membros:
+                        if not member.is_dir() and Path(member.filename).suffix.lower() in self.EXTENSOES_DADOS:
+                            linhas += self.normalizar_em_chunks(lambda m=member: z.open(m), member.filename, ano, trimestre, parcial)
+                else:
+                    for member in membros:
+                        z.extract(member, extract_path)
+                    
+                    for f in extract_path.rglob('*'):
+                        if f.suffix.lower() in self.EXTENSOES_DADOS:
+                            linhas += self.ler_arquivo_resiliente(f, ano, trimestre, parcial)
         finally:
             if extract_path.exists(): shutil.rmtree(extract_path)
             if zip_path.exists(): zip_path.unlink()
+        pares = self._compactar_pares(self._pares_arquivo)
+        self._pares_arquivo = []
+        return parcial, linhas, pares
+
+    def _membros_seguros(self, z, extract_path):
+        # Proteção Zip-Slip com Logging: descarta membros cujo caminho escaparia do diretório de extração.
+        # Aplicada também no modo streaming, para que nomes suspeitos nunca sejam processados.
+        base_path = extract_path.resolve()
+        membros = []
+        for member in z.infolist():
+            member_path = (extract_path / member.filename).resolve()
+            if base_path not in member_path.parents and member_path != base_path:
+                logger.warning(f"Proteção Zip-Slip: ignorando membro suspeito '{member.filename}'")
+                continue
+            membros.append(member)
+        return membros
+
+    def normalizar_em_chunks(self, abrir, nome, ano, trimestre, parcial):
+        # Lê o arquivo em chunks com o dialeto detectado (ou em cache) e anexa cada chunk normalizado ao parcial.
+        # As colunas de origem são resolvidas uma única vez, a partir do cabeçalho. Se o dialeto falhar no meio
+        # do arquivo, o que ele já gravou no parcial é descartado e o próximo candidato é testado.
+        inicio = parcial.stat().st_size if parcial.exists() else 0
+
+        def amostra():
+            with abrir() as stream:
+                return stream.read(AMOSTRA_BYTES)
+
+        for dialeto in self.dialetos.candidatos(nome, amostra):
+            enc, sep = dialeto.encoding, dialeto.sep
+            linhas = 0
+            pares = []
+            try:
+                with abrir() as stream:
+                    leitor = pd.read_csv(stream, sep=sep, encoding=enc, on_bad_lines='skip', dtype=str, chunksize=self.CHUNK_LINHAS)
+                    cabecalho = None
+                    for chunk in leitor:
+                        if cabecalho is None:
+                            cabecalho = list(chunk.columns)
+                            if len(cabecalho) <= 1: break
+                            colunas = self.resolver_colunas(cabecalho)
+                            # Dialeto correto, mas o arquivo não tem as colunas de interesse: nada a gravar
+                            if colunas is None: break
+                        df = self.normalizar(chunk, ano, trimestre, colunas)
+                        if not df.empty:
+                            df.to_csv(parcial, mode='a', index=False, header=False, encoding='utf-8')
+                            linhas += len(df)
+                            pares.append(df[['CNPJ', 'RazaoSocial']].drop_duplicates())
+                    if cabecalho is not None and len(cabecalho) > 1:
+                        self.dialetos.registrar(nome, dialeto)
+                        # Só entram no índice os pares de uma leitura bem-sucedida
+                        self._pares_arquivo.extend(pares)
+                        return linhas
+            except (UnicodeDecodeError, pd.errors.ParserError):
+                pass
+            except Exception as e:
+                # Não silencia interrupções de sistema e registra outros erros
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+                logger.warning(f"Erro inesperado ao ler {nome} (enc={enc}, sep={sep}): {e}")
+            self._truncar(parcial, inicio)
+
+        logger.error(f"Falha total ao processar o arquivo: {nome}. Verifique se o formato é suportado.")
+        return 0
+
+    def _truncar(self, path, tamanho):
+        # Restaura o arquivo ao tamanho anterior, descartando escritas de uma tentativa que falhou
+        if path.exists() and path.stat().st_size > tamanho:
+            with open(path, 'r+b') as f:
+                f.truncate(tamanho)
+
+    def anexar_ao_consolidado(self, parcial, ano=None, trimestre=None):
+        # Único ponto de escrita no consolidado: anexa o parcial normalizado ao CSV final
+        # (ou o converte em um arquivo da partição Ano/Trimestre) e o remove
+        if not parcial.exists(): return
+        if self.FORMATO_SAIDA == 'parquet':
+            nome = parcial.name.removesuffix('.normalizado.csv')
+            csv_para_parquet(parcial, self.parquet_final, ano, trimestre, nome)
+            parcial.unlink()
+            return
+        header = not self.csv_final.exists()
+        with open(self.csv_final, 'a', encoding='utf-8', newline='') as destino:
+            if header: destino.write(','.join(self.COLUNAS_SAIDA) + os.linesep)
+            with open(parcial, 'r', encoding='utf-8', newline='') as origem:
+                shutil.copyfileobj(origem, destino, 1024 * 1024)
+        parcial.unlink()
+
+    def executar_pipeline(self, trimestres):
+        # Pipeline produtor/consumidor: downloads (threads) -> parse (processos) -> registro dos segmentos (thread única).
+        # Filas limitadas evitam acumular ZIPs em disco quando o parse fica para trás. ZIPs que não mudaram
+        # desde a última execução (manifesto) não são baixados nem processados.
+        # Retorna os nomes dos ZIPs publicados, na ordem em que entram no consolidado.
+        tarefas, listados = [], set()
+        for ano, trimestre in trimestres:
+            try:
+                arquivos = self.listar_arquivos(ano, trimestre)
+                tarefas.extend((ano, trimestre, url, local) for url, local in arquivos)
+                # Listagem vazia pode ser uma página de erro do servidor: não remove o que já foi ingerido
+                if arquivos: listados.add((ano, trimestre))
+            except requests.RequestException as e:
+                logger.error(f"Erro ao listar arquivos de {trimestre}T{ano}: {e}")
+        nomes = [local.name for _, _, _, local in tarefas]
+
+        # ZIPs que sumiram de um trimestre listado com sucesso saem do consolidado
+        for entrada in self.manifesto.entradas():
+            if (entrada.ano, entrada.trimestre) in listados and entrada.nome not in nomes:
+                logger.info(f"{entrada.nome} não está mais publicado: removendo do consolidado")
+                self.remover_segmento(entrada.nome)
+
+        a_baixar, remotos = self.filtrar_alterados(tarefas)
+        if not a_baixar: return nomes
 
-    def ler_arquivo_resiliente(self, path, ano, trimestre):
-        # Tenta ler o arquivo com várias combinações de encoding e separadores
-        for enc in ['utf-8', 'iso-8859-1', 'cp1252']:
-            for sep in [';', ',', '\t']:
+        fila_downloads = queue.Queue(maxsize=self.FILA_PIPELINE)
+        fila_escrita = queue.Queue(maxsize=self.FILA_PIPELINE)
+        # Limita ZIPs baixados aguardando parse: ao esgotar, o produtor para de iniciar novos downloads
+        vagas_parse = threading.BoundedSemaphore(self.PARSE_WORKERS + self.FILA_PIPELINE)
+        erros = []
+
+        def produtor():
+            try:
+                for indice, resultado in self.motor_download.baixar_em_fluxo((url, local) for _, _, url, local in a_baixar):
+                    # A vaga é reservada antes de pedir o próximo item a baixar_em_fluxo, que só submete um novo
+                    # download quando é iterado: sem vagas, nenhum download começa até um parse terminar
+                    vagas_parse.acquire()
+                    fila_downloads.put((indice, resultado))
+            except Exception as e:
+                erros.append(e)
+            finally:
+                fila_downloads.put(None)
+
+        def escritor():
+            # Guarda cada segmento e registra o ZIP no manifesto assim que o parse termina.
+            # A ordem de chegada não importa: o consolidado é montado depois, na ordem das tarefas.
+            while (item := fila_escrita.get()) is not None:
+                (ano, trimestre, url, local), resultado, futuro = item
+                if not resultado.sucesso: continue
+                # Validadores do GET; na falta deles, os obtidos no HEAD
+                remoto = remotos.get(url)
+                entrada = EntradaManifesto(
+                    nome=local.name, url=url, ano=ano, trimestre=trimestre, tamanho=resultado.tamanho,
+                    etag=resultado.etag or (remoto.etag if remoto else ""),
+                    last_modified=resultado.last_modified or (remoto.last_modified if remoto else ""),
+                    sha256=resultado.sha256
+                )
                 try:
-                    df = pd.read_csv(path, sep=sep, encoding=enc, on_bad_lines='skip', low_memory=False, dtype=str)
-                    if len(df.columns) > 1:
-                        return self.normalizar(df, ano, trimestre)
-                except (UnicodeDecodeError, pd.errors.ParserError):
-                    continue
+                    if futuro is None:
+                        # Validadores HTTP mudaram, mas o conteúdo é o mesmo: mantém o segmento existente
+                        entrada.linhas = self.manifesto.obter(local.name).linhas
+                        logger.info(f"{local.name}: conteúdo inalterado, segmento reaproveitado")
+                    else:
+                        parcial, entrada.linhas, pares = futuro.result()
+                        self.salvar_segmento(local.name, parcial, pares)
+                        logger.info(f"{entrada.linhas} linhas de {local.name} gravadas no segmento")
+                    self.manifesto.registrar(entrada)
                 except Exception as e:
-                    # Não silencia interrupções de sistema e registra outros erros
-                    if isinstance(e, (KeyboardInterrupt, SystemExit)): 
-                        raise
-                    logger.warning(f"Erro inesperado ao ler {path} (enc={enc}, sep={sep}): {e}")
-                    continue
-        
-        logger.error(f"Falha total ao processar o arquivo: {path}. Verifique se o formato é suportado.")
-        return pd.DataFrame()
+                    logger.error(f"Falha ao processar {local.name}: {e}")
+
+        # 'spawn' evita herdar via fork os locks das threads de download já em execução
+        with ProcessPoolExecutor(max_workers=self.PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_iniciar_worker) as pool:
+            t_produtor = threading.Thread(target=produtor, name="pipeline-download", daemon=True)
+            t_escritor = threading.Thread(target=escritor, name="pipeline-escrita", daemon=True)
+            t_produtor.start()
+            t_escritor.start()
+
+            while (item := fila_downloads.get()) is not None:
+                indice, resultado = item
+                ano, trimestre, _, local = a_baixar[indice]
+                futuro = None
+                if resultado.sucesso and not self._conteudo_inalterado(local.name, resultado):
+                    futuro = pool.submit(_processar_zip_worker, resultado.destino, ano, trimestre)
+                    futuro.add_done_callback(lambda _: vagas_parse.release())
+                else:
+                    # Nada a processar: a vaga reservada pelo produtor volta imediatamente
+                    vagas_parse.release()
+                fila_escrita.put((a_baixar[indice], resultado, futuro))
+
+            t_produtor.join()
+            fila_escrita.put(None)
+            t_escritor.join()
+
+        if erros: raise erros[0]
+        return nomes
+
+    def filtrar_alterados(self, tarefas):
+        # Consulta os validadores (HEAD) de cada ZIP e descarta os que batem com o manifesto.
+        # Retorna as tarefas a baixar e os validadores por URL.
+        urls = [url for _, _, url, _ in tarefas]
+        remotos = dict(zip(urls, self.motor_download.consultar_todos(urls)))
+        a_baixar = []
+        for tarefa in tarefas:
+            remoto = remotos[tarefa[2]]
+            entrada = self.manifesto.obter(tarefa[3].name)
+            if entrada and entrada.mesma_versao(remoto) and self._caminho_segmento(entrada.nome).exists():
+                continue
+            a_baixar.append(tarefa)
+        logger.info(f"{len(tarefas) - len(a_baixar)} de {len(tarefas)} ZIPs inalterados desde a última execução")
+        return a_baixar, remotos
 
-    def normalizar(self, df, ano, trimestre):
-        # Normaliza o DataFrame para o formato padrão
-        df.columns = df.columns.str.strip().str.upper()
-        col_cnpj = next((c for c in df.columns if any(x in c for x in ['CNPJ', 'REG_ANS', 'REGISTRO'])), None)
-        col_valor = next((c for c in df.columns if any(x in c for x in ['VL_SALDO', 'VALOR', 'DESPESA'])), None)
-        col_razao = next((c for c in df.columns if any(x in c for x in ['RAZAO', 'NOME', 'OPERADORA'])), None)
-
-        if col_cnpj and col_valor:
-            es_cnpj_real = 'CNPJ' in col_cnpj.upper()
-            cnpj_limpo = df[col_cnpj].astype(str).str.replace(r'\D', '', regex=True).replace('', pd.NA)
-            valor_num = pd.to_numeric(
-                df[col_valor].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False), 
-                errors='coerce'
-            )
+    def _conteudo_inalterado(self, nome, resultado):
+        # Sem validadores HTTP confiáveis, o hash do ZIP baixado decide se o parse é necessário
+        entrada = self.manifesto.obter(nome)
+        if entrada is None or entrada.sha256 != resultado.sha256: return False
+        if not self._caminho_segmento(nome).exists(): return False
+        resultado.destino.unlink()
+        return True
+
+    def _caminho_segmento(self, nome):
+        return self.segmentos_dir / f"{Path(nome).stem}.csv"
+
+    def _caminho_pares(self, nome):
+        return self.segmentos_dir / f"{Path(nome).stem}.pares.csv"
+
+    def salvar_segmento(self, nome, parcial, pares):
+        # Move o parcial normalizado para output/segmentos/ junto com seus pares (CNPJ, RazaoSocial).
+        # temp/ e output/ podem ser volumes distintos no Docker, por isso shutil.move em vez de replace.
+        pares.to_csv(self._caminho_pares(nome), index=False)
+        segmento = self._caminho_segmento(nome)
+        if parcial.exists():
+            shutil.move(parcial, segmento)
+        else:
+            # ZIP sem linhas aproveitáveis: segmento vazio marca que já foi processado
+            segmento.write_bytes(b'')
+
+    def remover_segmento(self, nome):
+        self.manifesto.remover(nome)
+        for path in (self._caminho_segmento(nome), self._caminho_pares(nome)):
+            if path.exists(): path.unlink()
+
+    def ler_arquivo_resiliente(self, path, ano, trimestre, parcial):
+        # Lê um arquivo extraído em disco, normalizando em chunks direto para o parcial
+        return self.normalizar_em_chunks(lambda: open(path, 'rb'), path.name, ano, trimestre, parcial)
+
+    def resolver_colunas(self, colunas):
+        # Identifica no cabeçalho as colunas de origem do identificador, do valor e da razão social
+        nomes = [(c, str(c).strip().upper()) for c in colunas]
+
+        def buscar(chaves):
+            return next((original for original, nome in nomes if any(x in nome for x in chaves)), None)
+
+        col_cnpj = buscar(['CNPJ', 'REG_ANS', 'REGISTRO'])
+        col_valor = buscar(['VL_SALDO', 'VALOR', 'DESPESA'])
+        if not (col_cnpj and col_valor): return None
+        return {
+            'cnpj': col_cnpj,
+            'valor': col_valor,
+            'razao': buscar(['RAZAO', 'NOME', 'OPERADORA']),
+            # Valida o tamanho apenas se a coluna de origem for um CNPJ real (14 dígitos)
+            'cnpj_real': 'CNPJ' in str(col_cnpj).strip().upper()
+        }
+
+    def normalizar(self, df, ano, trimestre, colunas=None):
+        # Normaliza o DataFrame (ou chunk) para o formato padrão.
+        # `colunas` vem de resolver_colunas e evita redetectar o cabeçalho a cada chunk.
+        if colunas is None:
+            colunas = self.resolver_colunas(df.columns)
+        if colunas:
+            col_razao = colunas['razao']
+            # Limpeza direto nos buffers Arrow (conversao.py), com a mesma semântica de NA das expressões com str.replace
+            cnpj_limpo = apenas_digitos(df[colunas['cnpj']])
+            valor_num = valores_ptbr(df[colunas['valor']])
 
             df_res = pd.DataFrame({
                 'CNPJ': cnpj_limpo,
-                'RazaoSocial': df[col_razao].astype(str).str.strip() if col_razao else "N/A",
+                # Quebras de linha dentro do nome viram espaço: o consolidado fica com um registro por linha
+                'RazaoSocial': df[col_razao].astype(str).str.replace(r'[\r\n]+', ' ', regex=True).str.strip() if col_razao else "N/A",
                 'Trimestre': str(trimestre).zfill(2),
                 'Ano': str(ano),
                 'ValorDespesas': valor_num
@@ -148,8 +498,7 @@ class ANSIntegration:
             df_res = df_res.dropna(subset=['CNPJ', 'ValorDespesas'])
             df_res['StatusValidacao'] = 'OK'
             
-            # Valida o tamanho apenas se a coluna de origem for um CNPJ real (14 dígitos)
-            if es_cnpj_real:
+            if colunas['cnpj_real']:
                 df_res.loc[df_res['CNPJ'].str.len() != 14, 'StatusValidacao'] = 'CNPJ_INVALIDO'
             
             df_res.loc[df_res['ValorDespesas'] == 0, 'StatusValidacao'] = 'VALOR_ZERADO'
@@ -159,46 +508,159 @@ class ANSIntegration:
             return df_res
         return pd.DataFrame()
     
+    def _compactar_pares(self, pares):
+        # Concatena blocos de pares (CNPJ, RazaoSocial) mantendo apenas os distintos.
+        # Marcadores de razão ausente ('N/A', vazio, 'nan') contam como uma única razão, como no CSV relido.
+        if not pares: return pd.DataFrame(columns=['CNPJ', 'RazaoSocial'])
+        df = pd.concat(pares, ignore_index=True)
+        df['RazaoSocial'] = df['RazaoSocial'].mask(df['RazaoSocial'].isin(['N/A', '', 'nan']))
+        return df.drop_duplicates(ignore_index=True)
+
+    def registrar_pares_razao(self, pares):
+        # Acrescenta ao índice os pares de um arquivo já anexado ao consolidado
+        if pares is None or pares.empty: return
+        self.pares_razao.append(pares)
+        # Compacta periodicamente para que o índice cresça com os pares distintos, não com os arquivos
+        if len(self.pares_razao) >= 16:
+            self.pares_razao = [self._compactar_pares(self.pares_razao)]
+
+    def cnpjs_multiplas_razoes(self):
+        # CNPJs com mais de uma razão social distinta, via groupby/nunique sobre o índice de pares
+        pares = self._compactar_pares(self.pares_razao)
+        if pares.empty: return set()
+        razoes = pares.groupby('CNPJ')['RazaoSocial'].nunique(dropna=False)
+        return set(razoes.index[razoes > 1])
+
+    def montar_consolidado(self, nomes):
+        # Monta o consolidado a partir dos segmentos, aplicando CNPJ_MULTIPLAS_RAZOES na mesma passada.
+        # Só reescreve o que mudou desde a última montagem. Retorna True se o consolidado foi alterado.
+        entradas = {e.nome: e for e in self.manifesto.entradas()}
+        # Trimestres que não puderam ser listados nesta execução continuam no consolidado
+        ordem = [n for n in nomes if n in entradas] + [n for n in entradas if n not in nomes]
+
+        self.pares_razao = []
+        cnpjs_por_segmento = {}
+        for nome in ordem:
+            pares = pd.read_csv(self._caminho_pares(nome), dtype=str, keep_default_na=False)
+            self.registrar_pares_razao(pares)
+            cnpjs_por_segmento[nome] = set(pares['CNPJ'])
+        cnpjs_dup = self.cnpjs_multiplas_razoes()
+        anteriores = self.manifesto.cnpjs_multiplas_razoes
+        if cnpjs_dup: logger.info(f"{len(cnpjs_dup)} CNPJs com múltiplas razões sociais")
+
+        if self.FORMATO_SAIDA == 'parquet':
+            alterado = self._montar_parquet(ordem, entradas, cnpjs_por_segmento, cnpjs_dup, anteriores)
+        elif not self.manifesto.consolidado_em_dia or cnpjs_dup != anteriores or not self.csv_final.exists():
+            self._montar_csv(ordem, cnpjs_dup)
+            alterado = True
+        else:
+            alterado = False
+
+        if not alterado: logger.info("Nenhum trimestre novo ou alterado: consolidado mantido")
+        self.manifesto.cnpjs_multiplas_razoes = cnpjs_dup
+        self.manifesto.consolidado_em_dia = True
+        self.manifesto.salvar()
+        return alterado
+
+    def _montar_csv(self, ordem, cnpjs_dup):
+        # Concatena os segmentos como bytes, trocando o status apenas nas linhas dos CNPJs afetados
+        alvo = {c.encode('ascii') for c in cnpjs_dup}
+        temp_path = self.csv_final.with_suffix('.tmp')
+        marcadas = 0
+        with open(temp_path, 'wb', buffering=1024 * 1024) as destino:
+            destino.write((','.join(self.COLUNAS_SAIDA) + os.linesep).encode('utf-8'))
+            for nome in ordem:
+                with open(self._caminho_segmento(nome), 'rb') as origem:
+                    marcadas += self._copiar_marcando(origem, destino, alvo, b'CNPJ_MULTIPLAS_RAZOES')
+        temp_path.replace(self.csv_final)
+        logger.info(f"Consolidado CSV montado a partir de {len(ordem)} segmentos ({marcadas} linhas marcadas como CNPJ_MULTIPLAS_RAZOES)")
+
+    def _montar_parquet(self, ordem, entradas, cnpjs_por_segmento, cnpjs_dup, anteriores):
+        # Regenera apenas os arquivos de segmentos novos/alterados ou cujos CNPJs marcados mudaram
+        esperados, atualizados = set(), 0
+        for nome in ordem:
+            entrada, segmento = entradas[nome], self._caminho_segmento(nome)
+            if segmento.stat().st_size == 0: continue
+            destino = diretorio_particao(self.parquet_final, entrada.ano, entrada.trimestre) / f"{Path(nome).stem}.parquet"
+            esperados.add(destino)
+            cnpjs = cnpjs_por_segmento[nome]
+            em_dia = destino.exists() and destino.stat().st_mtime >= segmento.stat().st_mtime
+            if em_dia and cnpjs & cnpjs_dup == cnpjs & anteriores: continue
+
+            csv_para_parquet(segmento, self.parquet_final, entrada.ano, entrada.trimestre, Path(nome).stem)
+            if cnpjs & cnpjs_dup:
+                marcar_status(self.parquet_final, cnpjs & cnpjs_dup, 'CNPJ_MULTIPLAS_RAZOES', arquivos=[destino])
+            atualizados += 1
+
+        for arquivo in arquivos_parquet(self.parquet_final):
+            if arquivo not in esperados:
+                arquivo.unlink()
+                atualizados += 1
+        if atualizados: logger.info(f"{atualizados} arquivos Parquet atualizados")
+        return atualizados > 0
+
     def aplicar_validacao_duplicados_incremental(self):
-        # Aplica validação de CNPJs com múltiplas razões sociais
-        if not self.csv_final.exists(): return
-        logger.info("Mapeando duplicados com tipagem estrita...")
-        
-        mapa_cnpj_raz = {}
-        chunksize = 100000 
-        
-        for chunk in pd.read_csv(self.csv_final, chunksize=chunksize, usecols=['CNPJ', 'RazaoSocial'], dtype=str):
-            for cnpj, razao in zip(chunk['CNPJ'], chunk['RazaoSocial']):
-                if pd.isna(cnpj): continue
-                if cnpj not in mapa_cnpj_raz:
-                    mapa_cnpj_raz[cnpj] = {str(razao)}
-                else:
-                    mapa_cnpj_raz[cnpj].add(str(razao))
-        
-        cnpjs_dup = {cnpj for cnpj, razoes in mapa_cnpj_raz.items() if len(razoes) > 1}
-        
-        if cnpjs_dup:
-            temp_path = self.csv_final.with_suffix('.tmp')
-            primeiro = True
-            for chunk in pd.read_csv(self.csv_final, chunksize=chunksize, dtype=self.dtypes):
-                mask = chunk['CNPJ'].isin(cnpjs_dup)
-                chunk.loc[mask, 'StatusValidacao'] = 'CNPJ_MULTIPLAS_RAZOES'
-                modo = 'w' if primeiro else 'a'
-                chunk.to_csv(temp_path, mode=modo, index=False, header=primeiro, encoding='utf-8')
-                primeiro = False
-            temp_path.replace(self.csv_final)
+        # Aplica validação de CNPJs com múltiplas razões sociais a partir do índice montado na ingestão,
+        # sem reler o consolidado. Usado quando ZIPs são anexados diretamente (processar_e_salvar_incremental).
+        if not self.saida_final.exists(): return
+        cnpjs_dup = self.cnpjs_multiplas_razoes()
+        if not cnpjs_dup: return
+        logger.info(f"{len(cnpjs_dup)} CNPJs com múltiplas razões sociais")
+
+        if self.FORMATO_SAIDA == 'parquet':
+            # Apenas os arquivos que contêm CNPJs afetados são reescritos
+            reescritos = marcar_status(self.parquet_final, cnpjs_dup, 'CNPJ_MULTIPLAS_RAZOES')
+            logger.info(f"{reescritos} arquivos Parquet atualizados")
+        else:
+            self._marcar_linhas_csv(cnpjs_dup, 'CNPJ_MULTIPLAS_RAZOES')
+
+    def _marcar_linhas_csv(self, cnpjs, status):
+        # Reescreve o CSV final trocando o status apenas nas linhas dos CNPJs afetados
+        alvo = {c.encode('ascii') for c in cnpjs}
+        temp_path = self.csv_final.with_suffix('.tmp')
+        with open(self.csv_final, 'rb') as origem, open(temp_path, 'wb', buffering=1024 * 1024) as destino:
+            destino.write(origem.readline())
+            marcadas = self._copiar_marcando(origem, destino, alvo, status.encode('ascii'))
+        temp_path.replace(self.csv_final)
+        logger.info(f"{marcadas} linhas marcadas como {status}")
+
+    def _copiar_marcando(self, origem, destino, alvo, status):
+        # Copia linhas CSV (sem cabeçalho) trocando o StatusValidacao (último campo) das linhas cujo CNPJ está
+        # em `alvo`. As demais são copiadas como bytes, sem parse nem reformatação. O CNPJ (só dígitos) é sempre
+        # o primeiro campo, sem aspas. Uma linha com aspas em número ímpar continua nas seguintes (quebra de linha
+        # num campo entre aspas, de segmentos gravados antes da normalização da razão social) e o registro é tratado
+        # inteiro. Retorna o número de linhas marcadas.
+        if not alvo:
+            shutil.copyfileobj(origem, destino, 1024 * 1024)
+            return 0
+        marcadas = 0
+        pendente = b''
+        for linha in origem:
+            if pendente or linha.count(b'"') % 2:
+                pendente += linha
+                if pendente.count(b'"') % 2: continue
+                linha, pendente = pendente, b''
+            if linha[:linha.find(b',')] in alvo:
+                conteudo = linha.rstrip(b'\r\n')
+                linha = conteudo.rpartition(b',')[0] + b',' + status + linha[len(conteudo):]
+                marcadas += 1
+            destino.write(linha)
+        destino.write(pendente)
+        return marcadas
 
     def gerar_relatorio_final(self):
         # Gera o relatório final de análise crítica
-        if not self.csv_final.exists(): return
+        if not self.saida_final.exists(): return
         logger.info("Gerando relatório final...")
         report_path = self.output_dir / "relatorio.txt"
         
         status_counts = {}
         total = 0
-        for chunk in pd.read_csv(self.csv_final, chunksize=100000, usecols=['StatusValidacao'], dtype=str):
+        for chunk in iterar_consolidado(self.saida_final, ['StatusValidacao'], chunksize=100000, dtype=dtypes_leitura(['StatusValidacao'])):
             total += len(chunk)
-            counts = chunk['StatusValidacao'].value_counts().to_dict()
+            # Coluna categórica (comum/esquema.py): ignora categorias sem ocorrências no chunk
+            counts = chunk['StatusValidacao'].value_counts()
+            counts = counts[counts > 0].to_dict()
             for s, c in counts.items():
                 status_counts[s] = status_counts.get(s, 0) + c
 
@@ -210,20 +672,42 @@ class ANSIntegration:
                 f.write(f"  {status}: {count}\n")
 
     def executar(self):
-        # Execução do pipeline completo
+        # Execução do pipeline completo (incremental: só trimestres novos ou alterados são processados)
         logger.info("INICIANDO PIPELINE TESTE 1")
-        if self.csv_final.exists(): self.csv_final.unlink()
-        for ano, tri in self.buscar_trimestres():
-            zips = self.baixar_arquivos(ano, tri)
-            for z in zips:
-                self.processar_e_salvar_incremental(z, ano, tri)
-        self.aplicar_validacao_duplicados_incremental()
+        if self.REPROCESSAR:
+            logger.info("REPROCESSAR=true: descartando manifesto e segmentos anteriores")
+            self.manifesto.limpar()
+            shutil.rmtree(self.segmentos_dir)
+            self.segmentos_dir.mkdir()
+        # Remove a saída do outro formato, evitando que o Teste 2 leia um consolidado obsoleto
+        if self.FORMATO_SAIDA == 'parquet' and self.csv_final.exists(): self.csv_final.unlink()
+        if self.FORMATO_SAIDA == 'csv' and self.parquet_final.exists(): shutil.rmtree(self.parquet_final)
+
+        nomes = self.executar_pipeline(self.buscar_trimestres())
+        alterado = self.montar_consolidado(nomes)
         self.gerar_relatorio_final()
-        if self.csv_final.exists():
-            zip_out = self.output_dir / "consolidado_despesas.zip"
+
+        zip_out = self.output_dir / "consolidado_despesas.zip"
+        if not alterado and zip_out.exists(): return
+        if self.FORMATO_SAIDA == 'parquet' and self.parquet_final.exists():
+            # Parquet já é comprimido: os arquivos são apenas armazenados no ZIP
+            with zipfile.ZipFile(zip_out, 'w', zipfile.ZIP_STORED) as zf:
+                for arquivo in arquivos_parquet(self.parquet_final):
+                    zf.write(arquivo, arquivo.relative_to(self.output_dir))
+        elif self.csv_final.exists():
             with zipfile.ZipFile(zip_out, 'w', zipfile.ZIP_DEFLATED) as zf:
                 zf.write(self.csv_final, self.csv_final.name)
 
+_WORKER = {}
+
+def _iniciar_worker():
+    # Executado uma vez em cada processo do pool: objetos com threads/sessões HTTP não são serializáveis, então
+    # cada processo monta a sua própria instância, reaproveitada (com o cache de dialetos) em todas as tarefas
+    _WORKER['integracao'] = ANSIntegration()
+
+def _processar_zip_worker(zip_path, ano, trimestre):
+    return _WORKER['integracao'].processar_zip(zip_path, ano, trimestre)
+
 if __name__ == "__main__":
     ANSIntegration().executar()
     
\ No newline at end of file
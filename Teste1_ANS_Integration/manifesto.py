@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass, asdict, fields
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class EntradaManifesto:
+    # Estado de um ZIP já processado: validadores HTTP, hash do conteúdo e linhas geradas
+    nome: str
+    url: str
+    ano: str
+    trimestre: str
+    tamanho: int = 0
+    etag: str = ""
+    last_modified: str = ""
+    sha256: str = ""
+    linhas: int = 0
+
+    def mesma_versao(self, remoto):
+        # Compara com os validadores do HEAD: tamanho e ETag (ou Last-Modified, na falta dele)
+        if remoto is None or not remoto.tamanho or remoto.tamanho != self.tamanho: return False
+        if remoto.etag and self.etag: return remoto.etag == self.etag
+        if remoto.last_modified and self.last_modified: return remoto.last_modified == self.last_modified
+        return False
+
+class Manifesto:
+    # Manifesto da ingestão incremental (output/manifesto.json): um registro por ZIP processado
+    # e o conjunto de CNPJs marcados na última montagem do consolidado.
+
+    # Incrementar quando a normalização mudar: um manifesto de outra versão força o reprocessamento completo
+    VERSAO = 1
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self.cnpjs_multiplas_razoes = set()
+        # Falso entre o registro de um ZIP e a montagem seguinte: sobrevive a uma execução interrompida
+        self.consolidado_em_dia = False
+        self._carregar()
+
+    def _carregar(self):
+        if not self.caminho.exists(): return
+        try:
+            dados = json.loads(self.caminho.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifesto ilegível, reprocessando tudo: {e}")
+            return
+        if dados.get('versao') != self.VERSAO:
+            logger.info(f"Manifesto da versão {dados.get('versao')} descartado (atual: {self.VERSAO})")
+            return
+        campos = {f.name for f in fields(EntradaManifesto)}
+        self._entradas = {
+            e['nome']: EntradaManifesto(**{k: v for k, v in e.items() if k in campos})
+            for e in dados.get('arquivos', [])
+        }
+        self.cnpjs_multiplas_razoes = set(dados.get('cnpjs_multiplas_razoes', []))
+        self.consolidado_em_dia = dados.get('consolidado_em_dia', False)
+
+    def obter(self, nome):
+        with self._lock:
+            return self._entradas.get(nome)
+
+    def entradas(self):
+        with self._lock:
+            return list(self._entradas.values())
+
+    def registrar(self, entrada):
+        with self._lock:
+            self._entradas[entrada.nome] = entrada
+            self.consolidado_em_dia = False
+            self._persistir()
+
+    def remover(self, nome):
+        with self._lock:
+            if self._entradas.pop(nome, None) is not None:
+                self.consolidado_em_dia = False
+                self._persistir()
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.cnpjs_multiplas_razoes = set()
+            self.consolidado_em_dia = False
+            self._persistir()
+
+    def salvar(self):
+        with self._lock:
+            self._persistir()
+
+    def _persistir(self):
+        # Escrita atômica: uma interrupção nunca deixa o manifesto pela metade
+        dados = {
+            'versao': self.VERSAO,
+            'arquivos': [asdict(e) for e in self._entradas.values()],
+            'cnpjs_multiplas_razoes': sorted(self.cnpjs_multiplas_razoes),
+            'consolidado_em_dia': self.consolidado_em_dia,
+        }
+        tmp = self.caminho.with_name(self.caminho.name + '.tmp')
+        try:
+            tmp.write_text(json.dumps(dados, indent=2, ensure_ascii=False), encoding='utf-8')
+            tmp.replace(self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o manifesto: {e}")
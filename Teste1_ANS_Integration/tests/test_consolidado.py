@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste1_ANS_Integration/tests
+TESTE1 = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(TESTE1.parent))
+sys.path.insert(0, str(TESTE1))
+from comum.consolidado import csv_para_parquet
+from main import ANSIntegration
+
+# Segmento gravado antes da normalização da razão social: quebra de linha dentro de um campo entre aspas
+SEGMENTO = (
+    b'11222333000181,"ACME\r\nSAUDE, LTDA",03,2024,100.0,OK\r\n'
+    b'22333444000190,OUTRA,03,2024,50.0,OK\r\n'
+    b'11222333000181,ACME SAUDE LTDA,03,2024,25.0,OK\r\n'
+)
+
+class TestConsolidadoComQuebraDeLinha(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = Path(tempfile.mkdtemp())
+        os.chdir(self.dir)
+        self.integracao = ANSIntegration()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_normalizar_remove_quebras_da_razao_social(self):
+        df = pd.DataFrame({'CNPJ': ['11222333000181'], 'RAZAO_SOCIAL': [' ACME\r\nSAUDE\nLTDA '], 'VL_SALDO_FINAL': ['100,00']})
+        res = self.integracao.normalizar(df, '2024', '3')
+        self.assertEqual(res['RazaoSocial'].tolist(), ['ACME SAUDE LTDA'])
+        self.assertEqual(res.to_csv(index=False, header=False, lineterminator='\n').count('\n'), 1)
+
+    def test_marcacao_trata_o_registro_inteiro(self):
+        destino = io.BytesIO()
+        marcadas = self.integracao._copiar_marcando(io.BytesIO(SEGMENTO), destino, {b'11222333000181'}, b'CNPJ_MULTIPLAS_RAZOES')
+        df = pd.read_csv(io.BytesIO(destino.getvalue()), header=None, names=ANSIntegration.COLUNAS_SAIDA, dtype=str)
+        self.assertEqual(marcadas, 2)
+        self.assertEqual(df['RazaoSocial'].tolist(), ['ACME\r\nSAUDE, LTDA', 'OUTRA', 'ACME SAUDE LTDA'])
+        self.assertEqual(df['StatusValidacao'].tolist(), ['CNPJ_MULTIPLAS_RAZOES', 'OK', 'CNPJ_MULTIPLAS_RAZOES'])
+
+    def test_parquet_de_segmento_com_quebra_de_linha(self):
+        # Vários blocos de leitura: o chunker do Arrow não pode cortar um registro na quebra de linha entre aspas
+        segmento = self.dir / "segmento.csv"
+        segmento.write_bytes(SEGMENTO * 1000)
+        destino = csv_para_parquet(segmento, self.dir / "parquet", '2024', '3', 'segmento', bloco_bytes=4096)
+        tabela = pq.read_table(destino)
+        self.assertEqual(tabela.column('RazaoSocial').to_pylist(), ['ACME\r\nSAUDE, LTDA', 'OUTRA', 'ACME SAUDE LTDA'] * 1000)
+        self.assertEqual(tabela.column('ValorDespesas').to_pylist(), [100.0, 50.0, 25.0] * 1000)
+
+if __name__ == "__main__":
+    unittest.main()
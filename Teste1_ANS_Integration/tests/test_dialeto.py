@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+import multiprocessing
+import pandas as pd
+from pathlib import Path
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste1_ANS_Integration/tests
+TESTE1 = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(TESTE1.parent))
+sys.path.insert(0, str(TESTE1))
+from comum.dialeto import CacheDialetos, Dialeto
+from main import ANSIntegration
+
+CSV_DEMONSTRACOES = "REG_ANS;RAZAO_SOCIAL;VL_SALDO_FINAL\n123456;AÇÃO SAÚDE LTDA;1000,50\n"
+
+def registrar_lote(caminho, processo, quantidade):
+    # Cada processo carrega o cache uma vez, como um worker de parse, e regista padrões próprios
+    cache = CacheDialetos(Path(caminho))
+    for i in range(quantidade):
+        cache.registrar(f"fonte_{chr(97 + processo)}_{chr(97 + i % 26)}{chr(97 + i // 26)}.csv", Dialeto('utf-8', ';'))
+
+class TestCacheDialetosEntreProcessos(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.caminho = self.dir / "dialetos.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_registos_concorrentes_nao_se_perdem(self):
+        CacheDialetos(self.caminho).registrar("existente.csv", Dialeto('iso-8859-1', ','))
+        processos, quantidade = 4, 30
+        with multiprocessing.get_context('spawn').Pool(processos) as pool:
+            pool.starmap(registrar_lote, [(str(self.caminho), p, quantidade) for p in range(processos)])
+
+        cache = CacheDialetos(self.caminho)
+        self.assertEqual(len(cache._dialetos), processos * quantidade + 1)
+        self.assertEqual(cache.obter("existente.csv"), Dialeto('iso-8859-1', ','))
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ["dialetos.json", "dialetos.json.lock"])
+
+class TestDialetoPorFicheiro(unittest.TestCase):
+    # O cache é por padrão de nome (#t#.csv): um trimestre em latin-1 não pode decidir o encoding do seguinte
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = Path(tempfile.mkdtemp())
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_cache_nao_sobrepoe_amostra_utf8(self):
+        cache = CacheDialetos(self.dir / "dialetos.json")
+        cache.registrar("1T2024.csv", Dialeto('iso-8859-1', ';'))
+        amostra = CSV_DEMONSTRACOES.encode('utf-8')
+        self.assertEqual(cache.candidatos("2T2024.csv", lambda: amostra)[0], Dialeto('utf-8', ';'))
+        # Entre os encodings de 8 bits, que a amostra não distingue, vale o cache
+        cache.registrar("1T2024.csv", Dialeto('cp1252', ';'))
+        amostra = CSV_DEMONSTRACOES.encode('cp1252')
+        self.assertEqual(cache.candidatos("3T2024.csv", lambda: amostra)[0], Dialeto('cp1252', ';'))
+
+    def test_trimestres_latin1_e_utf8_com_o_mesmo_padrao(self):
+        integracao = ANSIntegration()
+        for trimestre, encoding in [('1', 'iso-8859-1'), ('2', 'utf-8')]:
+            caminho = integracao.temp_dir / f"{trimestre}T2024.zip"
+            with zipfile.ZipFile(caminho, 'w') as z:
+                z.writestr(f"{trimestre}T2024.csv", CSV_DEMONSTRACOES.encode(encoding))
+            parcial, linhas, _ = integracao.processar_zip(caminho, '2024', trimestre)
+            df = pd.read_csv(parcial, header=None, dtype=str, encoding='utf-8')
+            self.assertEqual((linhas, df.iloc[0, 1]), (1, 'AÇÃO SAÚDE LTDA'), encoding)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste1_ANS_Integration/tests
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from downloader import MotorDownload
+
+CONTEUDO = bytes(range(256)) * 40
+NOVO = bytes(reversed(range(256))) * 48
+
+class ServidorStub(BaseHTTPRequestHandler):
+    # Servidor HTTP local com um único arquivo. O comportamento de Range é configurado no próprio servidor:
+    # 'suporta' (206 a partir do offset pedido), 'ignora' (200 com o corpo todo) ou 'offset_errado' (206 desde 0).
+    # `cortes` encerra a conexão depois de N bytes do corpo, uma vez por item
+
+    def do_GET(self):
+        srv = self.server
+        srv.pedidos.append(dict(self.headers))
+        corpo, faixa, if_range = srv.conteudo, self.headers.get('Range'), self.headers.get('If-Range')
+        parcial = faixa and srv.modo_range != 'ignora' and not (if_range and srv.respeita_if_range and if_range != srv.etag)
+
+        inicio = 0
+        if parcial:
+            inicio = 0 if srv.modo_range == 'offset_errado' else int(faixa.split('=')[1].rstrip('-'))
+            if inicio >= len(corpo):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(corpo)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {inicio}-{len(corpo) - 1}/{len(corpo)}')
+        else:
+            self.send_response(200)
+        self.send_header('ETag', srv.etag)
+        self.send_header('Content-Length', str(len(corpo) - inicio))
+        self.end_headers()
+
+        dados = corpo[inicio:]
+        if srv.cortes:
+            self.wfile.write(dados[:srv.cortes.pop(0)])
+            self.close_connection = True
+            return
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+class TestMotorDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ServidorStub)
+        self.servidor.conteudo, self.servidor.etag = CONTEUDO, '"v1"'
+        self.servidor.modo_range, self.servidor.respeita_if_range = 'suporta', True
+        self.servidor.cortes, self.servidor.pedidos = [], []
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+        self.dir = Path(tempfile.mkdtemp())
+        self.destino = self.dir / "arquivo.zip"
+        self.parcial = self.dir / "arquivo.zip.part"
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/arquivo.zip"
+        self.motor = MotorDownload(chunk_size=512, timeout=5, tentativas=3)
+        # Sem proxies do ambiente: o stub é local
+        self.motor._sessao().trust_env = False
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        shutil.rmtree(self.dir)
+
+    def parcial_existente(self, dados, validador):
+        self.parcial.write_bytes(dados)
+        self.parcial.with_name(self.parcial.name + ".validador").write_text(validador, encoding='utf-8')
+
+    def baixar(self):
+        resultado = self.motor.baixar(self.url, self.destino)
+        self.assertTrue(resultado.sucesso, resultado.erro)
+        self.assertFalse(self.parcial.exists())
+        self.assertEqual(list(self.dir.iterdir()), [self.destino])
+        return resultado
+
+    def test_retoma_apos_queda_de_conexao(self):
+        self.servidor.cortes = [2560]
+        resultado = self.baixar()
+        self.assertEqual(self.destino.read_bytes(), CONTEUDO)
+        self.assertEqual(resultado.bytes_baixados, len(CONTEUDO))
+        retomada = self.servidor.pedidos[1]
+        self.assertEqual((retomada['Range'], retomada['If-Range']), ('bytes=2560-', '"v1"'))
+
+    def test_servidor_sem_range_recomeca_do_zero(self):
+        self.servidor.modo_range = 'ignora'
+        self.parcial_existente(CONTEUDO[:3000], '"v1"')
+        self.baixar()
+        self.assertEqual(self.destino.read_bytes(), CONTEUDO)
+        self.assertEqual(len(self.servidor.pedidos), 1)
+
+    def test_206_fora_do_offset_descarta_o_parcial(self):
+        self.servidor.modo_range = 'offset_errado'
+        self.parcial_existente(CONTEUDO[:3000], '"v1"')
+        self.baixar()
+        self.assertEqual(self.destino.read_bytes(), CONTEUDO)
+        self.assertEqual(len(self.servidor.pedidos), 2)
+        self.assertNotIn('Range', self.servidor.pedidos[1])
+
+    def test_arquivo_remoto_alterado_com_if_range(self):
+        self.servidor.conteudo, self.servidor.etag = NOVO, '"v2"'
+        self.parcial_existente(CONTEUDO[:3000], '"v1"')
+        self.baixar()
+        self.assertEqual(self.destino.read_bytes(), NOVO)
+        self.assertEqual(len(self.servidor.pedidos), 1)
+
+    def test_arquivo_remoto_alterado_sem_suporte_a_if_range(self):
+        self.servidor.conteudo, self.servidor.etag = NOVO, '"v2"'
+        self.servidor.respeita_if_range = False
+        self.parcial_existente(CONTEUDO[:3000], '"v1"')
+        self.baixar()
+        self.assertEqual(self.destino.read_bytes(), NOVO)
+        self.assertEqual(len(self.servidor.pedidos), 2)
+        self.assertNotIn('Range', self.servidor.pedidos[1])
+
+    def test_parcial_completo(self):
+        self.parcial_existente(CONTEUDO, '"v1"')
+        resultado = self.baixar()
+        self.assertEqual(self.destino.read_bytes(), CONTEUDO)
+        self.assertEqual(resultado.bytes_baixados, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import sys
+import time
+import logging
+import numpy as np
+from pathlib import Path
+
+# Executável a partir de qualquer diretório: python Teste2_Transformacao/benchmark_cnpj.py [quantidade]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from main import DataTransformation
+
+logging.disable(logging.INFO)
+
+def gerar_identificadores(transformacao, quantidade, seed=42):
+    # Mistura realista: CNPJs válidos, DV errado, dígitos repetidos, Registros ANS, tamanhos inválidos e vazios
+    rng = np.random.default_rng(seed)
+    bases = rng.integers(0, 10, size=(quantidade, 12)).astype(str)
+    ids = []
+    for i, base in enumerate(''.join(linha) for linha in bases):
+        tipo = i % 20
+        if tipo < 12:
+            ids.append(base + transformacao.calcular_digito_verificador_cnpj(base))
+        elif tipo < 15:
+            ids.append(base + f"{(int(transformacao.calcular_digito_verificador_cnpj(base)) + 1) % 100:02d}")
+        elif tipo == 15:
+            ids.append(str(i % 10) * 14)
+        elif tipo < 18:
+            ids.append(base[:6])
+        elif tipo == 18:
+            # Formatação com pontuação, como no cadastro da ANS
+            cnpj = base + transformacao.calcular_digito_verificador_cnpj(base)
+            ids.append(f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}")
+        else:
+            ids.append(base[:9] if i % 40 else ' ')
+    return np.array(ids, dtype=object)
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+if __name__ == "__main__":
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    # O construtor exige um consolidado existente; o próprio script serve como caminho válido
+    transformacao = DataTransformation(__file__)
+    ids = gerar_identificadores(transformacao, quantidade)
+
+    t_item, por_item = medir(lambda: np.array([transformacao.validar_cnpj(c)[1] for c in ids], dtype=object))
+    t_lote, em_lote = medir(transformacao.validar_cnpjs_em_lote, ids)
+    assert (por_item == em_lote).all(), "As duas validações devem produzir a mesma classificação"
+
+    classes, contagens = np.unique(em_lote, return_counts=True)
+    print(f"\n{quantidade} identificadores: " + ", ".join(f"{c}={n}" for c, n in zip(classes, contagens)))
+    print(f"  Item a item (validar_cnpj): {t_item:6.2f}s")
+    print(f"  Em lote (NumPy):            {t_lote:6.2f}s -> {t_item / t_lote:.1f}x")
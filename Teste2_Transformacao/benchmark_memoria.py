@@ -0,0 +1,32 @@
+import sys
+import logging
+import pandas as pd
+from pathlib import Path
+
+# Executável a partir de qualquer diretório: python Teste2_Transformacao/benchmark_memoria.py [consolidado]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from main import DataTransformation
+from comum.esquema import COLUNAS_CATEGORICAS, relatorio_memoria
+
+logging.disable(logging.INFO)
+
+def representacao_original(df):
+    # Tipos anteriores ao esquema compacto: só Trimestre/Ano categóricos, restantes colunas de texto como str
+    df = df.copy()
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and col not in ('Trimestre', 'Ano') and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).mask(df[col].isna())
+    return df
+
+if __name__ == "__main__":
+    caminhos = sys.argv[1:] or ['../Teste1_ANS_Integration/output/consolidado_despesas.csv', 'output/consolidado_despesas.csv',
+                                '../Teste1_ANS_Integration/output/consolidado_despesas']
+    caminho = next((p for p in caminhos if Path(p).exists()), None)
+    if caminho is None: sys.exit(f"Consolidado não encontrado: {caminhos}")
+
+    transformacao = DataTransformation(caminho)
+    depois = transformacao.validar_dados(transformacao.carregar_consolidado())
+    antes = representacao_original(depois)
+
+    print(f"\n{caminho}: {len(depois)} linhas validadas (pandas {pd.__version__}, MODO_VALORES={transformacao.MODO_VALORES})\n")
+    print(relatorio_memoria(antes, depois))
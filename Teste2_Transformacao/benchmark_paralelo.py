@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import resource
+import tempfile
+from pathlib import Path
+
+# Executável a partir de qualquer diretório: python Teste2_Transformacao/benchmark_paralelo.py [consolidado] [processos ...]
+# Com CADASTRO_CSV=<ficheiro> o enriquecimento usa esse cadastro local; sem ele, as execuções não enriquecem.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from main import DataTransformation
+
+logging.disable(logging.WARNING)
+
+SAIDAS = ['dados_validados.csv', 'dados_enriquecidos.csv', 'despesas_agregadas.csv', 'relatorio_teste2.txt']
+
+def executar(consolidado, processos, diretorio):
+    # Execução completa em `diretorio` (em série com processos = 1). Devolve o tempo total e o tempo de CPU do
+    # processo principal e dos processos do pool
+    cadastro = os.getenv("CADASTRO_CSV") and str(Path(os.getenv("CADASTRO_CSV")).resolve())
+    os.chdir(diretorio)
+    transformacao = DataTransformation(consolidado)
+    transformacao.PROCESSOS = processos
+    transformacao.baixar_dados_cadastrais = lambda: shutil.copy(cadastro, transformacao.temp_dir / "operadoras_cadastro.csv") if cadastro else None
+
+    antes = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    inicio = time.perf_counter()
+    transformacao.executar()
+    total = time.perf_counter() - inicio
+    depois = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = [(d.ru_utime + d.ru_stime) - (a.ru_utime + a.ru_stime) for a, d in zip(antes, depois)]
+    return total, cpu[0], cpu[1]
+
+if __name__ == "__main__":
+    caminhos = ['../Teste1_ANS_Integration/output/consolidado_despesas.csv', 'output/consolidado_despesas.csv']
+    consolidado = sys.argv[1] if len(sys.argv) > 1 else next((p for p in caminhos if Path(p).exists()), None)
+    if consolidado is None: sys.exit(f"Consolidado não encontrado: {caminhos}")
+    consolidado = str(Path(consolidado).resolve())
+    processos = [int(p) for p in sys.argv[2:]] or [1, 2, 4, os.cpu_count() or 1]
+
+    raiz = Path(tempfile.mkdtemp())
+    try:
+        print(f"\n{consolidado} ({os.cpu_count()} CPUs)\n")
+        print(f"  {'Processos':>9}{'Tempo':>10}{'Speedup':>10}{'CPU principal':>15}{'CPU pool':>10}{'Limite':>9}  Saída")
+        referencia = None
+        for n in dict.fromkeys(processos):
+            diretorio = raiz / f"p{n}"
+            diretorio.mkdir()
+            total, cpu_principal, cpu_pool = executar(consolidado, n, diretorio)
+            saidas = {nome: (diretorio / "output" / nome).read_bytes() for nome in SAIDAS}
+            referencia = referencia or (total, saidas)
+            # Limite de Amdahl: o trabalho do processo principal não se divide entre os processos
+            limite = (cpu_principal + cpu_pool) / cpu_principal if n > 1 else 1
+            igual = "idêntica" if saidas == referencia[1] else "DIFERENTE"
+            print(f"  {n:>9}{total:>9.1f}s{referencia[0] / total:>9.2f}x{cpu_principal:>14.1f}s{cpu_pool:>9.1f}s{limite:>8.1f}x  {igual}")
+    finally:
+        os.chdir(Path(__file__).resolve().parent)
+        shutil.rmtree(raiz)
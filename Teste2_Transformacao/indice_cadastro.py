@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def sha256_ficheiro(caminho, bloco=1024 * 1024):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+class IndiceCadastro:
+    # Índice ChaveJoin -> (Razão Social, UF) construído uma vez a partir do cadastro de operadoras.
+    # Persistido em Parquet com o hash do cadastro de origem: execuções seguintes, chunks e processos
+    # paralelos carregam as três colunas já normalizadas em vez de reler e normalizar o CSV.
+
+    # Incrementar quando a normalização das chaves mudar
+    VERSAO = "1"
+
+    def __init__(self, tabela, origem=""):
+        # tabela: DataFrame com ChaveJoin único e, se existirem no cadastro, RazaoSocialCadastro e UF
+        self.origem = origem
+        self.chaves = pd.Index(tabela['ChaveJoin'])
+        self.razoes = tabela['RazaoSocialCadastro'].to_numpy(dtype=object) if 'RazaoSocialCadastro' in tabela else None
+        self.ufs = tabela['UF'].to_numpy(dtype=object) if 'UF' in tabela else None
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def posicoes(self, chaves):
+        # Posição de cada chave no índice (-1 quando ausente): uma consulta vetorizada na tabela de hash
+        return self.chaves.get_indexer(chaves)
+
+    def valores(self, coluna, posicoes):
+        # Valores da coluna para as posições dadas, com NaN onde a chave não foi encontrada
+        valores = self.razoes if coluna == 'RazaoSocialCadastro' else self.ufs
+        encontrados = posicoes >= 0
+        resultado = np.full(len(posicoes), np.nan, dtype=object)
+        resultado[encontrados] = valores[posicoes[encontrados]]
+        return resultado
+
+    def salvar(self, caminho):
+        # Escrita atômica, com a origem e a versão nos metadados do ficheiro
+        colunas = {'ChaveJoin': self.chaves.to_numpy(dtype=object)}
+        if self.razoes is not None: colunas['RazaoSocialCadastro'] = self.razoes
+        if self.ufs is not None: colunas['UF'] = self.ufs
+        tabela = pa.table({nome: pa.array(valores, type=pa.string(), from_pandas=True) for nome, valores in colunas.items()})
+        tabela = tabela.replace_schema_metadata({'origem': self.origem, 'versao': self.VERSAO})
+
+        caminho = Path(caminho)
+        tmp = caminho.with_name(caminho.name + '.tmp')
+        try:
+            pq.write_table(tabela, tmp, compression='snappy')
+            tmp.replace(caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o índice do cadastro: {e}")
+
+    @classmethod
+    def carregar(cls, caminho, origem):
+        # Índice persistido, se tiver sido construído a partir do mesmo cadastro; None caso contrário
+        caminho = Path(caminho)
+        if not caminho.exists(): return None
+        try:
+            metadados = pq.read_schema(caminho).metadata or {}
+            if metadados.get(b'origem', b'').decode() != origem or metadados.get(b'versao', b'').decode() != cls.VERSAO:
+                return None
+            tabela = pq.read_table(caminho).to_pandas()
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"Índice do cadastro ignorado: {e}")
+            return None
+        return cls(tabela, origem)
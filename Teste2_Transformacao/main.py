@@ -1,12 +1,22 @@
 import os
+import sys
+import math
 import zipfile
 import logging
-import requests
+import multiprocessing
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Módulos partilhados entre os testes ficam em comum/, na raiz do repositório (ou em /app/comum no Docker)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from comum.dialeto import CacheDialetos, ler_amostra
+from comum.cadastro import CacheCadastro
+from comum.consolidado import eh_parquet, ler_consolidado, iterar_consolidado, blocos_consolidado, ler_bloco_consolidado
+from comum.esquema import COLUNAS_CATEGORICAS_LEITURA, dtypes_leitura, compactar, atribuir, converter_valores, valores_em_reais
+from indice_cadastro import IndiceCadastro, sha256_ficheiro
 
 # Configuração de logging para monitorização detalhada do pipeline
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,6 +34,50 @@ def _get_env_int(env_name: str, default_value: int) -> int:
         logger.warning(f"Valor inválido para {env_name} ({env_val}). Usando padrão {default_value}.")
         return default_value
 
+class AgregadorDespesas:
+    # Agregação combinável e exata por Razão Social + UF. Por grupo guarda a contagem, a soma e a soma dos
+    # quadrados dos valores em centavos, como inteiros: estados parciais de chunks ou processos diferentes
+    # combinam-se por soma, em qualquer ordem, sem guardar as linhas. Total, Média e Desvio Padrão saem dos
+    # inteiros exatos com um único arredondamento, e são os mesmos em memória, em chunks ou em paralelo.
+    CHAVES = ['RazaoSocial', 'UF']
+
+    def __init__(self):
+        self.estado = None
+
+    def adicionar(self, df):
+        # Acumula um chunk já filtrado (apenas registos agregáveis). Em float64 os valores passam a centavos
+        # como em MODO_VALORES=centavos; os quadrados são inteiros do Python (não cabem em int64)
+        if df.empty: return
+        valores = df['ValorDespesas']
+        if pd.api.types.is_integer_dtype(valores.dtype):
+            centavos = valores.to_numpy(dtype=np.int64)
+        else:
+            centavos = np.round(valores.to_numpy(dtype=np.float64) * 100).astype(np.int64)
+        quadrados = centavos.astype(object) ** 2
+        g = pd.DataFrame({'centavos': centavos, 'quadrados': quadrados}, index=df.index).groupby([df[c] for c in self.CHAVES], observed=True)
+        self.combinar(g.agg(qtd=('centavos', 'count'), soma=('centavos', 'sum'), quadrados=('quadrados', 'sum')))
+
+    def combinar(self, parcial):
+        if self.estado is None:
+            self.estado = parcial
+            return
+        a, b = self.estado.align(parcial, join='outer', fill_value=0)
+        self.estado = pd.DataFrame({'qtd': a['qtd'] + b['qtd'], 'soma': a['soma'] + b['soma'], 'quadrados': a['quadrados'] + b['quadrados']})
+
+    def resultado(self):
+        # Uma linha por grupo, em reais, antes de preencher nulos e ordenar. Divisões entre inteiros do Python
+        # são corretamente arredondadas: var = (n·Σx² − (Σx)²) / (n·(n − 1)), em centavos²
+        if self.estado is None: return pd.DataFrame()
+        qtd = self.estado['qtd'].astype('int64')
+        soma, quadrados = [int(s) for s in self.estado['soma']], [int(q) for q in self.estado['quadrados']]
+        return pd.DataFrame({
+            'TotalDespesas': [s / 100 for s in soma],
+            'MediaDespesas': [s / (100 * n) for s, n in zip(soma, qtd)],
+            'DesvioPadrao': [math.sqrt((n * q - s * s) / (10000 * n * (n - 1))) if n > 1 else np.nan
+                             for s, q, n in zip(soma, quadrados, qtd)],
+            'QtdRegistros': qtd,
+        }, index=self.estado.index).reset_index()
+
 class DataTransformation:
     # Pipeline profissional para transformação, validação e enriquecimento de dados da ANS.
 
@@ -42,6 +96,16 @@ class DataTransformation:
     # Configurações de Rede (Configuráveis via Docker/Ambiente)
     TIMEOUT_BUSCA = _get_env_int("TIMEOUT_BUSCA_SEG", 60)   # Aumentado para 60s padrão
     TIMEOUT_DOWNLOAD = _get_env_int("TIMEOUT_DOWNLOAD_SEG", 300) # Aumentado para 300s padrão
+
+    # Processamento em chunks (out-of-core): o consolidado nunca é carregado inteiro em memória
+    PROCESSAMENTO_CHUNKS = os.getenv("PROCESSAMENTO_CHUNKS", "false").lower() == "true"
+    CHUNK_LINHAS = _get_env_int("CHUNK_LINHAS", 200000)
+
+    # Processamento paralelo: blocos contíguos do consolidado lidos e processados por N processos (1 = em série)
+    PROCESSOS = _get_env_int("PROCESSOS_TRANSFORMACAO", 1)
+
+    # Representação de ValorDespesas em memória: float64 (padrão) ou centavos inteiros (somas exatas)
+    MODO_VALORES = os.getenv("MODO_VALORES", "float64").lower()
     
     def __init__(self, csv_consolidado_path):
         self.csv_consolidado = Path(csv_consolidado_path)
@@ -49,7 +113,13 @@ class DataTransformation:
         self.temp_dir = Path("temp")
         self.output_dir.mkdir(exist_ok=True)
         self.temp_dir.mkdir(exist_ok=True)
+        self.dialetos = CacheDialetos(self.output_dir / "dialetos.json")
+        # Cache na raiz do repositório (ou CACHE_CADASTRO_DIR), o mesmo do pre_import.py do Teste 3
+        self.cache_cadastro = CacheCadastro(dominio=self.ALLOWED_DOMAIN, timeout_busca=self.TIMEOUT_BUSCA,
+                                            timeout_download=self.TIMEOUT_DOWNLOAD)
         
+        if self.MODO_VALORES not in ('float64', 'centavos'):
+            raise ValueError(f"MODO_VALORES inválido: {self.MODO_VALORES}. Use 'float64' ou 'centavos'.")
         if not self.csv_consolidado.exists():
             raise FileNotFoundError(f"Ficheiro de entrada não encontrado: {csv_consolidado_path}")
 
@@ -98,6 +168,37 @@ class DataTransformation:
         
         return (True, 'CNPJ_VALIDO') if digitos_calculados == digitos_informados else (False, 'CNPJ_DV_INVALIDO')
 
+    def validar_cnpjs_em_lote(self, cnpjs):
+        # Mesma classificação de validar_cnpj para um array de identificadores, numa única passada vetorizada:
+        # os CNPJs de 14 dígitos viram uma matriz uint8 e os dois DVs saem de produtos escalares com os multiplicadores
+        brutos = pd.Series(np.asarray(cnpjs, dtype=object)).astype(str)
+        limpos = brutos.str.replace(r'[^0-9]', '', regex=True).to_numpy(dtype=object)
+        tamanho = np.fromiter(map(len, limpos), dtype=np.int64, count=len(limpos))
+
+        resultado = np.full(len(brutos), 'CNPJ_TAMANHO_INVALIDO', dtype=object)
+        resultado[tamanho == 6] = 'REGISTRO_ANS_VALIDO'
+
+        quatorze = tamanho == 14
+        if quatorze.any():
+            digitos = np.frombuffer(''.join(limpos[quatorze]).encode('ascii'), dtype=np.uint8).reshape(-1, 14) - ord('0')
+            base = digitos[:, :12].astype(np.int32)
+
+            resto1 = (base @ np.asarray(self.FIRST_DIGIT_MULTIPLIERS, dtype=np.int32)) % 11
+            dv1 = np.where(resto1 < 2, 0, 11 - resto1)
+            segundo = np.asarray(self.SECOND_DIGIT_MULTIPLIERS, dtype=np.int32)
+            resto2 = (base @ segundo[:12] + dv1 * segundo[12]) % 11
+            dv2 = np.where(resto2 < 2, 0, 11 - resto2)
+
+            classes = np.where((dv1 == digitos[:, 12]) & (dv2 == digitos[:, 13]), 'CNPJ_VALIDO', 'CNPJ_DV_INVALIDO').astype(object)
+            classes[(digitos == digitos[:, :1]).all(axis=1)] = 'CNPJ_DIGITOS_REPETIDOS'
+            resultado[quatorze] = classes
+
+        resultado[(brutos.str.strip() == '').to_numpy()] = 'CNPJ_VAZIO'
+        # Identificadores com caracteres fora do ASCII (raros) podem conter dígitos Unicode: caminho item a item
+        for i in np.flatnonzero(~brutos.str.isascii().to_numpy()):
+            resultado[i] = self.validar_cnpj(brutos.iat[i])[1]
+        return resultado
+
     def validar_dados(self, df):
         logger.info("A aplicar validações de dados e otimização de memória...")
         df = df.copy()
@@ -109,7 +210,7 @@ class DataTransformation:
             raise KeyError(f"Colunas obrigatórias ausentes: {colunas_ausentes}. Esperadas: {cols_req}")
         
         # Conversão explícita de tipos
-        df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce')
+        df['ValorDespesas'] = converter_valores(df['ValorDespesas'], self.MODO_VALORES)
         for col in ['Trimestre', 'Ano']:
             if col in df.columns: df[col] = df[col].astype('category')
         
@@ -117,79 +218,48 @@ class DataTransformation:
         df['ValidacaoValor'] = 'VALOR_VALIDO'
         mask_nulo = pd.isna(df['ValorDespesas'])
         df.loc[mask_nulo, 'ValidacaoValor'] = 'VALOR_NULO'
-        df.loc[~mask_nulo & (df['ValorDespesas'] <= 0), 'ValidacaoValor'] = 'VALOR_NAO_POSITIVO'
+        df.loc[~mask_nulo & (df['ValorDespesas'] <= 0).fillna(False), 'ValidacaoValor'] = 'VALOR_NAO_POSITIVO'
         
         # Validação de Razão Social
         df['ValidacaoRazao'] = 'RAZAO_VALIDA'
         razao_str = df['RazaoSocial'].astype(str)
         df.loc[df['RazaoSocial'].isna() | (razao_str.str.strip() == '') | (razao_str.str.lower() == 'nan'), 'ValidacaoRazao'] = 'RAZAO_VAZIA'
         
-        # Performance: Valida identificadores únicos uma única vez
+        # Performance: Valida identificadores únicos uma única vez, em lote (NumPy)
         cnpj_unicos = df['CNPJ'].dropna().unique()
-        mapa_validacao = {cnpj: self.validar_cnpj(cnpj)[1] for cnpj in cnpj_unicos}
-        df['ValidacaoCNPJ'] = df['CNPJ'].map(mapa_validacao).fillna('CNPJ_VAZIO')
+        mapa_validacao = pd.Series(self.validar_cnpjs_em_lote(cnpj_unicos), index=cnpj_unicos)
+        df['ValidacaoCNPJ'] = df['CNPJ'].map(mapa_validacao).astype(object).fillna('CNPJ_VAZIO')
         
-        return df
+        # Colunas de status como categóricas (comum/esquema.py): um código por linha em vez de uma string
+        return compactar(df, ['ValidacaoValor', 'ValidacaoRazao', 'ValidacaoCNPJ'])
 
     def baixar_dados_cadastrais(self):
+        # Cadastro de operadoras via cache local partilhado com o Teste 3: só é descarregado quando muda no servidor
         logger.info("A procurar cadastro de operadoras da ANS...")
-        
-        for tentativa, url_base in enumerate([self.BASE_URL_CADASTRO_COMPLETO, self.BASE_URL_CADASTRO_ATIVAS], 1):
-            try:
-                response = requests.get(url_base, timeout=self.TIMEOUT_BUSCA)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                csv_links = [urljoin(url_base, a['href']) for a in soup.find_all('a', href=True) if a['href'].endswith('.csv')]
-                
-                if csv_links:
-                    url_completa = csv_links[-1]
-                    
-                    # Validação estrita do domínio (netloc)
-                    if urlparse(url_completa).netloc != self.ALLOWED_DOMAIN:
-                        logger.warning(f"URL de download bloqueada (domínio não autorizado): {url_completa}")
-                        continue
-
-                    logger.info(f"A descarregar: {url_completa.split('/')[-1]}")
-                    
-                    with requests.get(url_completa, stream=True, timeout=self.TIMEOUT_DOWNLOAD) as r:
-                        r.raise_for_status()
-                        downloaded = 0
-                        local_path = self.temp_dir / "operadoras_cadastro.csv"
-                        with open(local_path, 'wb') as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                if chunk:
-                                    downloaded += len(chunk)
-                                    if downloaded > self.MAX_DOWNLOAD_SIZE:
-                                        raise ValueError(f"Ficheiro excede o limite de segurança ({self.MAX_DOWNLOAD_SIZE} bytes).")
-                                    f.write(chunk)
-                    return local_path
-            except Exception as e:
-                logger.warning(f"Falha na tentativa {tentativa}: {e}")
-                continue
-        return None
+        return self.cache_cadastro.obter([self.BASE_URL_CADASTRO_COMPLETO, self.BASE_URL_CADASTRO_ATIVAS],
+                                         self.temp_dir / "operadoras_cadastro.csv", self.MAX_DOWNLOAD_SIZE)
 
     def ler_dados_cadastrais(self, arquivo_path):
-        # Leitura robusta do ficheiro CSV com tentativas de diferentes codificações e separadores
+        # Leitura única do ficheiro CSV com o dialeto detetado numa amostra (ou em cache); restantes combinações só como fallback
         logger.info("A ler dados cadastrais...")
+        arquivo_path = Path(arquivo_path)
         erros_tentativas = []
-        for encoding in ['utf-8', 'iso-8859-1', 'cp1252']:
-            for sep in [';', ',', '\t']:
-                try:
-                    df = pd.read_csv(arquivo_path, sep=sep, encoding=encoding, low_memory=False, dtype=str)
-                    if len(df.columns) > 1: return df
-                except (pd.errors.ParserError, UnicodeDecodeError, OSError) as e:
-                    erros_tentativas.append(f"enc={encoding}, sep={repr(sep)} -> {e}")
+        for dialeto in self.dialetos.candidatos(arquivo_path.name, lambda: ler_amostra(arquivo_path)):
+            encoding, sep = dialeto.encoding, dialeto.sep
+            try:
+                df = pd.read_csv(arquivo_path, sep=sep, encoding=encoding, low_memory=False, dtype=str)
+                if len(df.columns) > 1:
+                    self.dialetos.registrar(arquivo_path.name, dialeto)
+                    return df
+            except (pd.errors.ParserError, UnicodeDecodeError, OSError) as e:
+                erros_tentativas.append(f"enc={encoding}, sep={repr(sep)} -> {e}")
         
         raise ValueError(f"Não foi possível ler o ficheiro cadastral. Tentativas: {' | '.join(erros_tentativas)}")
 
-    def enriquecer_dados(self, df_consolidado, df_cadastro):
-        # Enriquecimento de dados com informações cadastrais
-        logger.info("A enriquecer dados com informações cadastrais...")
+    def preparar_cadastro(self, df_cadastro):
+        # Reduz o cadastro às colunas de junção (ChaveJoin, RazaoSocialCadastro, UF), sem chaves duplicadas.
+        # Retorna None se o cadastro não tiver identificadores utilizáveis.
         df_cadastro.columns = df_cadastro.columns.str.strip().str.upper()
-        
-        # Remove coluna '_merge' se já existir para evitar conflitos no join
-        if '_merge' in df_consolidado.columns: df_consolidado = df_consolidado.drop(columns=['_merge'])
 
         col_cnpj = next((c for c in df_cadastro.columns if 'CNPJ' in c), None)
         col_registro = next((c for c in df_cadastro.columns if c == 'REGISTRO_OPERADORA'), None)
@@ -198,7 +268,7 @@ class DataTransformation:
         
         if not col_registro and not col_cnpj:
             logger.error("Identificadores necessários não encontrados no cadastro.")
-            return df_consolidado
+            return None
 
         chave_src = col_registro if col_registro else col_cnpj
         campos = [(chave_src, 'ChaveJoin'), (col_razao, 'RazaoSocialCadastro'), (col_uf, 'UF')]
@@ -206,46 +276,106 @@ class DataTransformation:
         
         df_cad_slim = df_cadastro[list(renomear.keys())].rename(columns=renomear).copy()
         df_cad_slim['ChaveJoin'] = df_cad_slim['ChaveJoin'].astype(str).str.replace(r'\D', '', regex=True)
-        df_cad_slim = df_cad_slim.drop_duplicates('ChaveJoin')
-        
+        return df_cad_slim.drop_duplicates('ChaveJoin')
+
+    def obter_indice_cadastro(self, cad_path):
+        # Índice ChaveJoin -> (razão, UF) persistido em output/; só é reconstruído quando o cadastro muda
+        origem = sha256_ficheiro(cad_path)
+        caminho = self.output_dir / "cadastro_indice.parquet"
+        indice = IndiceCadastro.carregar(caminho, origem)
+        if indice is not None:
+            logger.info(f"Índice do cadastro reutilizado: {len(indice)} chaves")
+            return indice
+
+        df_cad_slim = self.preparar_cadastro(self.ler_dados_cadastrais(cad_path))
+        if df_cad_slim is None: return None
+        indice = IndiceCadastro(df_cad_slim, origem)
+        indice.salvar(caminho)
+        logger.info(f"Índice do cadastro construído: {len(indice)} chaves")
+        return indice
+
+    def enriquecer_dados(self, df_consolidado, indice):
+        # Enriquecimento de dados com informações cadastrais.
+        # Consulta vetorizada ao índice do cadastro em vez de um merge com o DataFrame cadastral completo.
+        logger.info("A enriquecer dados com informações cadastrais...")
         df_final = df_consolidado.copy()
-        df_final['ChaveJoin'] = df_final['CNPJ']
+        posicoes = indice.posicoes(df_final['CNPJ'])
         
-        df_merged = df_final.merge(df_cad_slim, on='ChaveJoin', how='left', indicator=True)
-        
-        if 'RazaoSocialCadastro' in df_merged.columns:
-            mask = (df_merged['RazaoSocial'].isin(['N/A', '']) | df_merged['RazaoSocial'].isna()) & df_merged['RazaoSocialCadastro'].notna()
-            df_merged.loc[mask, 'RazaoSocial'] = df_merged.loc[mask, 'RazaoSocialCadastro']
-            df_merged = df_merged.drop(columns=['RazaoSocialCadastro'])
+        if indice.razoes is not None:
+            razao_cadastro = indice.valores('RazaoSocialCadastro', posicoes)
+            mask = ((df_final['RazaoSocial'].isin(['N/A', '']) | df_final['RazaoSocial'].isna()) & pd.notna(razao_cadastro)).to_numpy()
+            df_final['RazaoSocial'] = atribuir(df_final['RazaoSocial'], mask, razao_cadastro[mask])
+
+        if indice.ufs is not None:
+            df_final['UF'] = pd.Series(indice.valores('UF', posicoes), index=df_final.index).fillna('XX')
+        df_final['StatusEnriquecimento'] = np.where(posicoes >= 0, 'ENRIQUECIDO', 'SEM_CADASTRO')
+        if 'UF' not in df_final.columns: df_final['UF'] = 'XX'
 
-        df_merged['StatusEnriquecimento'] = np.where(df_merged['_merge'] == 'both', 'ENRIQUECIDO', 'SEM_CADASTRO')
-        df_merged['UF'] = df_merged['UF'].fillna('XX') if 'UF' in df_merged.columns else 'XX'
+        sem_cadastro = posicoes < 0
+        if sem_cadastro.any():
+            logger.info(f"{int(sem_cadastro.sum())} de {len(df_final)} registos sem correspondência no cadastro "
+                        f"({df_final.loc[sem_cadastro, 'CNPJ'].nunique()} CNPJs/Registros ANS distintos)")
             
-        return df_merged.drop(columns=['ChaveJoin', '_merge'])
+        return compactar(df_final, ['UF', 'StatusEnriquecimento'])
 
-    def agregar_dados(self, df):
-        # Agregação de despesas por Razão Social e UF
-        logger.info("A agregar dados por Razão Social e UF...")
-        
+    def filtrar_agregaveis(self, df):
+        # Apenas registos com identificador, valor e razão social válidos entram na agregação
         mask = (df['ValidacaoCNPJ'].isin(['CNPJ_VALIDO', 'REGISTRO_ANS_VALIDO']) & 
                 (df['ValidacaoValor'] == 'VALOR_VALIDO') &
                 ~df['RazaoSocial'].isin(['N/A', '', 'nan']) & df['RazaoSocial'].notna())
-        df_v = df[mask].copy()
-        
-        if df_v.empty:
+        return df[mask]
+
+    def agregar_dados(self, df):
+        # Agregação de despesas por Razão Social e UF (o mesmo AgregadorDespesas dos modos em chunks e paralelo)
+        logger.info("A agregar dados por Razão Social e UF...")
+        agregador = AgregadorDespesas()
+        agregador.adicionar(self.filtrar_agregaveis(df))
+        return self.finalizar_agregado(agregador.resultado())
+
+    def finalizar_agregado(self, agregado):
+        # Preenche nulos e ordena pelo total, igual em todos os modos de execução. Empates no total ficam por
+        # Razão Social e UF (como texto: a ordem das categorias depende do chunk), com ordenação estável
+        if agregado.empty:
             logger.warning("Nenhum registro válido para agregação.")
-            return pd.DataFrame()
-        
-        agregado = df_v.groupby(['RazaoSocial', 'UF'], observed=True).agg(
-            TotalDespesas=('ValorDespesas', 'sum'),
-            MediaDespesas=('ValorDespesas', 'mean'),
-            DesvioPadrao=('ValorDespesas', 'std'),
-            QtdRegistros=('ValorDespesas', 'count')
-        ).reset_index()
-        
+            return agregado
         agregado[['TotalDespesas', 'MediaDespesas', 'QtdRegistros']] = agregado[['TotalDespesas', 'MediaDespesas', 'QtdRegistros']].fillna(0)
-        
-        return agregado.sort_values('TotalDespesas', ascending=False)
+        return agregado.sort_values(['TotalDespesas', 'RazaoSocial', 'UF'], ascending=[False, True, True], kind='mergesort',
+                                    key=lambda c: c if c.name == 'TotalDespesas' else c.astype(str))
+
+    def _para_saida(self, df):
+        # Os ficheiros de saída têm sempre valores em reais, qualquer que seja o MODO_VALORES em memória
+        if self.MODO_VALORES == 'float64': return df
+        return df.assign(ValorDespesas=valores_em_reais(df['ValorDespesas'], self.MODO_VALORES))
+
+    def carregar_consolidado(self):
+        # Lê o consolidado do Teste 1 em CSV ou no dataset Parquet particionado por Ano/Trimestre
+        if not eh_parquet(self.csv_consolidado):
+            return pd.read_csv(self.csv_consolidado, dtype=dtypes_leitura())
+
+        logger.info(f"A ler consolidado em Parquet: {self.csv_consolidado}")
+        return self._ajustar_tipos_parquet(ler_consolidado(self.csv_consolidado))
+
+    def ler_em_chunks(self):
+        # Lê o consolidado em chunks de CHUNK_LINHAS linhas, com os mesmos tipos de carregar_consolidado
+        # (ValorDespesas inferido pelo pandas e convertido por validar_dados, como em memória)
+        parquet = eh_parquet(self.csv_consolidado)
+        if parquet: logger.info(f"A ler consolidado em Parquet: {self.csv_consolidado}")
+        for chunk in iterar_consolidado(self.csv_consolidado, chunksize=self.CHUNK_LINHAS, dtype=dtypes_leitura()):
+            yield self._ajustar_tipos_parquet(chunk) if parquet else chunk
+
+    def ler_bloco(self, bloco):
+        # Um bloco de blocos_consolidado (lido no processo do pool), com os mesmos tipos de ler_em_chunks
+        chunk = ler_bloco_consolidado(self.csv_consolidado, bloco, dtype=dtypes_leitura())
+        return self._ajustar_tipos_parquet(chunk) if eh_parquet(self.csv_consolidado) else chunk
+
+    def _ajustar_tipos_parquet(self, df):
+        # Normaliza para os mesmos tipos que a leitura do CSV produziria
+        df['Ano'] = pd.to_numeric(df['Ano'])
+        df['Trimestre'] = pd.to_numeric(df['Trimestre'])
+        # No CSV, o marcador 'N/A' do Teste 1 e os campos vazios são lidos como nulos pelo pandas
+        for col in ['CNPJ', 'RazaoSocial']:
+            df[col] = df[col].mask(df[col].isin(['', 'N/A']))
+        return compactar(df, COLUNAS_CATEGORICAS_LEITURA)
 
     def executar(self):
         # Execução do pipeline completo
@@ -254,19 +384,25 @@ class DataTransformation:
         logger.info("="*60)
         
         try:
-            df = pd.read_csv(self.csv_consolidado, dtype={'CNPJ': str, 'RazaoSocial': str})
-            
-            df_v = self.validar_dados(df)
-            df_v.to_csv(self.output_dir / "dados_validados.csv", index=False)
-            
-            cad_path = self.baixar_dados_cadastrais()
-            df_e = self.enriquecer_dados(df_v, self.ler_dados_cadastrais(cad_path)) if cad_path else df_v
-            df_e.to_csv(self.output_dir / "dados_enriquecidos.csv", index=False)
-            
-            df_a = self.agregar_dados(df_e)
-            if not df_a.empty: df_a.to_csv(self.output_dir / "despesas_agregadas.csv", index=False)
-            
-            self.gerar_relatorio(df_v, df_e, df_a)
+            if self.PROCESSOS > 1:
+                self.executar_paralelo()
+            elif self.PROCESSAMENTO_CHUNKS:
+                self.executar_em_chunks()
+            else:
+                df = self.carregar_consolidado()
+                
+                df_v = self.validar_dados(df)
+                self._para_saida(df_v).to_csv(self.output_dir / "dados_validados.csv", index=False)
+                
+                cad_path = self.baixar_dados_cadastrais()
+                indice = self.obter_indice_cadastro(cad_path) if cad_path else None
+                df_e = self.enriquecer_dados(df_v, indice) if indice is not None else df_v
+                self._para_saida(df_e).to_csv(self.output_dir / "dados_enriquecidos.csv", index=False)
+                
+                df_a = self.agregar_dados(df_e)
+                if not df_a.empty: df_a.to_csv(self.output_dir / "despesas_agregadas.csv", index=False)
+                
+                self.gerar_relatorio(df_v, df_e, df_a)
             self.compactar_resultado()
             
             # Limpeza do diretório temporário
@@ -279,12 +415,93 @@ class DataTransformation:
             logger.exception(f"Erro fatal: {e}")
             raise
 
+    def executar_em_chunks(self):
+        # Validação, enriquecimento e escrita chunk a chunk; a agregação acumula estados parciais combináveis.
+        # O pico de memória depende de CHUNK_LINHAS e do cadastro, não do tamanho do consolidado.
+        logger.info(f"Modo em chunks: {self.CHUNK_LINHAS} linhas por chunk")
+        cad_path = self.baixar_dados_cadastrais()
+        indice = self.obter_indice_cadastro(cad_path) if cad_path else None
+
+        arq_validados = self.output_dir / "dados_validados.csv"
+        arq_enriquecidos = self.output_dir / "dados_enriquecidos.csv"
+        agregador = AgregadorDespesas()
+        total, contagens_cnpj, contagens_enriquecimento = 0, [], []
+
+        for i, chunk in enumerate(self.ler_em_chunks()):
+            df_v, df_e = self.processar_bloco(chunk, indice)
+            self._para_saida(df_v).to_csv(arq_validados, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            self._para_saida(df_e).to_csv(arq_enriquecidos, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+            agregador.adicionar(self.filtrar_agregaveis(df_e))
+            total += len(df_v)
+            contagens_cnpj.append(df_v['ValidacaoCNPJ'].value_counts())
+            contagens_enriquecimento.append(df_e['StatusEnriquecimento'].value_counts())
+            logger.info(f"Chunk {i + 1}: {total} registos processados")
+
+        self._concluir_agregacao(agregador, total, contagens_cnpj, contagens_enriquecimento)
+
+    def processar_bloco(self, chunk, indice):
+        # Validação e enriquecimento de um bloco de linhas (chunk em série ou partição num processo do pool)
+        df_v = self.validar_dados(chunk)
+        df_e = self.enriquecer_dados(df_v, indice) if indice is not None else df_v
+        return df_v, df_e
+
+    def executar_paralelo(self):
+        # O consolidado é dividido em blocos contíguos (intervalos de bytes do CSV ou row groups do Parquet) que os
+        # processos do pool leem, validam, enriquecem e pré-agregam. O processo principal não interpreta o ficheiro:
+        # só escreve as linhas devolvidas, na ordem dos blocos, e soma os estados exatos de AgregadorDespesas.
+        # Os ficheiros de saída são byte a byte os da execução em série.
+        blocos = blocos_consolidado(self.csv_consolidado, self.CHUNK_LINHAS)
+        logger.info(f"Modo paralelo: {self.PROCESSOS} processos, {len(blocos)} blocos")
+        cad_path = self.baixar_dados_cadastrais()
+        indice = self.obter_indice_cadastro(cad_path) if cad_path else None
+
+        agregador = AgregadorDespesas()
+        total, contagens_cnpj, contagens_enriquecimento = 0, [], []
+
+        # 'spawn', como no Teste 1: o índice do cadastro é enviado uma vez a cada processo na inicialização
+        with open(self.output_dir / "dados_validados.csv", 'wb') as arq_validados, \
+             open(self.output_dir / "dados_enriquecidos.csv", 'wb') as arq_enriquecidos, \
+             ProcessPoolExecutor(max_workers=self.PROCESSOS, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_iniciar_worker, initargs=(str(self.csv_consolidado), indice)) as pool:
+            for r in _em_ordem(pool, _processar_bloco_worker, blocos, 2 * self.PROCESSOS):
+                if arq_validados.tell() == 0:
+                    # Cabeçalhos gerados pelo próprio to_csv, como na escrita em série
+                    arq_validados.write(pd.DataFrame(columns=r['colunas_validados']).to_csv(index=False).encode('utf-8'))
+                    arq_enriquecidos.write(pd.DataFrame(columns=r['colunas_enriquecidos']).to_csv(index=False).encode('utf-8'))
+                arq_validados.write(r['validados'])
+                arq_enriquecidos.write(r['enriquecidos'])
+                if r['estado'] is not None: agregador.combinar(r['estado'])
+                contagens_cnpj.append(r['contagem_cnpj'])
+                contagens_enriquecimento.append(r['contagem_enriquecimento'])
+                total += r['linhas']
+                logger.info(f"{total} registos processados")
+
+        self._concluir_agregacao(agregador, total, contagens_cnpj, contagens_enriquecimento)
+
+    def _concluir_agregacao(self, agregador, total, contagens_cnpj, contagens_enriquecimento):
+        logger.info("A agregar dados por Razão Social e UF...")
+        df_a = self.finalizar_agregado(agregador.resultado())
+        if not df_a.empty: df_a.to_csv(self.output_dir / "despesas_agregadas.csv", index=False)
+
+        self._escrever_relatorio(total, self._somar_contagens(contagens_cnpj),
+                                 self._somar_contagens(contagens_enriquecimento), df_a)
+
+    def _somar_contagens(self, contagens):
+        # Soma value_counts de vários chunks, no mesmo formato de um value_counts sobre todas as linhas
+        if not contagens: return pd.Series(dtype='int64', name='count')
+        soma = pd.concat(contagens).groupby(level=0, sort=False).sum()
+        return soma.sort_values(ascending=False, kind='stable').rename_axis(contagens[0].index.name).rename('count')
+
     def gerar_relatorio(self, df_v, df_e, df_a):
         # Geração de relatório resumido
+        self._escrever_relatorio(len(df_v), df_v['ValidacaoCNPJ'].value_counts(), df_e['StatusEnriquecimento'].value_counts(), df_a)
+
+    def _escrever_relatorio(self, total, contagem_cnpj, contagem_enriquecimento, df_a):
         with open(self.output_dir / "relatorio_teste2.txt", 'w', encoding='utf-8') as f:
-            f.write(f"RELATÓRIO TESTE 2\nTotal Registros: {len(df_v)}\n\n")
-            f.write(f"VALIDAÇÃO CNPJ/ANS:\n{df_v['ValidacaoCNPJ'].value_counts().to_string()}\n\n")
-            f.write(f"STATUS ENRIQUECIMENTO:\n{df_e['StatusEnriquecimento'].value_counts().to_string()}\n\n")
+            f.write(f"RELATÓRIO TESTE 2\nTotal Registros: {total}\n\n")
+            f.write(f"VALIDAÇÃO CNPJ/ANS:\n{contagem_cnpj.to_string()}\n\n")
+            f.write(f"STATUS ENRIQUECIMENTO:\n{contagem_enriquecimento.to_string()}\n\n")
             f.write(f"AGREGAÇÃO: {len(df_a)} grupos gerados.\n")
             if not df_a.empty: f.write(f"\nTop 10:\n{df_a.head(10).to_string(index=False)}")
 
@@ -296,8 +513,42 @@ class DataTransformation:
                 if f.suffix in ['.csv', '.txt'] and f.name != zip_path.name:
                     zipf.write(f, f.name)
 
+def _em_ordem(pool, funcao, itens, em_voo):
+    # Como pool.map, mas com no máximo `em_voo` tarefas pendentes: resultados na ordem de `itens`, memória limitada
+    pendentes = deque()
+    for item in itens:
+        pendentes.append(pool.submit(funcao, item))
+        if len(pendentes) >= em_voo: yield pendentes.popleft().result()
+    while pendentes: yield pendentes.popleft().result()
+
+_WORKER = {}
+
+def _iniciar_worker(csv_consolidado_path, indice):
+    # Executado uma vez em cada processo do pool: instância própria (os caches com locks não são serializáveis)
+    logger.setLevel(logging.WARNING)
+    _WORKER['transformacao'] = DataTransformation(csv_consolidado_path)
+    _WORKER['indice'] = indice
+
+def _processar_bloco_worker(bloco):
+    transformacao = _WORKER['transformacao']
+    df_v, df_e = transformacao.processar_bloco(transformacao.ler_bloco(bloco), _WORKER['indice'])
+    agregador = AgregadorDespesas()
+    agregador.adicionar(transformacao.filtrar_agregaveis(df_e))
+    return {
+        'validados': transformacao._para_saida(df_v).to_csv(index=False, header=False).encode('utf-8'),
+        'enriquecidos': transformacao._para_saida(df_e).to_csv(index=False, header=False).encode('utf-8'),
+        'linhas': len(df_v),
+        'colunas_validados': list(df_v.columns),
+        'colunas_enriquecidos': list(df_e.columns),
+        'estado': agregador.estado,
+        'contagem_cnpj': df_v['ValidacaoCNPJ'].value_counts(),
+        'contagem_enriquecimento': df_e['StatusEnriquecimento'].value_counts(),
+    }
+
 if __name__ == "__main__":
-    caminhos = ['/app/input/consolidado_despesas.csv', '../Teste1_ANS_Integration/output/consolidado_despesas.csv', 'output/consolidado_despesas.csv']
+    caminhos = ['/app/input/consolidado_despesas.csv', '../Teste1_ANS_Integration/output/consolidado_despesas.csv', 'output/consolidado_despesas.csv',
+                # Dataset Parquet gerado pelo Teste 1 com FORMATO_SAIDA=parquet
+                '/app/input/consolidado_despesas', '../Teste1_ANS_Integration/output/consolidado_despesas', 'output/consolidado_despesas']
     csv_path = next((p for p in caminhos if os.path.exists(p)), None)
     
     if csv_path:
@@ -0,0 +1,132 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+import multiprocessing
+from pathlib import Path
+from unittest import mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste2_Transformacao/tests
+RAIZ = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(RAIZ))
+from comum.cadastro import CacheCadastro, diretorio_cache
+
+def baixar_lote(diretorio, dominio, urls):
+    # Cada processo tem a sua instância do cache, como execuções paralelas do Teste 2 e do pre_import.py
+    cache = CacheCadastro(Path(diretorio), dominio=dominio, timeout_busca=5, timeout_download=5)
+    return [cache.baixar(url, 1024 * 1024, 5)[0] for url in urls]
+
+class ServidorStub(BaseHTTPRequestHandler):
+    # Servidor HTTP local com a listagem do cadastro e os CSVs publicados, cada um com o seu ETag.
+    # Responde 304 a um If-None-Match igual ao ETag atual e regista cada pedido (caminho, validador, estado)
+
+    def do_GET(self):
+        srv = self.server
+        if self.path not in srv.arquivos:
+            self.send_error(404)
+            return
+        conteudo, etag = srv.arquivos[self.path]
+        estado = 304 if self.headers.get('If-None-Match') == etag else 200
+        srv.pedidos.append((self.path, self.headers.get('If-None-Match'), estado))
+        self.send_response(estado)
+        self.send_header('ETag', etag)
+        if estado == 304:
+            self.end_headers()
+            return
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, *args):
+        pass
+
+class TestCacheCadastro(unittest.TestCase):
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ServidorStub)
+        self.servidor.pedidos = []
+        self.publicar(b'Registro_Operadora;CNPJ\n123456;11222333000181\n', '"v1"')
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+        self.dominio = f"127.0.0.1:{self.servidor.server_port}"
+        self.url_listagem = f"http://{self.dominio}/cadastro/"
+        self.dir = Path(tempfile.mkdtemp())
+        self.destino = self.dir / "temp" / "operadoras_cadastro.csv"
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        shutil.rmtree(self.dir)
+
+    def publicar(self, csv, etag):
+        # Listagem com um CSV antigo e o atual: o cache escolhe o último pela ordem do nome
+        listagem = b'<html><body><a href="Relatorio_cadop_2023.csv">2023</a> <a href="Relatorio_cadop_2024.csv">2024</a></body></html>'
+        self.servidor.arquivos = {
+            '/cadastro/': (listagem, '"listagem"'),
+            '/cadastro/Relatorio_cadop_2023.csv': (b'antigo\n', '"antigo"'),
+            '/cadastro/Relatorio_cadop_2024.csv': (csv, etag),
+        }
+
+    def obter(self):
+        # Instância nova a cada execução, como em execuções separadas do Teste 2 / pre_import.py
+        cache = CacheCadastro(self.dir / "cache", dominio=self.dominio, timeout_busca=5, timeout_download=5)
+        self.servidor.pedidos.clear()
+        return cache.obter([self.url_listagem], self.destino, 1024 * 1024)
+
+    def test_segunda_execucao_revalida_com_304(self):
+        self.assertEqual(self.obter(), self.destino)
+        self.assertEqual([estado for _, _, estado in self.servidor.pedidos], [200, 200])
+
+        self.destino.unlink()
+        self.assertEqual(self.obter(), self.destino)
+        self.assertEqual(self.servidor.pedidos, [
+            ('/cadastro/', '"listagem"', 304),
+            ('/cadastro/Relatorio_cadop_2024.csv', '"v1"', 304),
+        ])
+        self.assertEqual(self.destino.read_bytes(), b'Registro_Operadora;CNPJ\n123456;11222333000181\n')
+
+    def test_cadastro_alterado_no_servidor(self):
+        self.obter()
+        self.publicar(b'Registro_Operadora;CNPJ\n654321;22333444000190\n', '"v2"')
+        self.obter()
+        self.assertEqual(self.servidor.pedidos[-1], ('/cadastro/Relatorio_cadop_2024.csv', '"v1"', 200))
+        self.assertEqual(self.destino.read_bytes(), b'Registro_Operadora;CNPJ\n654321;22333444000190\n')
+        # A versão anterior deixa de ser referenciada e sai do cache: restam a listagem e o CSV atual
+        self.assertEqual(len(list((self.dir / "cache" / "objetos").iterdir())), 2)
+
+    def test_processos_concorrentes_no_mesmo_cache(self):
+        processos, quantidade = 4, 8
+        base = f"http://{self.dominio}/cadastro"
+        lotes = [[f"{base}/parte_{p}_{i}.csv" for i in range(quantidade)] for p in range(processos)]
+        for lote in lotes:
+            for url in lote:
+                self.servidor.arquivos[url[len(f"http://{self.dominio}"):]] = (url.encode() + b'\n', f'"{url}"')
+
+        with multiprocessing.get_context('spawn').Pool(processos) as pool:
+            hashes = pool.starmap(baixar_lote, [(str(self.dir / "cache"), self.dominio, lote) for lote in lotes])
+
+        # Nenhum processo sobrepõe o índice dos outros nem remove objetos que eles acabaram de gravar
+        cache = CacheCadastro(self.dir / "cache", dominio=self.dominio)
+        esperado = {url: sha for lote, shas in zip(lotes, hashes) for url, sha in zip(lote, shas)}
+        self.assertEqual({url: e['sha256'] for url, e in cache._indice.items()}, esperado)
+        objetos = self.dir / "cache" / "objetos"
+        self.assertEqual(sorted(p.name for p in objetos.iterdir()), sorted(esperado.values()))
+        self.assertEqual(sorted(p.name for p in (self.dir / "cache").iterdir()), ["indice.json", "indice.json.lock", "objetos"])
+
+    def test_diretorio_padrao_independe_do_diretorio_de_trabalho(self):
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.dir)
+            with mock.patch.dict(os.environ):
+                os.environ.pop("CACHE_CADASTRO_DIR", None)
+                self.assertEqual(diretorio_cache(), RAIZ / "cache_cadastro")
+                os.environ["CACHE_CADASTRO_DIR"] = str(self.dir / "outro")
+                self.assertEqual(diretorio_cache(), self.dir / "outro")
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from unittest import mock
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste2_Transformacao/tests
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import DataTransformation
+
+SAIDAS = ['dados_validados.csv', 'dados_enriquecidos.csv', 'despesas_agregadas.csv', 'relatorio_teste2.txt']
+
+def gerar_fixture(diretorio, linhas=6000, seed=15):
+    # Consolidado com CNPJs válidos e inválidos, Registros ANS, valores nulos, negativos e com muitas casas,
+    # razões sociais vazias, com aspas e com quebra de linha (atravessam os cortes do CSV), e um cadastro parcial
+    rng = np.random.default_rng(seed)
+    transformacao = DataTransformation.__new__(DataTransformation)
+    cnpjs = [b + transformacao.calcular_digito_verificador_cnpj(b) for b in (f"{10000000 + i:012d}" for i in range(60))]
+    ids = cnpjs + [f"{400000 + i}" for i in range(20)] + ['12345678901234', '11111111111111', '']
+    razoes = {id_: f"OPERADORA {i % 45} LTDA" for i, id_ in enumerate(ids)}
+    razoes[ids[7]] = 'OPERADORA "SETE", FILIAL\nNORTE'
+
+    escolha = rng.integers(0, len(ids), linhas)
+    valores = np.round(rng.lognormal(7, 2, linhas), 2).astype(object)
+    valores[rng.random(linhas) < 0.03] *= -1
+    valores[rng.random(linhas) < 0.01] = None
+    valores[::97] = 0.1 + 0.2
+    consolidado = pd.DataFrame({
+        'CNPJ': [ids[i] for i in escolha],
+        'RazaoSocial': [razoes[ids[i]] if r > 0.02 else 'N/A' for i, r in zip(escolha, rng.random(linhas))],
+        'Trimestre': [f"{t:02d}" for t in rng.integers(1, 5, linhas)],
+        'Ano': rng.choice(['2023', '2024'], linhas),
+        'ValorDespesas': valores,
+        'StatusValidacao': 'OK',
+    })
+    consolidado.to_csv(diretorio / 'consolidado_despesas.csv', index=False)
+
+    cadastro = pd.DataFrame({
+        'Registro_Operadora': [f"{400000 + i}" for i in range(20)],
+        'CNPJ': cnpjs[:20],
+        'Razao_Social': [f"CADASTRO {i}" for i in range(20)],
+        'UF': [['SP', 'RJ', 'MG', 'BA'][i % 4] for i in range(20)],
+    })
+    cadastro.to_csv(diretorio / 'cadastro.csv', sep=';', index=False, encoding='latin-1')
+
+class TestExecucaoParalela(unittest.TestCase):
+    # Em memória, em chunks e em paralelo (blocos lidos pelos processos do pool) os ficheiros de saída
+    # têm de ser byte a byte iguais, nos dois MODO_VALORES
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = Path(tempfile.mkdtemp())
+        gerar_fixture(cls.dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def executar(self, nome, **atributos):
+        # Execução completa num diretório próprio, com o cadastro local no lugar do download
+        destino = self.dir / nome
+        destino.mkdir()
+        os.chdir(destino)
+
+        def baixar(transformacao):
+            caminho = transformacao.temp_dir / 'operadoras_cadastro.csv'
+            shutil.copy(self.dir / 'cadastro.csv', caminho)
+            return caminho
+
+        with mock.patch.object(DataTransformation, 'baixar_dados_cadastrais', baixar), \
+             mock.patch.multiple(DataTransformation, **atributos), \
+             mock.patch.dict(os.environ, {"CACHE_CADASTRO_DIR": str(destino / 'cache_cadastro')}):
+            DataTransformation(str(self.dir / 'consolidado_despesas.csv')).executar()
+        return {nome: (destino / 'output' / nome).read_bytes() for nome in SAIDAS}
+
+    def comparar_modos(self, modo_valores):
+        serie = self.executar(f'serie_{modo_valores}', MODO_VALORES=modo_valores)
+        chunks = self.executar(f'chunks_{modo_valores}', MODO_VALORES=modo_valores, PROCESSAMENTO_CHUNKS=True, CHUNK_LINHAS=700)
+        paralelo = self.executar(f'paralelo_{modo_valores}', MODO_VALORES=modo_valores, PROCESSOS=2, CHUNK_LINHAS=700)
+        for nome in SAIDAS:
+            self.assertEqual(chunks[nome], serie[nome], f"{nome} (chunks)")
+            self.assertEqual(paralelo[nome], serie[nome], f"{nome} (paralelo)")
+        self.assertIn(b'CADASTRO', serie['despesas_agregadas.csv'])
+        return serie
+
+    def test_float64(self):
+        self.comparar_modos('float64')
+
+    def test_centavos(self):
+        self.comparar_modos('centavos')
+
+if __name__ == "__main__":
+    unittest.main()
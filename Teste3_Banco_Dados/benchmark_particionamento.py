@@ -0,0 +1,121 @@
+import sys
+import time
+import random
+import logging
+import statistics
+from pathlib import Path
+
+# Executável a partir de qualquer diretório: python Teste3_Banco_Dados/benchmark_particionamento.py [escala]
+# Usa as mesmas variáveis POSTGRES_* do import_postgresql.py e exige despesas_consolidadas já carregada
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from import_postgresql import ImportadorPostgres
+
+logging.disable(logging.INFO)
+
+QUERIES = Path(__file__).resolve().parent / "scripts/04_queries_analiticas.sql"
+REPETICOES = 5
+AMOSTRA_OPERADORAS = 50
+
+# Mesma consulta de OperadoraService.buscar_historico_despesas (Teste 4)
+HISTORICO = """
+    SELECT ano, trimestre, SUM(valor_despesas) as valor_despesas, ano || '-T' || trimestre as periodo
+    FROM despesas_consolidadas
+    WHERE operadora_id = %s
+    GROUP BY ano, trimestre
+    ORDER BY ano, trimestre
+"""
+
+COLUNAS = """
+    id BIGSERIAL, operadora_id INTEGER NOT NULL, trimestre INTEGER NOT NULL, ano INTEGER NOT NULL,
+    valor_despesas DECIMAL(15,2) NOT NULL, data_registro DATE, status_validacao TEXT
+"""
+
+# Layouts do 01 (sem FKs, irrelevantes para leitura), com os índices do 03 de cada um
+LAYOUTS = {
+    'bench_plano': (
+        f"CREATE TABLE bench_plano.despesas_consolidadas ({COLUNAS}, PRIMARY KEY (id))",
+        ["CREATE INDEX ON bench_plano.despesas_consolidadas (operadora_id, ano, trimestre)",
+         "CREATE INDEX ON bench_plano.despesas_consolidadas (valor_despesas)",
+         "CREATE INDEX ON bench_plano.despesas_consolidadas (data_registro)"],
+    ),
+    'bench_particionado': (
+        f"CREATE TABLE bench_particionado.despesas_consolidadas ({COLUNAS}, PRIMARY KEY (id, ano, trimestre)) PARTITION BY RANGE (ano)",
+        ["CREATE INDEX ON bench_particionado.despesas_consolidadas (operadora_id)"],
+    ),
+}
+
+def consultas_analiticas():
+    # Consultas do 04 que leem despesas_consolidadas, rotuladas pelo comentário que as precede
+    texto = ''.join(l for l in open(QUERIES, encoding='utf-8') if not l.startswith('\\'))
+    consultas = []
+    for bloco in texto.split(';'):
+        if 'despesas_consolidadas' not in bloco: continue
+        rotulo = next(l[3:].strip() for l in bloco.splitlines() if l.startswith('-- '))
+        consultas.append((rotulo, bloco.strip()))
+    return consultas
+
+def montar(cursor, escala):
+    # Cada layout recebe o conteúdo atual replicado em `escala` anos (ano - k): o volume cresce como cresceria
+    # o histórico, e as consultas do 04 (WHERE ano = 2024) continuam vendo 1/escala dos dados
+    cursor.execute("SELECT DISTINCT ano, trimestre FROM despesas_consolidadas")
+    trimestres = sorted({(ano - k, tri) for ano, tri in cursor.fetchall() for k in range(escala)})
+    for esquema, (tabela, indices) in LAYOUTS.items():
+        inicio = time.perf_counter()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {esquema} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {esquema}")
+        cursor.execute(tabela)
+        if esquema == 'bench_particionado':
+            for ano in sorted({ano for ano, _ in trimestres}):
+                cursor.execute(f"CREATE TABLE {esquema}.despesas_{ano} PARTITION OF {esquema}.despesas_consolidadas FOR VALUES FROM ({ano}) TO ({ano + 1}) PARTITION BY LIST (trimestre)")
+            for ano, tri in trimestres:
+                cursor.execute(f"CREATE TABLE {esquema}.despesas_{ano}_t{tri} PARTITION OF {esquema}.despesas_{ano} FOR VALUES IN ({tri})")
+        cursor.execute(f"""
+            INSERT INTO {esquema}.despesas_consolidadas (operadora_id, trimestre, ano, valor_despesas, data_registro, status_validacao)
+            SELECT operadora_id, trimestre, ano - k, valor_despesas, (data_registro - make_interval(years => k))::date, status_validacao
+            FROM public.despesas_consolidadas, generate_series(0, %s) k
+        """, (escala - 1,))
+        for indice in indices: cursor.execute(indice)
+        cursor.execute(f"VACUUM ANALYZE {esquema}.despesas_consolidadas")
+        # pg_partition_tree não devolve linhas para tabela comum
+        cursor.execute(f"""
+            SELECT (SELECT count(*) FROM {esquema}.despesas_consolidadas),
+                   COALESCE((SELECT sum(pg_total_relation_size(relid)) FROM pg_partition_tree('{esquema}.despesas_consolidadas')),
+                            pg_total_relation_size('{esquema}.despesas_consolidadas'))
+        """)
+        linhas, tamanho = cursor.fetchone()
+        print(f"  {esquema:<20}{linhas:>12} linhas {tamanho / 2 ** 20:>8.0f} MB (tabela + índices), montado em {time.perf_counter() - inicio:.0f}s")
+
+def medir(cursor, esquema, sql, parametros=None):
+    # Mediana de REPETICOES execuções após um aquecimento (cache quente nos dois layouts)
+    cursor.execute(f"SET search_path TO {esquema}, public")
+    tempos = []
+    for i in range(REPETICOES + 1):
+        inicio = time.perf_counter()
+        for p in parametros or [None]:
+            cursor.execute(sql, p)
+            cursor.fetchall()
+        if i: tempos.append((time.perf_counter() - inicio) / len(parametros or [None]))
+    return statistics.median(tempos)
+
+if __name__ == "__main__":
+    escala = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    conn = ImportadorPostgres().conectar()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            print(f"\nMontando despesas_consolidadas em tabela única e particionada ({escala}x o volume atual)...")
+            montar(cursor, escala)
+
+            cursor.execute("SELECT DISTINCT operadora_id FROM despesas_consolidadas ORDER BY 1")
+            operadoras = random.Random(42).sample([(op,) for op, in cursor.fetchall()], AMOSTRA_OPERADORAS)
+            consultas = consultas_analiticas() + [(f"API histórico ({AMOSTRA_OPERADORAS} operadoras, por chamada)", HISTORICO)]
+
+            print(f"\n  {'Consulta':<58}{'única':>10}{'particionada':>14}")
+            for rotulo, sql in consultas:
+                parametros = operadoras if '%s' in sql else None
+                plano, particionado = (medir(cursor, esquema, sql, parametros) for esquema in LAYOUTS)
+                print(f"  {rotulo[:56]:<58}{plano * 1000:>8.1f}ms{particionado * 1000:>12.1f}ms ({plano / particionado:.1f}x)")
+
+            for esquema in LAYOUTS: cursor.execute(f"DROP SCHEMA {esquema} CASCADE")
+    finally:
+        conn.close()
@@ -0,0 +1,476 @@
+import io
+import os
+import re
+import sys
+import csv
+import time
+import struct
+import logging
+import numpy as np
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.compute as pc
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from pathlib import Path
+
+# Módulos compartilhados (comum/): na raiz do repositório
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from comum.consolidado import iterar_consolidado
+
+logger = logging.getLogger(__name__)
+
+BASE = Path(__file__).resolve().parent.parent
+
+# COPY ... FROM STDIN (FORMAT binary): cabeçalho fixo, flags e extensão zeradas; trailer -1
+CABECALHO_COPY = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+TRAILER_COPY = struct.pack('!h', -1)
+# O tipo date trafega como dias desde 2000-01-01
+DIAS_1970_2000 = 10957
+# numeric de despesas_consolidadas em layout fixo: 4 grupos base 10000 na parte inteira + 1 nos centavos
+GRUPOS_INTEIROS = 4
+LIMITE_CENTAVOS = 10 ** 15  # DECIMAL(15,2)
+
+COLUNAS_DESPESAS = ['CNPJ', 'Trimestre', 'Ano', 'ValorDespesas', 'StatusValidacao']
+COLUNAS_OPERADORAS = ['registro_ans', 'cnpj', 'razao_social', 'modalidade', 'uf']
+COLUNAS_CARGA = ['operadora_id', 'trimestre', 'ano', 'data_registro', 'valor_despesas', 'status_validacao']
+# completa: TRUNCATE e recarga de tudo. incremental: substitui só os trimestres cujo conteúdo mudou
+MODOS_CARGA = ('completa', 'incremental')
+# Resumos de despesas_consolidadas lidos pela API, refeitos por atualizar_resumos_despesas (01)
+TABELAS_RESUMO = ['despesas_operadora_trimestre', 'despesas_operadora_total']
+UF_VALIDA = re.compile(r'[A-Z]{2}')
+NAO_DIGITO = re.compile(r'[^0-9]')
+
+def _get_env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, str(padrao)))
+    except ValueError:
+        return padrao
+
+def _digitos(texto):
+    # NULLIF(REGEXP_REPLACE(texto, '[^0-9]', '', 'g'), '')
+    if texto is None: return None
+    return NAO_DIGITO.sub('', texto) or None
+
+def _campo_texto(valor):
+    if valor is None: return struct.pack('!i', -1)
+    dados = valor.encode('utf-8')
+    return struct.pack('!i', len(dados)) + dados
+
+def _campo_inteiro(valor):
+    return struct.pack('!ii', 4, valor)
+
+def _campo_numeric(centavos):
+    # numeric binário: ndigits, weight, sinal, dscale e dígitos base 10000 (o servidor normaliza zeros à esquerda)
+    if centavos is None: return struct.pack('!i', -1)
+    inteiro, fracao = divmod(abs(centavos), 100)
+    grupos = []
+    while inteiro:
+        inteiro, grupo = divmod(inteiro, 10000)
+        grupos.insert(0, grupo)
+    digitos = grupos + [fracao * 100]
+    corpo = struct.pack(f'!hhhh{len(digitos)}h', len(digitos), len(grupos) - 1, 0x4000 if centavos < 0 else 0, 2, *digitos)
+    return struct.pack('!i', len(corpo)) + corpo
+
+def _linha_binaria(*campos):
+    return struct.pack('!h', len(campos)) + b''.join(campos)
+
+def _centavos_texto(textos):
+    # COALESCE(NULLIF(REGEXP_REPLACE(valor, '[^0-9.]', '', 'g'), ''), '0')::DECIMAL(15,2) do SQL, sobre o texto e
+    # sem passar por float: sinal e separadores somem, o meio centavo arredonda para cima. Devolve os centavos (int64)
+    # e a máscara dos valores que o cast aceita ('1.2.3', '.' e mais de 13 dígitos inteiros fariam o SQL abortar).
+    # Coluna numérica (Parquet) é convertida para texto antes. Feito com pyarrow.compute: .str do pandas é ~6x mais lento
+    textos = pa.array(textos, from_pandas=True)
+    if not pa.types.is_string(textos.type) and not pa.types.is_large_string(textos.type):
+        textos = pc.cast(textos, pa.string())
+    limpo = pc.replace_substring_regex(pc.fill_null(textos, ''), r'[^0-9.]', '')
+    partes = pc.extract_regex(limpo, r'^0*(?P<inteiro>\d*)(?:\.(?P<fracao>\d*))?$')
+    inteiro, fracao = pc.struct_field(partes, 'inteiro'), pc.struct_field(partes, 'fracao')
+    validos = pc.fill_null(pc.and_(pc.and_(pc.is_valid(partes), pc.not_equal(limpo, '.')), pc.less_equal(pc.utf8_length(inteiro), 13)), False)
+
+    inteiro = pc.cast(pc.if_else(pc.and_kleene(validos, pc.greater(pc.utf8_length(inteiro), 0)), inteiro, '0'), pa.int64()).to_numpy()
+    milesimos = pc.cast(pc.utf8_slice_codeunits(pc.utf8_rpad(pc.if_else(validos, pc.fill_null(fracao, ''), ''), 3, '0'), 0, 3), pa.int64()).to_numpy()
+    centavos = inteiro * 100 + milesimos // 10 + (milesimos % 10 >= 5)
+    validos = validos.to_numpy(zero_copy_only=False)
+    return centavos, validos & (centavos < LIMITE_CENTAVOS)
+
+def _centavos(texto, vazio=None):
+    # Texto decimal -> centavos, arredondando meio centavo para longe do zero como o cast para DECIMAL
+    texto = (texto or '').strip(' ')
+    if not texto: return vazio
+    valor = Decimal(texto)
+    if not valor.is_finite(): return None
+    return int(valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+class ImportadorPostgres:
+    # Alternativa em Python ao 02_import_postgresql.sql: cada arquivo é lido uma única vez, os campos são
+    # limpos e tipados aqui e as linhas chegam ao banco por COPY binário, sem REGEXP_REPLACE nem tabelas temporárias.
+    # Mesmo resultado do script SQL; linhas que nele abortariam a importação vão para import_errors.
+
+    CHUNK_LINHAS = _get_env_int("CHUNK_LINHAS", 200000)
+    # Tabelas de destino em UNLOGGED durante a carga (sem WAL por linha); voltam a LOGGED antes do commit
+    CARGA_UNLOGGED = os.getenv("CARGA_UNLOGGED", "true").lower() == "true"
+    MODO_CARGA = os.getenv("MODO_CARGA", "completa").lower()
+
+    def __init__(self):
+        if self.MODO_CARGA not in MODOS_CARGA:
+            raise ValueError(f"MODO_CARGA inválido: {self.MODO_CARGA!r}. Use um de {MODOS_CARGA}.")
+        self.cadastro = Path(os.getenv("CADASTRO_CSV", BASE / "Teste2_Transformacao/temp/operadoras_cadastro.csv"))
+        self.consolidado = Path(os.getenv("CONSOLIDADO", self._consolidado_padrao()))
+        self.agregadas = Path(os.getenv("AGREGADAS_CSV", BASE / "Teste2_Transformacao/output/despesas_agregadas.csv"))
+        self.erros = []
+        self.por_razao_uf = {}
+        # Layout de despesas_consolidadas (01 com -v particionado=on) e partições já garantidas nesta carga
+        self.particionado = False
+        self.particoes = set()
+
+    def _consolidado_padrao(self):
+        # CSV do Teste 1 ou, com FORMATO_SAIDA=parquet, o dataset particionado
+        csv_path = BASE / "Teste1_ANS_Integration/output/consolidado_despesas.csv"
+        parquet = BASE / "Teste1_ANS_Integration/output/consolidado_despesas"
+        return parquet if not csv_path.exists() and parquet.exists() else csv_path
+
+    def conectar(self):
+        return psycopg2.connect(
+            host=os.getenv("POSTGRES_HOST", "127.0.0.1"),
+            port=_get_env_int("POSTGRES_PORT", 5432),
+            dbname=os.environ["POSTGRES_DB"],
+            user=os.environ["POSTGRES_USER"],
+            password=os.environ["POSTGRES_PASSWORD"],
+        )
+
+    def copiar(self, cursor, tabela, colunas, corpo):
+        # Um COPY binário por lote
+        sql = f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN (FORMAT binary)"
+        cursor.copy_expert(sql, io.BytesIO(CABECALHO_COPY + corpo + TRAILER_COPY))
+
+    def ler_cadastro(self):
+        # Mesma interpretação do script SQL: campos por posição (split em ';'), aspas externas removidas
+        with open(self.cadastro, encoding='utf-8') as f:
+            for linha in f:
+                linha = linha.rstrip('\n')
+                if 'registro ans' in linha.lower(): continue
+                campos = linha.split(';')
+                campo = lambda i: campos[i] if i < len(campos) else None
+                if campo(2) is None or 'razão social' in campo(2).lower(): continue
+
+                uf = None
+                for i in (10, 9):
+                    candidato = campo(i).strip('"').upper() if campo(i) is not None else ''
+                    if UF_VALIDA.fullmatch(candidato):
+                        uf = candidato
+                        break
+                yield linha, {
+                    'registro_ans': _digitos(campo(0)),
+                    'cnpj': _digitos(campo(1)),
+                    'razao_social': campo(2).strip('"').upper(),
+                    'modalidade': campo(4).strip('"') if campo(4) is not None else None,
+                    'uf': uf,
+                }
+
+    def resolver_operadoras(self, existentes=()):
+        # Reproduz os dois INSERT ... ON CONFLICT do SQL (primeiro por CNPJ, depois por Registro ANS) sobre a tabela
+        # vazia ou, na carga incremental, sobre as operadoras já gravadas (com 'id')
+        linhas = list(self.ler_cadastro())
+        operadoras = [dict(op) for op in existentes]
+        por_cnpj = {op['cnpj']: op for op in operadoras if op['cnpj']}
+        por_registro = {op['registro_ans']: op for op in operadoras if op['registro_ans']}
+
+        def atualizar(existente, nova, chave):
+            existente['razao_social'] = nova['razao_social']
+            for campo in ('modalidade', 'uf', chave):
+                existente[campo] = nova[campo] if nova[campo] is not None else existente[campo]
+
+        for texto, op in linhas:
+            if op['cnpj'] is None: continue
+            existente = por_cnpj.get(op['cnpj'])
+            if existente is not None:
+                if op['registro_ans'] and por_registro.get(op['registro_ans'], existente) is not existente:
+                    self.erros.append(('operadoras', texto, 'Registro ANS já pertence a outro CNPJ'))
+                    continue
+                atualizar(existente, op, 'registro_ans')
+            elif op['registro_ans'] and op['registro_ans'] in por_registro:
+                self.erros.append(('operadoras', texto, 'Registro ANS já pertence a outro CNPJ'))
+                continue
+            else:
+                existente = dict(op)
+                por_cnpj[op['cnpj']] = existente
+                operadoras.append(existente)
+            if existente['registro_ans']: por_registro[existente['registro_ans']] = existente
+
+        for texto, op in linhas:
+            if op['cnpj'] is not None or op['registro_ans'] is None: continue
+            existente = por_registro.get(op['registro_ans'])
+            if existente is not None:
+                atualizar(existente, op, 'cnpj')
+            else:
+                por_registro[op['registro_ans']] = dict(op)
+                operadoras.append(por_registro[op['registro_ans']])
+        return operadoras
+
+    def carregar_operadoras(self, cursor):
+        # Carrega o cadastro e devolve o índice identificador do consolidado -> operadora_id.
+        # Na carga incremental, operadoras existentes são atualizadas no lugar e mantêm o id.
+        existentes = []
+        if self.MODO_CARGA == 'incremental':
+            cursor.execute(f"SELECT id, {', '.join(COLUNAS_OPERADORAS)} FROM operadoras ORDER BY id")
+            existentes = [dict(zip(['id'] + COLUNAS_OPERADORAS, linha)) for linha in cursor.fetchall()]
+        originais = {op['id']: op for op in existentes}
+        operadoras = self.resolver_operadoras(existentes)
+        novas = [op for op in operadoras if 'id' not in op]
+        alteradas = [op for op in operadoras if 'id' in op and op != originais[op['id']]]
+
+        if alteradas:
+            cursor.execute("CREATE TEMP TABLE operadoras_carga (id INTEGER, registro_ans TEXT, cnpj TEXT, razao_social TEXT, modalidade TEXT, uf CHAR(2)) ON COMMIT DROP")
+            self.copiar(cursor, 'operadoras_carga', ['id'] + COLUNAS_OPERADORAS, b''.join(
+                _linha_binaria(_campo_inteiro(op['id']), *(_campo_texto(op[c]) for c in COLUNAS_OPERADORAS)) for op in alteradas))
+            cursor.execute(f"UPDATE operadoras o SET {', '.join(f'{c} = c.{c}' for c in COLUNAS_OPERADORAS)} FROM operadoras_carga c WHERE o.id = c.id")
+        if novas:
+            self.copiar(cursor, 'operadoras', COLUNAS_OPERADORAS, b''.join(_linha_binaria(*(_campo_texto(op[c]) for c in COLUNAS_OPERADORAS)) for op in novas))
+
+        # Como no SQL: 6 dígitos casam com registro_ans, 14 com cnpj
+        cursor.execute("SELECT id, registro_ans, cnpj, razao_social, uf FROM operadoras")
+        chaves, ids = [], []
+        for op_id, registro, cnpj, razao, uf in cursor.fetchall():
+            if registro and len(registro) == 6: chaves.append(registro); ids.append(op_id)
+            if cnpj and len(cnpj) == 14: chaves.append(cnpj); ids.append(op_id)
+            self.por_razao_uf.setdefault((razao, uf), []).append(op_id)
+        logger.info(f"{len(novas)} operadoras novas, {len(alteradas)} atualizadas")
+        return pd.Index(chaves), np.array(ids + [-1], dtype=np.int32)
+
+    def garantir_particoes(self, cursor, trimestres):
+        # Layout particionado: trimestres ainda sem partição ganham uma, anexada por garantir_particao_despesas (01)
+        for ano, trimestre in sorted(set(trimestres) - self.particoes):
+            cursor.execute("SELECT garantir_particao_despesas(%s, %s)", (ano, trimestre))
+            self.particoes.add((ano, trimestre))
+
+    def _por_categoria(self, serie, limpar):
+        # Colunas com poucos valores distintos: `limpar` roda só sobre as categorias; -1 (nulo) vira o último item
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype('category')
+        categorias = pd.Series(serie.cat.categories.astype(str))
+        return serie.cat.codes.to_numpy(), limpar(categorias)
+
+    def bloco_despesas(self, chunk, chaves, ids):
+        # Chunk do consolidado -> linhas binárias de despesas_consolidadas, montadas com NumPy
+        codigos, op_categoria = self._por_categoria(chunk['CNPJ'], lambda c: np.append(ids[chaves.get_indexer(c.str.replace(r'\D', '', regex=True))], -1))
+        operadora = op_categoria[codigos]
+
+        numero = lambda c: np.append(pd.to_numeric(c.str.replace(r'\D', '', regex=True), errors='coerce').fillna(-1).astype(np.int64).to_numpy(), -1)
+        codigos_tri, tri_categoria = self._por_categoria(chunk['Trimestre'], numero)
+        codigos_ano, ano_categoria = self._por_categoria(chunk['Ano'], numero)
+        trimestre, ano = tri_categoria[codigos_tri], ano_categoria[codigos_ano]
+
+        codigos_status, status = self._por_categoria(chunk['StatusValidacao'], lambda c: c.str.strip(' '))
+        status_valido = np.append(((status != '') & (status.str.upper() != 'VALOR_NEGATIVO')).to_numpy(), False)
+
+        centavos, valor_valido = _centavos_texto(chunk['ValorDespesas'])
+        aceitas = (operadora >= 0) & (trimestre >= 1) & (trimestre <= 4) & (ano >= 2000) & (ano <= 2100) & status_valido[codigos_status]
+        validas = aceitas & valor_valido
+        for linha in chunk.iloc[np.flatnonzero(aceitas & ~valor_valido)].itertuples(index=False):
+            self.erros.append(('despesas_consolidadas', ','.join(map(str, linha)), 'Valor numérico inválido'))
+        dias = ((ano - 1970) * 12 + (trimestre - 1) * 3).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) - DIAS_1970_2000
+
+        partes = []
+        for codigo, texto in enumerate(status):
+            linhas = np.flatnonzero(validas & (codigos_status == codigo))
+            if not len(linhas): continue
+            texto = texto.encode('utf-8')
+            registro = np.zeros(len(linhas), dtype=self._layout_despesa(len(texto)))
+            registro['campos'] = 6
+            registro['tam_op'] = registro['tam_tri'] = registro['tam_ano'] = registro['tam_data'] = 4
+            registro['op'], registro['tri'], registro['ano'], registro['data'] = operadora[linhas], trimestre[linhas], ano[linhas], dias[linhas]
+            registro['tam_valor'] = 8 + 2 * (GRUPOS_INTEIROS + 1)
+            registro['ndigitos'], registro['peso'], registro['escala'] = GRUPOS_INTEIROS + 1, GRUPOS_INTEIROS - 1, 2
+            c = centavos[linhas]
+            for i in range(GRUPOS_INTEIROS):
+                registro['digitos'][:, GRUPOS_INTEIROS - 1 - i] = (c // 100 // 10000 ** i) % 10000
+            registro['digitos'][:, GRUPOS_INTEIROS] = (c % 100) * 100
+            registro['tam_status'], registro['status'] = len(texto), texto
+            partes.append(registro.tobytes())
+        linhas = np.flatnonzero(validas)
+        status_hash = pd.util.hash_array(status.to_numpy(dtype=object))
+        assinaturas = self._assinaturas(ano[linhas], trimestre[linhas], operadora[linhas], centavos[linhas], status_hash[codigos_status[linhas]])
+        return b''.join(partes), assinaturas, len(chunk)
+
+    @staticmethod
+    def _assinaturas(ano, trimestre, operadora, centavos, status_hash):
+        # Por trimestre: (linhas, soma mod 2^64 dos hashes das linhas). Não depende da ordem nem da divisão em chunks
+        hashes = pd.util.hash_pandas_object(pd.DataFrame({'op': operadora, 'valor': centavos, 'status': status_hash}), index=False).to_numpy()
+        chave = ano * 10 + trimestre
+        ordem = np.argsort(chave, kind='stable')
+        chave = chave[ordem]
+        inicios = np.flatnonzero(np.r_[True, chave[1:] != chave[:-1]]) if len(chave) else np.zeros(0, dtype=np.int64)
+        somas = np.add.reduceat(hashes[ordem], inicios) if len(chave) else []
+        contagens = np.diff(np.r_[inicios, len(chave)])
+        return {(int(chave[i] // 10), int(chave[i] % 10)): (int(n), int(s)) for i, n, s in zip(inicios, contagens, somas)}
+
+    @staticmethod
+    def _layout_despesa(tam_status):
+        # Uma tupla do COPY binário como registro NumPy (big-endian, sem alinhamento)
+        return np.dtype([
+            ('campos', '>i2'),
+            ('tam_op', '>i4'), ('op', '>i4'),
+            ('tam_tri', '>i4'), ('tri', '>i4'),
+            ('tam_ano', '>i4'), ('ano', '>i4'),
+            ('tam_data', '>i4'), ('data', '>i4'),
+            ('tam_valor', '>i4'), ('ndigitos', '>i2'), ('peso', '>i2'), ('sinal', '>i2'), ('escala', '>i2'),
+            ('digitos', '>i2', (GRUPOS_INTEIROS + 1,)),
+            ('tam_status', '>i4'), ('status', f'S{tam_status}'),
+        ])
+
+    def carregar_despesas(self, cursor, chaves, ids, tabela='despesas_consolidadas'):
+        # Consolidado em streaming: um chunk lido, convertido e enviado por vez. Devolve as assinaturas por trimestre
+        # ValorDespesas como texto: convertido por _centavos_texto exatamente como o cast do SQL
+        dtype = {'CNPJ': 'category', 'Trimestre': 'category', 'Ano': 'category', 'ValorDespesas': 'str', 'StatusValidacao': 'category'}
+        assinaturas, lidas = {}, 0
+        for chunk in iterar_consolidado(self.consolidado, COLUNAS_DESPESAS, self.CHUNK_LINHAS, dtype=dtype):
+            corpo, parciais, n = self.bloco_despesas(chunk, chaves, ids)
+            if self.particionado and tabela == 'despesas_consolidadas': self.garantir_particoes(cursor, parciais)
+            if corpo: self.copiar(cursor, tabela, COLUNAS_CARGA, corpo)
+            for trimestre, (qtd, soma) in parciais.items():
+                qtd_total, soma_total = assinaturas.get(trimestre, (0, 0))
+                assinaturas[trimestre] = (qtd_total + qtd, (soma_total + soma) % 2 ** 64)
+            lidas += n
+        total = sum(qtd for qtd, _ in assinaturas.values())
+        logger.info(f"{total} despesas lidas ({lidas - total} linhas sem operadora, inválidas ou VALOR_NEGATIVO)")
+        return assinaturas
+
+    def carregar_agregadas(self, cursor):
+        # despesas_agregadas.csv do Teste 2, associado às operadoras por razão social + UF
+        colunas = ['operadora_id', 'uf', 'total_despesas', 'media_despesas', 'desvio_padrao', 'qtd_registros']
+        linhas, vistos = [], set()
+        with open(self.agregadas, encoding='utf-8', newline='') as f:
+            leitor = csv.reader(f)
+            next(leitor, None)
+            for campos in leitor:
+                if len(campos) < 6: continue
+                razao, uf, total, media, desvio, qtd = campos[:6]
+                qtd = _digitos(qtd.strip(' '))
+                if qtd is None or int(qtd) <= 0: continue
+                try:
+                    valores = (_centavos(total, vazio=0), _centavos(media), _centavos(desvio))
+                    if valores[0] is None: raise InvalidOperation
+                except InvalidOperation:
+                    self.erros.append(('despesas_agregadas', ','.join(campos), 'Valor numérico inválido'))
+                    continue
+                uf = uf.strip(' ').upper()
+                for op_id in self.por_razao_uf.get((razao.strip(' ').upper(), uf), []):
+                    if (op_id, uf) in vistos: continue  # ON CONFLICT DO NOTHING
+                    vistos.add((op_id, uf))
+                    linhas.append(_linha_binaria(_campo_inteiro(op_id), _campo_texto(uf), *map(_campo_numeric, valores), _campo_inteiro(int(qtd))))
+        self.copiar(cursor, 'despesas_agregadas', colunas, b''.join(linhas))
+        logger.info(f"{len(linhas)} linhas agregadas carregadas")
+
+    def chaves_estrangeiras(self, cursor):
+        # FKs que apontam para operadoras: removidas durante a carga e revalidadas ao final em uma única passada.
+        # No layout particionado, as cópias da FK em cada partição (conparentid) acompanham a da tabela mãe
+        cursor.execute("""
+            SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+            FROM pg_constraint WHERE contype = 'f' AND confrelid = 'operadoras'::regclass AND conparentid = 0
+        """)
+        return cursor.fetchall()
+
+    def registrar_trimestres(self, cursor, assinaturas):
+        # cargas_trimestre guarda, por trimestre carregado, a quantidade de linhas e a assinatura do conteúdo
+        cursor.executemany("""
+            INSERT INTO cargas_trimestre (ano, trimestre, qtd_registros, assinatura) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (ano, trimestre) DO UPDATE SET
+                qtd_registros = EXCLUDED.qtd_registros, assinatura = EXCLUDED.assinatura, data_carga = CURRENT_TIMESTAMP
+        """, [(ano, tri, qtd, f"{soma:016x}") for (ano, tri), (qtd, soma) in sorted(assinaturas.items())])
+
+    def substituir_trimestre(self, cursor, ano, trimestre):
+        # Troca a fatia (ano, trimestre) de despesas_consolidadas pelo conteúdo em despesas_carga.
+        # Particionado: trimestre novo ganha partição anexada; o DELETE/INSERT de um existente toca só a sua partição
+        if self.particionado: self.garantir_particoes(cursor, [(ano, trimestre)])
+        cursor.execute("DELETE FROM despesas_consolidadas WHERE ano = %s AND trimestre = %s", (ano, trimestre))
+        removidas = cursor.rowcount
+        colunas = ', '.join(COLUNAS_CARGA)
+        cursor.execute(f"INSERT INTO despesas_consolidadas ({colunas}) SELECT {colunas} FROM despesas_carga WHERE ano = %s AND trimestre = %s", (ano, trimestre))
+        logger.info(f"{ano}-T{trimestre}: {removidas} linhas substituídas por {cursor.rowcount}")
+        cursor.execute("SELECT atualizar_resumos_despesas(%s, %s)", (ano, trimestre))
+
+    def carga_completa(self, cursor):
+        tabelas = ['operadoras', 'despesas_consolidadas', 'despesas_agregadas']
+        fks = self.chaves_estrangeiras(cursor)
+        for tabela, nome, _ in fks:
+            cursor.execute(f"ALTER TABLE {tabela} DROP CONSTRAINT {nome}")
+        # TRUNCATE na tabela particionada esvazia as partições, que continuam anexadas
+        cursor.execute(f"TRUNCATE TABLE {', '.join(tabelas + TABELAS_RESUMO)}, cargas_trimestre")
+        # Tabela particionada não aceita SET UNLOGGED: no layout particionado as despesas são gravadas com WAL
+        unlogged = [t for t in tabelas if not (self.particionado and t == 'despesas_consolidadas')] if self.CARGA_UNLOGGED else []
+        for tabela in unlogged: cursor.execute(f"ALTER TABLE {tabela} SET UNLOGGED")
+
+        chaves, ids = self.carregar_operadoras(cursor)
+        self.registrar_trimestres(cursor, self.carregar_despesas(cursor, chaves, ids))
+        cursor.execute("SELECT atualizar_resumos_despesas()")
+        self.carregar_agregadas(cursor)
+
+        for tabela in unlogged: cursor.execute(f"ALTER TABLE {tabela} SET LOGGED")
+        for tabela, nome, definicao in fks:
+            cursor.execute(f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}")
+
+    def carga_incremental(self, cursor):
+        # Sem TRUNCATE nem ALTER TABLE (que bloqueiam leituras): só DELETE/INSERT/UPDATE, e a API continua
+        # lendo a versão anterior até o commit. Trimestres ausentes do consolidado não são tocados.
+        # A exceção é o ATTACH PARTITION do layout particionado, que só pede SHARE UPDATE EXCLUSIVE.
+        chaves, ids = self.carregar_operadoras(cursor)
+        cursor.execute("""
+            CREATE TEMP TABLE despesas_carga (
+                operadora_id INTEGER, trimestre INTEGER, ano INTEGER, data_registro DATE,
+                valor_despesas DECIMAL(15,2), status_validacao TEXT
+            ) ON COMMIT DROP
+        """)
+        assinaturas = self.carregar_despesas(cursor, chaves, ids, 'despesas_carga')
+
+        cursor.execute("SELECT ano, trimestre, qtd_registros, assinatura FROM cargas_trimestre")
+        gravadas = {(ano, tri): (qtd, assinatura) for ano, tri, qtd, assinatura in cursor.fetchall()}
+        alterados = {k: v for k, v in assinaturas.items() if gravadas.get(k) != (v[0], f"{v[1]:016x}")}
+        for ano, trimestre in sorted(alterados):
+            self.substituir_trimestre(cursor, ano, trimestre)
+        self.registrar_trimestres(cursor, alterados)
+        logger.info(f"{len(alterados)} de {len(assinaturas)} trimestre(s) alterado(s)")
+
+        # despesas_agregadas é a saída inteira do Teste 2 (poucas centenas de linhas): substituída na mesma transação
+        cursor.execute("DELETE FROM despesas_agregadas")
+        self.carregar_agregadas(cursor)
+
+    def executar(self):
+        inicio = time.perf_counter()
+        logger.info(f"Iniciando importação com COPY binário (carga {self.MODO_CARGA})...")
+        conn = self.conectar()
+        try:
+            # Transação única: quem consulta o banco vê os dados antigos até o commit
+            with conn, conn.cursor() as cursor:
+                for tabela in ['cargas_trimestre'] + TABELAS_RESUMO:
+                    cursor.execute("SELECT to_regclass(%s)", (tabela,))
+                    if cursor.fetchone()[0] is None:
+                        raise RuntimeError(f"Tabela {tabela} ausente: execute novamente scripts/01_ddl_postgresql.sql")
+                cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = 'despesas_consolidadas'::regclass")
+                self.particionado = cursor.fetchone()[0]
+                if self.particionado: logger.info("despesas_consolidadas particionada: partições criadas e anexadas por trimestre")
+                if self.MODO_CARGA == 'incremental':
+                    self.carga_incremental(cursor)
+                else:
+                    self.carga_completa(cursor)
+                if self.erros:
+                    cursor.executemany("INSERT INTO import_errors (tabela_destino, linha_csv, erro) VALUES (%s, %s, %s)", self.erros)
+                    logger.warning(f"{len(self.erros)} linha(s) rejeitada(s), registradas em import_errors")
+
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for tabela in ['operadoras', 'despesas_consolidadas', 'despesas_agregadas'] + TABELAS_RESUMO: cursor.execute(f"ANALYZE {tabela}")
+                # Avisa a API (Teste 4) para descartar contagens e estatísticas em cache; após o ANALYZE, que
+                # atualiza o reltuples usado pela contagem estimada
+                cursor.execute("NOTIFY ans_importacao")
+        finally:
+            conn.close()
+        logger.info(f"✓ Importação concluída em {time.perf_counter() - inicio:.1f}s")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        ImportadorPostgres().executar()
+    except Exception as e:
+        logger.error(f"❌ Falha na importação: {e}")
+        sys.exit(1)
@@ -18,6 +18,58 @@ COMMENT ON TABLE operadoras IS 'Cadastro de operadoras de planos de saúde da AN
 COMMENT ON COLUMN operadoras.registro_ans IS 'Código único de 6 dígitos da ANS';
 COMMENT ON COLUMN operadoras.cnpj IS 'CNPJ sem formatação (apenas números)';
 
+-- Layout de despesas_consolidadas: tabela única (padrão) ou particionada por ano e trimestre com
+-- psql -v particionado=on -f 01_ddl_postgresql.sql (em banco novo ou após o 05_limpeza.sql)
+\if :{?particionado}
+\else
+\set particionado off
+\endif
+
+\if :particionado
+-- Tabela: despesas_consolidadas (Teste 1), particionada: RANGE por ano, cada ano subparticionado por trimestre.
+-- A PK de uma tabela particionada precisa conter as chaves de partição
+CREATE TABLE IF NOT EXISTS despesas_consolidadas (
+    id BIGSERIAL,
+    operadora_id INTEGER NOT NULL,
+    trimestre INTEGER NOT NULL,
+    ano INTEGER NOT NULL,
+    valor_despesas DECIMAL(15,2) NOT NULL,
+    data_registro DATE,
+    validacao_cnpj TEXT,
+    status_validacao TEXT,
+    validacao_razao TEXT,
+
+    PRIMARY KEY (id, ano, trimestre),
+    CONSTRAINT fk_operadora FOREIGN KEY (operadora_id) 
+        REFERENCES operadoras(id) ON DELETE CASCADE,
+    CONSTRAINT chk_trimestre CHECK (trimestre BETWEEN 1 AND 4),
+    CONSTRAINT chk_ano CHECK (ano BETWEEN 2000 AND 2100),
+    CONSTRAINT chk_valor_positivo CHECK (valor_despesas >= 0)
+) PARTITION BY RANGE (ano);
+
+-- Função: cria e anexa as partições de um trimestre (despesas_consolidadas_2024 e despesas_consolidadas_2024_t1).
+-- Chamada pelas importações antes de gravar um trimestre novo. Cada partição nasce como tabela avulsa e entra
+-- por ATTACH PARTITION, que só pede SHARE UPDATE EXCLUSIVE na tabela mãe: consultas em andamento não são bloqueadas
+CREATE OR REPLACE FUNCTION garantir_particao_despesas(p_ano INTEGER, p_trimestre INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    v_ano TEXT := format('despesas_consolidadas_%s', p_ano);
+    v_trimestre TEXT := format('despesas_consolidadas_%s_t%s', p_ano, p_trimestre);
+BEGIN
+    IF to_regclass(v_ano) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE despesas_consolidadas INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY LIST (trimestre)', v_ano);
+        EXECUTE format('ALTER TABLE despesas_consolidadas ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)', v_ano, p_ano, p_ano + 1);
+    END IF;
+    IF to_regclass(v_trimestre) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE despesas_consolidadas INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_trimestre);
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES IN (%s)', v_ano, v_trimestre, p_trimestre);
+    END IF;
+    RETURN v_trimestre;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION garantir_particao_despesas(INTEGER, INTEGER) IS 'Cria e anexa a partição (ano, trimestre) de despesas_consolidadas, se ainda não existir';
+\else
 -- Tabela: despesas_consolidadas (Teste 1)
 CREATE TABLE IF NOT EXISTS despesas_consolidadas (
     id BIGSERIAL PRIMARY KEY,
@@ -36,6 +88,7 @@ CREATE TABLE IF NOT EXISTS despesas_consolidadas (
     CONSTRAINT chk_ano CHECK (ano BETWEEN 2000 AND 2100),
     CONSTRAINT chk_valor_positivo CHECK (valor_despesas >= 0)
 );
+\endif
 
 COMMENT ON TABLE despesas_consolidadas IS 'Despesas detalhadas por trimestre (2.1M+ registros)';
 COMMENT ON COLUMN despesas_consolidadas.valor_despesas IS 'DECIMAL para precisão exata em cálculos financeiros';
@@ -73,6 +126,73 @@ CREATE TABLE IF NOT EXISTS import_errors (
 
 COMMENT ON TABLE import_errors IS 'Log de erros durante importação de CSVs';
 
+-- Tabela: cargas_trimestre (controle da carga incremental do import_postgresql.py)
+CREATE TABLE IF NOT EXISTS cargas_trimestre (
+    ano INTEGER NOT NULL,
+    trimestre INTEGER NOT NULL,
+    qtd_registros BIGINT NOT NULL,
+    assinatura TEXT NOT NULL,
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (ano, trimestre)
+);
+
+COMMENT ON TABLE cargas_trimestre IS 'Trimestres presentes em despesas_consolidadas e a assinatura do conteúdo carregado';
+COMMENT ON COLUMN cargas_trimestre.assinatura IS 'Soma (mod 2^64) dos hashes das linhas: trimestre com a mesma assinatura não é recarregado';
+
+-- Tabela: despesas_operadora_trimestre (resumo de despesas_consolidadas por operadora e trimestre)
+CREATE TABLE IF NOT EXISTS despesas_operadora_trimestre (
+    operadora_id INTEGER NOT NULL,
+    ano INTEGER NOT NULL,
+    trimestre INTEGER NOT NULL,
+    total_despesas DECIMAL(18,2) NOT NULL,
+    qtd_registros INTEGER NOT NULL,
+
+    PRIMARY KEY (operadora_id, ano, trimestre),
+    CONSTRAINT fk_operadora_trimestre FOREIGN KEY (operadora_id)
+        REFERENCES operadoras(id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE despesas_operadora_trimestre IS 'SUM/COUNT de despesas_consolidadas por (operadora, ano, trimestre), mantido pelas importações';
+
+-- Tabela: despesas_operadora_total (resumo de despesas_consolidadas por operadora)
+CREATE TABLE IF NOT EXISTS despesas_operadora_total (
+    operadora_id INTEGER PRIMARY KEY,
+    total_despesas DECIMAL(18,2) NOT NULL,
+    qtd_registros INTEGER NOT NULL,
+
+    CONSTRAINT fk_operadora_total FOREIGN KEY (operadora_id)
+        REFERENCES operadoras(id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE despesas_operadora_total IS 'Totais por operadora (soma de despesas_operadora_trimestre), lidos pela API';
+
+-- Função: recalcula os resumos de um trimestre (ou de todos, com NULL) e, a partir deles, os totais por operadora
+CREATE OR REPLACE FUNCTION atualizar_resumos_despesas(p_ano INTEGER DEFAULT NULL, p_trimestre INTEGER DEFAULT NULL)
+RETURNS VOID AS $$
+BEGIN
+    IF p_ano IS NULL THEN
+        DELETE FROM despesas_operadora_trimestre;
+    ELSE
+        DELETE FROM despesas_operadora_trimestre WHERE ano = p_ano AND trimestre = p_trimestre;
+    END IF;
+    INSERT INTO despesas_operadora_trimestre (operadora_id, ano, trimestre, total_despesas, qtd_registros)
+    SELECT operadora_id, ano, trimestre, SUM(valor_despesas), COUNT(*)
+    FROM despesas_consolidadas
+    WHERE p_ano IS NULL OR (ano = p_ano AND trimestre = p_trimestre)
+    GROUP BY operadora_id, ano, trimestre;
+
+    -- Poucos milhares de linhas: os totais são sempre refeitos por inteiro
+    DELETE FROM despesas_operadora_total;
+    INSERT INTO despesas_operadora_total (operadora_id, total_despesas, qtd_registros)
+    SELECT operadora_id, SUM(total_despesas), SUM(qtd_registros)
+    FROM despesas_operadora_trimestre
+    GROUP BY operadora_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION atualizar_resumos_despesas(INTEGER, INTEGER) IS 'Atualiza despesas_operadora_trimestre (um trimestre ou todos) e despesas_operadora_total';
+
 -- View: v_despesas_completas (JOIN pré-calculado)
 CREATE OR REPLACE VIEW v_despesas_completas AS
 SELECT 
@@ -102,6 +222,20 @@ $$ LANGUAGE plpgsql IMMUTABLE;
 
 COMMENT ON FUNCTION get_periodo_trimestre(INTEGER, INTEGER) IS 'Retorna label de período (ex: 2024-T3)';
 
+-- Busca de operadoras da API (Teste 4): trigramas para substring e similaridade, unaccent para ignorar acentos.
+-- Ambas as extensões fazem parte do contrib, incluído na imagem oficial do PostgreSQL
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Função: texto sem acentos e em minúsculas. unaccent(texto) é STABLE (depende do search_path) e não pode
+-- ser usada em índice; com o dicionário qualificado o resultado é fixo, então a função é IMMUTABLE
+CREATE OR REPLACE FUNCTION normalizar_busca(texto TEXT)
+RETURNS TEXT AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, texto))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+COMMENT ON FUNCTION normalizar_busca(TEXT) IS 'Texto sem acentos e em minúsculas, indexado em idx_operadoras_razao_trgm (03)';
+
 -- Listar tabelas criadas
 SELECT 
     schemaname,
@@ -109,7 +243,7 @@ SELECT
     tableowner
 FROM pg_catalog.pg_tables
 WHERE schemaname = 'public'
-    AND tablename IN ('operadoras', 'despesas_consolidadas', 'despesas_agregadas', 'import_errors')
+    AND tablename IN ('operadoras', 'despesas_consolidadas', 'despesas_agregadas', 'import_errors', 'cargas_trimestre', 'despesas_operadora_trimestre', 'despesas_operadora_total')
 ORDER BY tablename;
 
 -- Listar índices criados
@@ -119,12 +253,17 @@ SELECT
     indexdef
 FROM pg_indexes
 WHERE schemaname = 'public'
-    AND tablename IN ('operadoras', 'despesas_consolidadas', 'despesas_agregadas', 'import_errors')
+    AND tablename IN ('operadoras', 'despesas_consolidadas', 'despesas_agregadas', 'import_errors', 'cargas_trimestre', 'despesas_operadora_trimestre', 'despesas_operadora_total')
 ORDER BY tablename, indexname;
 
 \echo '✓ Estrutura de banco de dados criada com sucesso!'
-\echo '✓ 4 tabelas criadas: operadoras, despesas_consolidadas, despesas_agregadas, import_errors'
+\echo '✓ 7 tabelas criadas: operadoras, despesas_consolidadas, despesas_agregadas, import_errors, cargas_trimestre,'
+\echo '  despesas_operadora_trimestre, despesas_operadora_total'
 \echo '✓ Índices de constraints criados (execute o script 03 após a carga para os demais índices)'
 \echo '✓ Constraints de integridade aplicadas'
+\echo '✓ Extensões pg_trgm e unaccent habilitadas (busca de operadoras)'
+\if :particionado
+\echo '✓ despesas_consolidadas particionada por ano/trimestre (partições criadas na importação)'
+\endif
 \echo ''
 \echo 'Próximo passo: Executar 02_import_postgresql.sql'
@@ -60,10 +60,24 @@ DROP TABLE parsed_operadoras_final;
 \echo ''
 \echo '2/3 Importando despesas consolidadas...'
 TRUNCATE TABLE despesas_consolidadas;
+-- Recarga completa: a carga incremental do import_postgresql.py deve comparar todos os trimestres de novo
+TRUNCATE TABLE cargas_trimestre;
 
 CREATE TEMP TABLE temp_despesas (id_csv TEXT, razao TEXT, tri TEXT, ano TEXT, valor TEXT, status TEXT);
 \COPY temp_despesas FROM '/input_t1/consolidado_despesas.csv' WITH (FORMAT csv, HEADER true, DELIMITER ',');
 
+-- Layout particionado (01 com -v particionado=on): cria e anexa as partições dos trimestres do CSV
+SELECT relkind = 'p' AS particionado FROM pg_class WHERE oid = 'despesas_consolidadas'::regclass \gset
+\if :particionado
+SELECT garantir_particao_despesas(ano_n, tri_n)
+FROM (
+    SELECT DISTINCT REGEXP_REPLACE(ano, '[^0-9]', '', 'g')::INTEGER AS ano_n, REGEXP_REPLACE(tri, '[^0-9]', '', 'g')::INTEGER AS tri_n
+    FROM temp_despesas
+) t
+WHERE tri_n BETWEEN 1 AND 4 AND ano_n BETWEEN 2000 AND 2100
+ORDER BY ano_n, tri_n;
+\endif
+
 INSERT INTO despesas_consolidadas (operadora_id, trimestre, ano, data_registro, valor_despesas, status_validacao)
 SELECT 
     sub.op_id,
@@ -98,6 +112,9 @@ WHERE sub.tri_n BETWEEN 1 AND 4 AND UPPER(sub.status_n) <> 'VALOR_NEGATIVO';
 SELECT COUNT(*) as total_despesas_reais FROM despesas_consolidadas;
 DROP TABLE temp_despesas;
 
+-- Resumos por operadora/trimestre e por operadora, lidos pela API
+SELECT atualizar_resumos_despesas();
+
 -- 3/3 Importando despesas agregadas
 \echo ''
 \echo '3/3 Importando despesas agregadas...'
@@ -130,3 +147,6 @@ DROP TABLE temp_agregadas;
 
 \echo '✓ Importação concluída com sucesso!'
 ANALYZE;
+
+-- Avisa a API (Teste 4) para descartar contagens e estatísticas em cache
+NOTIFY ans_importacao;
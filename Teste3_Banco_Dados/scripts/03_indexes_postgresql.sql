@@ -2,7 +2,21 @@
 
 -- Índices Operadoras
 CREATE INDEX IF NOT EXISTS idx_operadoras_uf ON operadoras(uf);
+-- Ordem da listagem da API e chave da paginação keyset (cursor)
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_id ON operadoras(razao_social, id);
+-- Busca da API por razão social: substring sem acento (LIKE '%termo%') e similaridade de palavra (<%)
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_trgm ON operadoras USING gin (normalizar_busca(razao_social) gin_trgm_ops);
+-- Busca da API por prefixo de CNPJ ou Registro ANS (LIKE 'digitos%'): text_pattern_ops independe da collation pt_BR
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj_prefixo ON operadoras(cnpj text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_registro_prefixo ON operadoras(registro_ans text_pattern_ops);
 
+-- Índices Despesas Consolidadas (Críticos para as Queries 1 e 3)
+SELECT relkind = 'p' AS particionado FROM pg_class WHERE oid = 'despesas_consolidadas'::regclass \gset
+\if :particionado
+-- Layout particionado: índice local em cada partição (atuais e futuras). Ano e trimestre já são fixos por
+-- partição e o filtro por ano é resolvido pela poda de partições; valor e data não são filtrados pela API
+CREATE INDEX IF NOT EXISTS idx_despesas_operadora ON despesas_consolidadas(operadora_id);
+\else
 -- Índices Despesas Consolidadas (Críticos para as Queries 1 e 3)
 CREATE INDEX IF NOT EXISTS idx_despesas_operadora_trimestre 
     ON despesas_consolidadas(operadora_id, ano, trimestre);
@@ -10,12 +24,16 @@ CREATE INDEX IF NOT EXISTS idx_despesas_valor ON despesas_consolidadas(valor_des
 
 -- Índice de data de registro, caso seja necessário para auditorias futuras
 CREATE INDEX IF NOT EXISTS idx_despesas_data ON despesas_consolidadas(data_registro);
+\endif
 
 -- Índices Despesas Agregadas (Crítico para a Query 2)
 CREATE INDEX IF NOT EXISTS idx_agregadas_operadora ON despesas_agregadas(operadora_id);
 CREATE INDEX IF NOT EXISTS idx_agregadas_uf ON despesas_agregadas(uf);
 CREATE INDEX IF NOT EXISTS idx_agregadas_total ON despesas_agregadas(total_despesas DESC);
 
+-- Índice Totais por Operadora (Top 5 de /api/estatisticas)
+CREATE INDEX IF NOT EXISTS idx_total_operadora_despesas ON despesas_operadora_total(total_despesas DESC);
+
 -- Índices Logs de Erro
 CREATE INDEX IF NOT EXISTS idx_errors_tabela ON import_errors(tabela_destino);
 CREATE INDEX IF NOT EXISTS idx_errors_data ON import_errors(data_import);
@@ -19,6 +19,8 @@ dados_crescimento AS (
     FROM despesas_consolidadas dc
     JOIN operadoras o ON dc.operadora_id = o.id
     JOIN limites l ON dc.operadora_id = l.operadora_id 
+    -- Só 2024 entra nas somas: o filtro explícito deixa o planner podar as partições dos outros anos
+    WHERE dc.ano = 2024
     GROUP BY o.razao_social, o.uf, l.min_p, l.max_p
     HAVING SUM(CASE WHEN (dc.ano*10+dc.trimestre) = l.min_p THEN dc.valor_despesas ELSE 0 END) > 0
 )
@@ -7,16 +7,29 @@ DROP VIEW IF EXISTS v_despesas_completas CASCADE;
 
 -- Drop functions
 DROP FUNCTION IF EXISTS get_periodo_trimestre(INTEGER, INTEGER) CASCADE;
+DROP FUNCTION IF EXISTS garantir_particao_despesas(INTEGER, INTEGER) CASCADE;
+DROP FUNCTION IF EXISTS atualizar_resumos_despesas(INTEGER, INTEGER) CASCADE;
+-- Leva junto o índice idx_operadoras_razao_trgm
+DROP FUNCTION IF EXISTS normalizar_busca(TEXT) CASCADE;
 
 -- Drop tables (ordem inversa devido às FKs)
+DROP TABLE IF EXISTS cargas_trimestre CASCADE;
+DROP TABLE IF EXISTS despesas_operadora_total CASCADE;
+DROP TABLE IF EXISTS despesas_operadora_trimestre CASCADE;
 DROP TABLE IF EXISTS import_errors CASCADE;
 DROP TABLE IF EXISTS despesas_agregadas CASCADE;
+-- No layout particionado, as partições caem junto com a tabela mãe
 DROP TABLE IF EXISTS despesas_consolidadas CASCADE;
 DROP TABLE IF EXISTS operadoras CASCADE;
 
+-- Drop extensions
+DROP EXTENSION IF EXISTS pg_trgm;
+DROP EXTENSION IF EXISTS unaccent;
+
 \echo ''
 \echo '✓ Todas as tabelas removidas'
 \echo '✓ Views removidas'
 \echo '✓ Functions removidas'
+\echo '✓ Extensões removidas'
 \echo ''
 \echo 'Banco de dados limpo com sucesso!'
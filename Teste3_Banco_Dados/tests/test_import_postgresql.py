@@ -0,0 +1,151 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+from unittest import mock
+from contextlib import closing
+
+import pandas as pd
+import psycopg2
+
+# Executável da raiz do repositório: python -m unittest discover -s Teste3_Banco_Dados/tests
+TESTE3 = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(TESTE3))
+from import_postgresql import ImportadorPostgres, _centavos_texto
+
+PSQL = os.getenv("PSQL", "psql")
+
+CADASTRO = """\
+"Registro ANS";"CNPJ";"Razão Social";"Nome Fantasia";"Modalidade";"Logradouro";"Número";"Complemento";"Bairro";"Cidade";"UF"
+"123456";"11.222.333/0001-81";"Operadora Alfa";"Alfa";"Medicina de Grupo";"Rua A";"1";"";"Centro";"São Paulo";"SP"
+"654321";"22333444000190";"Operadora Beta";"";"Cooperativa Médica";"Rua B";"2";"";"Centro";"Belo Horizonte";"MG"
+"111111";"";"Operadora Sem CNPJ";"";"Autogestão";"Rua C";"3";"";"";"Recife";"PE"
+"""
+
+# Sinal, separador de milhar, meio centavo, valor vazio, VALOR_NEGATIVO, trimestre inválido, operadora desconhecida
+# e identificação por Registro ANS: os casos em que as regras de limpeza do 02 importam
+CONSOLIDADO = """\
+CNPJ,RazaoSocial,Trimestre,Ano,ValorDespesas,StatusValidacao
+11.222.333/0001-81,OPERADORA ALFA,1,2024,1000.50,OK
+11222333000181,OPERADORA ALFA,1,2024,-123.45,OK
+11222333000181,OPERADORA ALFA,2,2024,-50.00,VALOR_NEGATIVO
+22333444000190,OPERADORA BETA,2,2024,"1,234.565",OK
+22333444000190,OPERADORA BETA,3,2024,0.004,VALOR_ZERADO
+22333444000190,OPERADORA BETA,3,2024,,OK
+22333444000190,OPERADORA BETA,4,2024,12345678901.23,OK
+22333444000190,OPERADORA BETA,5,2024,10,OK
+111111,OPERADORA SEM CNPJ,3,2024,99.999,OK
+99999999000199,DESCONHECIDA,1,2024,10,OK
+"""
+
+AGREGADAS = """\
+RazaoSocial,UF,TotalDespesas,MediaDespesas,DesvioPadrao,QtdRegistros
+OPERADORA ALFA,SP,1123.95,561.98,619.18,2
+Operadora Beta,MG,12345680135.80,3086420033.95,,4
+"""
+
+# Tabelas comparadas pelas chaves naturais da operadora: ids e datas de gravação variam entre as cargas
+COMPARACAO = {
+    'operadoras': "SELECT registro_ans, cnpj, razao_social, modalidade, uf FROM operadoras",
+    **{tabela: f"""
+        SELECT o.registro_ans, o.cnpj, to_jsonb(t) - 'id' - 'operadora_id' - 'data_agregacao' AS linha
+        FROM {tabela} t JOIN operadoras o ON o.id = t.operadora_id
+    """ for tabela in ['despesas_consolidadas', 'despesas_agregadas', 'despesas_operadora_trimestre', 'despesas_operadora_total']},
+}
+
+class TestConversaoValores(unittest.TestCase):
+
+    def test_mesmas_regras_do_cast_sql(self):
+        textos = pd.Series(['-123.45', '1.005', '1,234.56', '', None, '5.', '.5', '0.004999', '1e-05', '00000000000000001.5'])
+        centavos, validos = _centavos_texto(textos)
+        self.assertEqual(centavos.tolist(), [12345, 101, 123456, 0, 0, 500, 50, 0, 10500, 150])
+        self.assertTrue(validos.all())
+
+    def test_valores_que_o_sql_rejeita(self):
+        _, validos = _centavos_texto(pd.Series(['1.2.3', '.', '9999999999999.99', '9999999999999.995', '10000000000000']))
+        self.assertEqual(validos.tolist(), [False, False, True, False, False])
+
+@unittest.skipUnless(os.getenv("POSTGRES_USER") and shutil.which(PSQL), "requer POSTGRES_* de um servidor PostgreSQL e psql")
+class TestImportacaoEquivalente(unittest.TestCase):
+    # Mesmo fixture pelos dois caminhos (02_import_postgresql.sql via psql e ImportadorPostgres), cada um em um
+    # banco novo criado com o 01; as tabelas resultantes precisam ser idênticas.
+    # Contra o container do docker-compose: POSTGRES_USER/POSTGRES_PASSWORD/POSTGRES_DB do .env, porta publicada
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        for nome, conteudo in [('operadoras_cadastro.csv', CADASTRO), ('consolidado_despesas.csv', CONSOLIDADO), ('despesas_agregadas.csv', AGREGADAS)]:
+            (self.dir / nome).write_text(conteudo, encoding='utf-8')
+        self.bancos = []
+
+    def tearDown(self):
+        with closing(self._admin()) as conn, conn.cursor() as cursor:
+            for banco in self.bancos:
+                cursor.execute(f"DROP DATABASE IF EXISTS {banco}")
+        shutil.rmtree(self.dir)
+
+    def _admin(self):
+        # CREATE/DROP DATABASE não rodam em transação
+        conn = ImportadorPostgres().conectar()
+        conn.autocommit = True
+        return conn
+
+    def _psql(self, banco, script):
+        ambiente = {**os.environ, "PGPASSWORD": os.environ["POSTGRES_PASSWORD"]}
+        subprocess.run([PSQL, "-X", "-q", "-v", "ON_ERROR_STOP=1", "-h", os.getenv("POSTGRES_HOST", "127.0.0.1"),
+                        "-p", os.getenv("POSTGRES_PORT", "5432"), "-U", os.environ["POSTGRES_USER"], "-d", banco, "-f", str(script)],
+                       env=ambiente, check=True, capture_output=True)
+
+    def _banco_novo(self, sufixo):
+        banco = f"teste_importacao_{os.getpid()}_{sufixo}"
+        with closing(self._admin()) as conn, conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {banco}")
+            cursor.execute(f"CREATE DATABASE {banco}")
+        self.bancos.append(banco)
+        self._psql(banco, TESTE3 / "scripts/01_ddl_postgresql.sql")
+        return banco
+
+    def _tabelas(self, banco):
+        with mock.patch.dict(os.environ, {"POSTGRES_DB": banco}):
+            conn = ImportadorPostgres().conectar()
+        try:
+            with conn.cursor() as cursor:
+                resultado = {}
+                for tabela, sql in COMPARACAO.items():
+                    cursor.execute(sql)
+                    resultado[tabela] = sorted(cursor.fetchall(), key=str)
+                cursor.execute("SELECT count(*) FROM import_errors")
+                resultado['import_errors'] = cursor.fetchone()[0]
+                return resultado
+        finally:
+            conn.close()
+
+    def test_sql_e_python_produzem_as_mesmas_tabelas(self):
+        banco_sql = self._banco_novo("sql")
+        script = (TESTE3 / "scripts/02_import_postgresql.sql").read_text(encoding='utf-8')
+        for volume in ('/input_t1/', '/input_t2_out/', '/input_t2_temp/'):
+            script = script.replace(volume, f"{self.dir.as_posix()}/")
+        (self.dir / "02.sql").write_text(script, encoding='utf-8')
+        self._psql(banco_sql, self.dir / "02.sql")
+
+        banco_py = self._banco_novo("py")
+        arquivos = {
+            "POSTGRES_DB": banco_py,
+            "CADASTRO_CSV": str(self.dir / "operadoras_cadastro.csv"),
+            "CONSOLIDADO": str(self.dir / "consolidado_despesas.csv"),
+            "AGREGADAS_CSV": str(self.dir / "despesas_agregadas.csv"),
+        }
+        with mock.patch.dict(os.environ, arquivos):
+            ImportadorPostgres().executar()
+
+        esperado, obtido = self._tabelas(banco_sql), self._tabelas(banco_py)
+        self.assertEqual(len(esperado['despesas_consolidadas']), 7)
+        self.assertIn(123.45, [linha['valor_despesas'] for _, _, linha in esperado['despesas_consolidadas']])
+        for tabela in COMPARACAO:
+            self.assertEqual(obtido[tabela], esperado[tabela], tabela)
+        self.assertEqual(obtido['import_errors'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
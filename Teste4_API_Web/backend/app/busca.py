@@ -0,0 +1,53 @@
+import re
+from typing import List, NamedTuple
+
+# Busca de operadoras: razão social por substring sem acento e por similaridade de palavra (pg_trgm), ou
+# prefixo de CNPJ / Registro ANS. normalizar_busca() é a função do 01_ddl_postgresql.sql usada no índice
+# GIN idx_operadoras_razao_trgm (03); o termo passa pela mesma função, dentro do SQL.
+NOME_NORMALIZADO = "normalizar_busca(o.razao_social)"
+
+# Só dígitos e formatação de CNPJ (12.345.678/0001-90): busca por documento
+FORMATO_DOCUMENTO = re.compile(r"^[\d\s./-]+$")
+# Termos mais curtos casariam por similaridade com quase tudo
+MIN_CARACTERES_SIMILARIDADE = 4
+
+class ClausulasBusca(NamedTuple):
+    filtro: str
+    filtro_params: List[str]
+    relevancia: str
+    relevancia_params: List[str]
+
+# Escapa os curingas do LIKE digitados pelo usuário
+def escapar_like(termo: str) -> str:
+    return re.sub(r"([\\%_])", r"\\\1", termo)
+
+# Monta o filtro e a relevância (0 = melhor) de uma busca não vazia
+def montar_busca(busca: str) -> ClausulasBusca:
+    documento = re.sub(r"\D", "", busca) if FORMATO_DOCUMENTO.match(busca) else ""
+    if documento:
+        # Prefixo de CNPJ ou Registro ANS, servido pelos índices text_pattern_ops; o documento exato vem primeiro
+        return ClausulasBusca(
+            filtro="(o.cnpj LIKE %s OR o.registro_ans LIKE %s)",
+            filtro_params=[f"{documento}%"] * 2,
+            relevancia="CASE WHEN o.cnpj = %s OR o.registro_ans = %s THEN 0 ELSE 1 END",
+            relevancia_params=[documento] * 2,
+        )
+
+    termo = escapar_like(busca)
+    filtro = f"{NOME_NORMALIZADO} LIKE normalizar_busca(%s)"
+    filtro_params = [f"%{termo}%"]
+    if len(busca) >= MIN_CARACTERES_SIMILARIDADE:
+        # Tolera erro de digitação: similaridade de palavra acima de pg_trgm.word_similarity_threshold (0,6)
+        filtro = f"({filtro} OR normalizar_busca(%s) <%% {NOME_NORMALIZADO})"
+        filtro_params.append(busca)
+
+    # Começo do nome, começo de uma palavra, meio de uma palavra e, por último, só parecido
+    return ClausulasBusca(
+        filtro=filtro,
+        filtro_params=filtro_params,
+        relevancia=f"""CASE WHEN {NOME_NORMALIZADO} LIKE normalizar_busca(%s) THEN 0
+                     WHEN {NOME_NORMALIZADO} LIKE normalizar_busca(%s) THEN 1
+                     WHEN {NOME_NORMALIZADO} LIKE normalizar_busca(%s) THEN 2
+                     ELSE 3 END""",
+        relevancia_params=[f"{termo}%", f"% {termo}%", f"%{termo}%"],
+    )
@@ -1,83 +1,209 @@
 import os
-from typing import Optional
-from venv import logger
-from psycopg2 import pool
-from psycopg2.pool import PoolError
-from psycopg2.extras import RealDictCursor
+import time
+import asyncio
+import logging
+import statistics
+from weakref import WeakKeyDictionary
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from psycopg import AsyncConnection
+from psycopg import OperationalError
+from psycopg.errors import QueryCanceled
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
 from fastapi import HTTPException
 
-# Pool de conexões global
-db_pool: Optional[pool.SimpleConnectionPool] = None
+logger = logging.getLogger(__name__)
 
-# Obtém o pool de conexões
-def get_db_pool() -> pool.SimpleConnectionPool:
+# Pool de conexões global (assíncrono: quem não consegue conexão espera na fila, sem ocupar thread)
+db_pool: Optional[AsyncConnectionPool] = None
+
+# Tamanho do pool, tempo máximo (s) de espera por uma conexão e tamanho máximo da fila de espera
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_MAX_ESPERA = int(os.getenv("DB_POOL_MAX_ESPERA", 1000))
+# Reciclagem: conexões são fechadas após DB_POOL_MAX_LIFETIME (s) de vida ou DB_POOL_MAX_IDLE (s) ociosas
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 3600))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", 600))
+# Conexões ociosas há mais de DB_POOL_VALIDAR_APOS (s) são testadas na retirada
+DB_POOL_VALIDAR_APOS = float(os.getenv("DB_POOL_VALIDAR_APOS", 30))
+# Tempo máximo de cada consulta no servidor (statement_timeout), em ms
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000))
+
+# Esperas por conexão mais recentes (s), para os percentis de /api/metricas/pool
+_esperas = deque(maxlen=1000)
+# Último uso de cada conexão do pool (time.monotonic)
+_ultimo_uso: "WeakKeyDictionary[AsyncConnection, float]" = WeakKeyDictionary()
+
+# Canal do NOTIFY enviado pelas importações do Teste 3 ao fim de cada carga
+CANAL_IMPORTACAO = "ans_importacao"
+_tarefa_escuta: Optional[asyncio.Task] = None
+
+# Parâmetros de conexão a partir das variáveis de ambiente
+def get_db_params() -> dict:
+    required_vars = ["DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"]
+    missing_vars = [var for var in required_vars if var not in os.environ]
+
+    if missing_vars:
+        raise RuntimeError(f"Configuração de banco incompleta. Variáveis ausentes: {', '.join(missing_vars)}")
+
+    return {
+        "host": os.environ["DB_HOST"],
+        "port": int(os.environ["DB_PORT"]),
+        "dbname": os.environ["DB_NAME"],
+        "user": os.environ["DB_USER"],
+        "password": os.environ["DB_PASSWORD"],
+    }
+
+# Executado pelo pool ao criar cada conexão: recém-aberta, ela conta como usada agora e não recebe ping na primeira
+# retirada
+async def _registrar_conexao(conn: AsyncConnection):
+    _ultimo_uso[conn] = time.monotonic()
+
+# Validação na retirada. Uma conexão que acabou de ser devolvida em bom estado (o pool descarta as quebradas
+# na devolução) não é testada; as ociosas há mais tempo podem ter caído (firewall, restart) e recebem um ping
+async def _validar_conexao(conn: AsyncConnection):
+    if time.monotonic() - _ultimo_uso.get(conn, float("-inf")) > DB_POOL_VALIDAR_APOS:
+        await AsyncConnectionPool.check_connection(conn)
+
+# Obtém o pool de conexões. As consultas da API são só leituras: autocommit evita BEGIN/COMMIT a cada uso.
+# statement_timeout vai nos parâmetros de conexão, sem ida extra ao banco
+def get_db_pool() -> AsyncConnectionPool:
     global db_pool
     if db_pool is None:
-        required_vars = ["DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"]
-        missing_vars = [var for var in required_vars if var not in os.environ]
-        
-        if missing_vars:
-            raise RuntimeError(f"Configuração de banco incompleta. Variáveis ausentes: {', '.join(missing_vars)}")
-
-        db_pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=20,
-            host=os.environ["DB_HOST"],
-            port=int(os.environ["DB_PORT"]),
-            database=os.environ["DB_NAME"],
-            user=os.environ["DB_USER"],
-            password=os.environ["DB_PASSWORD"]
+        db_pool = AsyncConnectionPool(
+            kwargs={
+                **get_db_params(),
+                "autocommit": True,
+                "row_factory": dict_row,
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+            },
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            max_waiting=DB_POOL_MAX_ESPERA,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=DB_POOL_MAX_IDLE,
+            configure=_registrar_conexao,
+            # Conexões que falham na validação são descartadas e substituídas
+            check=_validar_conexao,
+            open=False,
         )
     return db_pool
 
-# Obtém uma conexão do pool
-def get_db_connection():
-    try:
-        return get_db_pool().getconn()
-    except PoolError:
-        raise HTTPException(status_code=503, detail="Servidor sobrecarregado (limite de conexões atingido). Tente novamente em instantes.")
+# Abre o pool e espera as conexões mínimas (falha rápido se o banco estiver fora)
+async def open_db_pool():
+    await get_db_pool().open(wait=True, timeout=DB_POOL_TIMEOUT)
 
-# Devolve a conexão ao pool de forma segura.
-def release_db_connection(conn):
+# Obtém uma conexão do pool, esperando na fila até DB_POOL_TIMEOUT; devolve ao sair do bloco
+@asynccontextmanager
+async def get_db_connection() -> AsyncIterator[AsyncConnection]:
+    pool = get_db_pool()
+    inicio = time.perf_counter()
     try:
-        if conn:
-            get_db_pool().putconn(conn)
-    except Exception:
-        logger.warning("⚠️ Falha ao devolver conexão ao pool. A conexão pode já ter sido encerrada.")
-        pass
-
-# Executa query e retorna resultados
-def execute_query(query: str, params: Optional[tuple] = None, fetch_one: bool = False):
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchone() if fetch_one else cursor.fetchall()
-    except Exception:
-        conn.rollback()
-        raise
+        conn = await pool.getconn()
+    except (PoolTimeout, TooManyRequests):
+        raise HTTPException(status_code=503, detail="Servidor sobrecarregado (limite de conexões atingido). Tente novamente em instantes.")
     finally:
-        release_db_connection(conn)
-
-# Executa query e retorna (resultados, count total)
-def execute_query_with_count(query: str, count_query: str, params: Optional[tuple] = None, count_params: Optional[tuple] = None):
-    conn = get_db_connection()
+        _esperas.append(time.perf_counter() - inicio)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, params or ())
-            results = cursor.fetchall()
-            cursor.execute(count_query, count_params if count_params is not None else (params or ()))
-            count = cursor.fetchone()['count']
-            return results, count
-    except Exception as e:
-        conn.rollback()
-        raise e
+        yield conn
+    except QueryCanceled:
+        raise HTTPException(status_code=503, detail="Consulta excedeu o tempo limite. Tente novamente em instantes.")
     finally:
-        release_db_connection(conn)
+        _ultimo_uso[conn] = time.monotonic()
+        await pool.putconn(conn)
+
+# Executa a operação com uma conexão do pool. As consultas da API são só leituras: se a conexão caiu antes
+# de ser validada (ociosa há menos de DB_POOL_VALIDAR_APOS), a operação é repetida uma vez em outra conexão
+async def _com_conexao(operacao: Callable[[AsyncConnection], Awaitable[Any]]):
+    for tentativa in range(2):
+        async with get_db_connection() as conn:
+            try:
+                return await operacao(conn)
+            except OperationalError:
+                if not conn.broken or tentativa:
+                    raise
+                logger.warning("⚠️ Conexão perdida; repetindo a consulta em outra conexão.")
+
+# Executa query e retorna resultados. preparar=True: prepared statement no servidor, reaproveitado pela
+# conexão nas execuções seguintes (consultas de texto fixo). Com False, a consulta nunca é preparada: as
+# buscas dinâmicas precisam do termo no planejamento, que um plano genérico não teria
+async def execute_query(query: str, params: Optional[tuple] = None, fetch_one: bool = False, preparar: bool = False):
+    async def operacao(conn: AsyncConnection):
+        cursor = await conn.execute(query, params or (), prepare=preparar)
+        return await cursor.fetchone() if fetch_one else await cursor.fetchall()
+    return await _com_conexao(operacao)
+
+# Executa query e retorna (resultados, count total). Em pipeline, as duas consultas vão juntas ao banco
+async def execute_query_with_count(query: str, count_query: str, params: Optional[tuple] = None, count_params: Optional[tuple] = None, preparar: bool = False):
+    async def operacao(conn: AsyncConnection):
+        async with conn.pipeline():
+            resultado = await conn.execute(query, params or (), prepare=preparar)
+            contagem = await conn.execute(count_query, count_params if count_params is not None else (params or ()), prepare=preparar)
+        return await resultado.fetchall(), (await contagem.fetchone())['count']
+    return await _com_conexao(operacao)
+
+# Ocupação do pool e tempo de espera por conexão (get_stats do psycopg_pool + últimas esperas medidas aqui)
+def get_db_pool_metrics() -> dict:
+    stats = get_db_pool().get_stats()
+    tamanho = stats.get("pool_size", 0)
+    em_uso = tamanho - stats.get("pool_available", 0)
+    esperas = list(_esperas)
+    p50 = p99 = 0.0
+    if len(esperas) > 1:
+        percentis = statistics.quantiles(esperas, n=100)
+        p50, p99 = percentis[49], percentis[98]
+    return {
+        "tamanho": tamanho,
+        "minimo": stats.get("pool_min", DB_POOL_MIN),
+        "maximo": stats.get("pool_max", DB_POOL_MAX),
+        "em_uso": em_uso,
+        "utilizacao": em_uso / DB_POOL_MAX,
+        "na_fila": stats.get("requests_waiting", 0),
+        "requisicoes": stats.get("requests_num", 0),
+        "requisicoes_enfileiradas": stats.get("requests_queued", 0),
+        "requisicoes_recusadas": stats.get("requests_errors", 0),
+        "espera_total_ms": stats.get("requests_wait_ms", 0),
+        "espera_p50_ms": p50 * 1000,
+        "espera_p99_ms": p99 * 1000,
+        "conexoes_abertas": stats.get("connections_num", 0),
+        "conexoes_descartadas": stats.get("connections_lost", 0) + stats.get("returns_bad", 0),
+    }
+
+# Escuta o canal de importação em uma conexão dedicada (fora do pool) e chama `ao_importar` a cada carga
+# concluída. Também chama ao (re)conectar, já que avisos podem ter sido perdidos enquanto estava desconectado.
+async def _escutar_importacoes(ao_importar: Callable[[], None]):
+    while True:
+        try:
+            async with await AsyncConnection.connect(**get_db_params(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {CANAL_IMPORTACAO}")
+                ao_importar()
+                async for _ in conn.notifies():
+                    ao_importar()
+        except Exception:
+            logger.warning("⚠️ Escuta de importações interrompida. Nova tentativa em 5s.", exc_info=True)
+            await asyncio.sleep(5)
+
+# Inicia a escuta de importações em uma tarefa do event loop
+def start_import_listener(ao_importar: Callable[[], None]):
+    global _tarefa_escuta
+    _tarefa_escuta = asyncio.create_task(_escutar_importacoes(ao_importar))
+
+# Cancela a escuta e fecha a conexão dedicada
+async def stop_import_listener():
+    global _tarefa_escuta
+    if _tarefa_escuta is not None:
+        _tarefa_escuta.cancel()
+        with suppress(asyncio.CancelledError):
+            await _tarefa_escuta
+        _tarefa_escuta = None
 
 # Encerra todas as conexões do pool explicitamente
-def close_db_pool():
+async def close_db_pool():
     global db_pool
     if db_pool is not None:
-        db_pool.closeall()
+        await db_pool.close()
         db_pool = None
@@ -16,6 +16,11 @@ class OperadoraBase(BaseModel):
 class OperadoraListItem(OperadoraBase):
     total_despesas: Optional[float] = Field(0.0, description="Total de despesas consolidadas")
 
+class SugestaoOperadora(BaseModel):
+    id: int
+    cnpj: str = Field(..., description="Identificador usado nas rotas /api/operadoras/{cnpj}")
+    razao_social: str
+
 class OperadoraDetailResponse(OperadoraBase):
     data_cadastro: Optional[datetime] = None
     total_despesas: float = 0.0
@@ -60,10 +65,11 @@ class EstatisticasResponse(BaseModel):
 class PaginationMeta(BaseModel):
     page: int = 1
     limit: int = 10
-    total: int = 0
-    total_pages: int = 0
+    total: Optional[int] = Field(0, description="Total de itens (null com CONTAGEM_OPERADORAS=nenhuma na listagem sem busca)")
+    total_pages: Optional[int] = 0
     has_next: bool = False
     has_prev: bool = False
+    next_cursor: Optional[str] = Field(None, description="Cursor para a próxima página (parâmetro cursor)")
 
 class OperadoraListResponse(BaseModel):
     data: List[OperadoraListItem] = []
@@ -72,3 +78,19 @@ class OperadoraListResponse(BaseModel):
 class DespesasPorUF(BaseModel):
     ufs: List[str] = []
     valores: List[float] = []
+
+class MetricasPool(BaseModel):
+    tamanho: int = Field(0, description="Conexões abertas no pool")
+    minimo: int = 0
+    maximo: int = 0
+    em_uso: int = Field(0, description="Conexões emprestadas a requisições")
+    utilizacao: float = Field(0.0, description="em_uso / maximo")
+    na_fila: int = Field(0, description="Requisições esperando conexão agora")
+    requisicoes: int = Field(0, description="Conexões pedidas desde o início")
+    requisicoes_enfileiradas: int = Field(0, description="Pedidos que precisaram esperar")
+    requisicoes_recusadas: int = Field(0, description="Pedidos que receberam 503 (tempo ou fila esgotados)")
+    espera_total_ms: int = 0
+    espera_p50_ms: float = Field(0.0, description="Espera por conexão, últimas 1000 requisições")
+    espera_p99_ms: float = 0.0
+    conexoes_abertas: int = Field(0, description="Conexões criadas desde o início (inclui recicladas)")
+    conexoes_descartadas: int = Field(0, description="Conexões quebradas detectadas na retirada ou devolução")
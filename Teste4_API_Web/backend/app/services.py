@@ -1,5 +1,11 @@
-from typing import Optional, Dict, Any
+import os
+import json
+import base64
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import HTTPException
 from app.database import execute_query, execute_query_with_count
+from app.cache import cache_manager
+from app.busca import montar_busca
 from app.models import (
     OperadoraListResponse,
     PaginationMeta,
@@ -9,23 +15,67 @@ from app.models import (
     OperadoraBase,
     EstatisticasResponse,
     TopOperadoraItem,
-    PeriodoAnalise
+    PeriodoAnalise,
+    SugestaoOperadora
 )
 import math
 
+# Contagens de operadoras mudam só com importação (que limpa o cache via LISTEN/NOTIFY), então o TTL é longo
+CACHE_TTL_CONTAGEM = int(os.getenv("CACHE_TTL_CONTAGEM", 3600))
+# Total da listagem sem busca: exata (COUNT), estimada (pg_class.reltuples) ou nenhuma (só has_next)
+CONTAGEM_OPERADORAS = os.getenv("CONTAGEM_OPERADORAS", "exata").lower()
+MODOS_CONTAGEM = ("exata", "estimada", "nenhuma")
+
+# Cursor opaco da paginação keyset: chave de ordenação da última linha da página, em JSON base64url.
+# (razao_social, id) na listagem sem busca; (relevancia, razao_social, id) com busca
+def codificar_cursor(*chave) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(chave)).encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str, com_relevancia: bool = False) -> Tuple:
+    tipos = (int, str, int) if com_relevancia else (str, int)
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(chave, list) and len(chave) == len(tipos) and all(type(v) is t for v, t in zip(chave, tipos)):
+            return tuple(chave)
+    except (ValueError, TypeError):
+        pass
+    raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
 class OperadoraService:
     # Serviço para operações com operadoras
 
-    def listar_operadoras(
+    def __init__(self, contagem: str = CONTAGEM_OPERADORAS):
+        if contagem not in MODOS_CONTAGEM:
+            raise ValueError(f"CONTAGEM_OPERADORAS inválida: {contagem!r} (use {', '.join(MODOS_CONTAGEM)})")
+        self.contagem = contagem
+
+    async def listar_operadoras(
         self,
         page: int = 1,
         limit: int = 10,
-        busca: Optional[str] = None
+        busca: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> OperadoraListResponse:
-        # Lista operadoras com paginação offset-based    
+        # Lista operadoras com paginação offset-based ou, com cursor, keyset na chave de ordenação:
+        # a página seguinte começa logo após a última linha da anterior, sem OFFSET.
+        # Com busca, a ordem é por relevância (app/busca.py) e depois razão social
         offset = (page - 1) * limit
+        busca = busca.strip() if busca else None
+        
+        where_clause = ""
+        params = []
+        # Chave de ordenação (e do cursor); com busca, a relevância vem na frente
+        chave = "o.razao_social, o.id"
+        relevancia, relevancia_params = "0", []
         
-        base_query = """
+        if busca:
+            clausulas = montar_busca(busca)
+            where_clause = f" WHERE {clausulas.filtro}"
+            params = clausulas.filtro_params
+            relevancia, relevancia_params = clausulas.relevancia, clausulas.relevancia_params
+            chave = f"{relevancia}, {chave}"
+        
+        base_query = f"""
             SELECT 
                 o.id,
                 o.registro_ans,
@@ -33,87 +83,130 @@ class OperadoraService:
                 o.razao_social,
                 o.modalidade,
                 o.uf,
-                COALESCE(SUM(dc.valor_despesas), 0) as total_despesas
+                COALESCE(t.total_despesas, 0) as total_despesas,
+                {relevancia} as relevancia
             FROM operadoras o
-            LEFT JOIN despesas_consolidadas dc ON o.id = dc.operadora_id
+            LEFT JOIN despesas_operadora_total t ON o.id = t.operadora_id
         """
+        ordem = "relevancia, o.razao_social, o.id" if busca else "o.razao_social, o.id"
         
-        where_clause = ""
-        params = []
-        
-        if busca:
-            if busca.isdigit():
-                where_clause = " WHERE o.cnpj = %s OR o.razao_social ILIKE %s"
-                params = [busca, f"{busca}%"]
-            else:
-                where_clause = " WHERE o.razao_social ILIKE %s"
-                params = [f"{busca}%"]
-        
-        query = base_query + where_clause + """
-            GROUP BY o.id
-            ORDER BY o.razao_social
+        # limit + 1 linhas: a sobra indica se existe próxima página
+        if cursor:
+            valores = decodificar_cursor(cursor, com_relevancia=bool(busca))
+            keyset = " AND" if where_clause else " WHERE"
+            keyset += f" ({chave}) > ({', '.join(['%s'] * len(valores))})"
+            query = base_query + where_clause + keyset + f"""
+            ORDER BY {ordem}
+            LIMIT %s
+        """
+            query_params = relevancia_params + params + relevancia_params + list(valores) + [limit + 1]
+        else:
+            query = base_query + where_clause + f"""
+            ORDER BY {ordem}
             LIMIT %s OFFSET %s
         """
-        query_params = params + [limit, offset]
+            query_params = relevancia_params + params + [limit + 1, offset]
         
-        count_query = f"""
-            SELECT COUNT(DISTINCT o.id) as count
+        if busca:
+            count_query = f"""
+            SELECT COUNT(*) as count
             FROM operadoras o
             {where_clause}
         """
+        elif self.contagem == "estimada":
+            # reltuples é -1 antes do primeiro ANALYZE; nesse caso cai para a contagem exata
+            count_query = """
+            SELECT CASE WHEN reltuples >= 0 THEN reltuples::bigint
+                        ELSE (SELECT COUNT(*) FROM operadoras) END as count
+            FROM pg_class
+            WHERE oid = 'operadoras'::regclass
+        """
+        else:
+            count_query = "SELECT COUNT(*) as count FROM operadoras o"
         
-        results, total = execute_query_with_count(
-            query,
-            count_query,
-            params=tuple(query_params), 
-            count_params=tuple(params) if params else None 
-        )
+        # Total por prefixo de busca normalizado: só a primeira página de cada busca paga a contagem
+        sem_contagem = not busca and self.contagem == "nenhuma"
+        cache_key = f"contagem_operadoras:{(busca or '').lower()}"
+        total = None if sem_contagem else cache_manager.get(cache_key)
+        
+        if total is not None or sem_contagem:
+            results = await execute_query(query, tuple(query_params), preparar=not busca)
+        else:
+            results, total = await execute_query_with_count(
+                query,
+                count_query,
+                params=tuple(query_params), 
+                count_params=tuple(params),
+                preparar=not busca
+            )
+            cache_manager.set(cache_key, total, ttl=CACHE_TTL_CONTAGEM)
         
-        operadoras = [OperadoraListItem(**row) for row in results]
+        has_next = len(results) > limit
+        operadoras = [OperadoraListItem(**row) for row in results[:limit]]
+        if has_next:
+            ultima = results[limit - 1]
+            chave_cursor = ([ultima['relevancia']] if busca else []) + [ultima['razao_social'], ultima['id']]
         
-        total_pages = math.ceil(total / limit) if total > 0 else 0
+        total_pages = (math.ceil(total / limit) if total > 0 else 0) if total is not None else None
         meta = PaginationMeta(
             page=page,
             limit=limit,
             total=total,
             total_pages=total_pages,
-            has_next=page < total_pages,
-            has_prev=page > 1
+            has_next=has_next,
+            has_prev=page > 1,
+            next_cursor=codificar_cursor(*chave_cursor) if has_next else None
         )
         
         return OperadoraListResponse(data=operadoras, meta=meta)
     
-    def buscar_por_cnpj(self, cnpj: str) -> Optional[OperadoraDetailResponse]:
-        # Busca operadora por CNPJ com agregação protegida
+    async def sugerir_operadoras(self, termo: str, limit: int = 8) -> List[SugestaoOperadora]:
+        # Autocompletar: mesma busca e relevância da listagem, sem despesas, contagem nem paginação
+        termo = termo.strip()
+        if not termo:
+            return []
+        
+        clausulas = montar_busca(termo)
+        query = f"""
+            SELECT o.id, o.cnpj, o.razao_social
+            FROM operadoras o
+            WHERE {clausulas.filtro}
+            ORDER BY {clausulas.relevancia}, o.razao_social, o.id
+            LIMIT %s
+        """
+        results = await execute_query(query, tuple(clausulas.filtro_params + clausulas.relevancia_params + [limit]))
+        return [SugestaoOperadora(**row) for row in results]
+    
+    async def buscar_por_cnpj(self, cnpj: str) -> Optional[OperadoraDetailResponse]:
+        # Busca operadora por CNPJ com os totais pré-calculados (despesas_operadora_total)
         query = """
             SELECT 
                 o.*,
-                COUNT(dc.id) as total_registros,
-                COALESCE(SUM(dc.valor_despesas), 0) as total_despesas,
+                COALESCE(t.qtd_registros, 0) as total_registros,
+                COALESCE(t.total_despesas, 0) as total_despesas,
                 CASE 
-                    WHEN COUNT(dc.id) > 0 THEN COALESCE(SUM(dc.valor_despesas) / COUNT(dc.id), 0)
+                    WHEN t.qtd_registros > 0 THEN t.total_despesas / t.qtd_registros
                     ELSE 0 
                 END as media_despesas
             FROM operadoras o
-            LEFT JOIN despesas_consolidadas dc ON o.id = dc.operadora_id
+            LEFT JOIN despesas_operadora_total t ON o.id = t.operadora_id
             WHERE o.cnpj = %s
-            GROUP BY o.id
         """
         
-        result = execute_query(query, (cnpj,), fetch_one=True)
+        result = await execute_query(query, (cnpj,), fetch_one=True, preparar=True)
         
         if result:
             return OperadoraDetailResponse(**result)
         return None
     
-    def buscar_historico_despesas(self, cnpj: str) -> Dict[str, Any]:
+    async def buscar_historico_despesas(self, cnpj: str) -> Dict[str, Any]:
         # Busca histórico de despesas de uma operadora
         operadora_query = """
             SELECT id, registro_ans, cnpj, razao_social, modalidade, uf
             FROM operadoras
             WHERE cnpj = %s
         """
-        operadora = execute_query(operadora_query, (cnpj,), fetch_one=True)
+        operadora = await execute_query(operadora_query, (cnpj,), fetch_one=True, preparar=True)
         
         if not operadora:
             return {
@@ -124,18 +217,18 @@ class OperadoraService:
                 'media': 0
             }
         
+        # Uma linha por trimestre já somada em despesas_operadora_trimestre (busca pela PK)
         despesas_query = """
             SELECT 
                 ano,
                 trimestre,
-                SUM(valor_despesas) as valor_despesas,
+                total_despesas as valor_despesas,
                 ano || '-T' || trimestre as periodo
-            FROM despesas_consolidadas
+            FROM despesas_operadora_trimestre
             WHERE operadora_id = %s
-            GROUP BY ano, trimestre
             ORDER BY ano, trimestre
         """
-        despesas = execute_query(despesas_query, (operadora['id'],))
+        despesas = await execute_query(despesas_query, (operadora['id'],), preparar=True)
         
         soma_total = sum(d['valor_despesas'] for d in despesas)
         total_registros = len(despesas)
@@ -153,34 +246,33 @@ class OperadoraService:
 class EstatisticasService:
     # Serviço para estatísticas agregadas
     
-    def calcular_estatisticas(self) -> EstatisticasResponse:
-        # Estatísticas gerais das despesas consolidadas
+    async def calcular_estatisticas(self) -> EstatisticasResponse:
+        # Estatísticas gerais das despesas consolidadas, a partir do resumo por operadora/trimestre
         stats_query = """
             SELECT 
-                COALESCE(SUM(valor_despesas), 0) as total_despesas,
-                COALESCE(AVG(valor_despesas), 0) as media_despesas,
+                COALESCE(SUM(total_despesas), 0) as total_despesas,
+                COALESCE(SUM(total_despesas) / NULLIF(SUM(qtd_registros), 0), 0) as media_despesas,
                 COUNT(DISTINCT operadora_id) as total_operadoras,
-                COUNT(*) as total_registros,
+                COALESCE(SUM(qtd_registros), 0) as total_registros,
                 MIN(ano) as ano_min,
                 MAX(ano) as ano_max,
                 MIN(trimestre) as trimestre_min,
                 MAX(trimestre) as trimestre_max
-            FROM despesas_consolidadas
+            FROM despesas_operadora_trimestre
         """
-        stats = execute_query(stats_query, fetch_one=True)
+        stats = await execute_query(stats_query, fetch_one=True, preparar=True)
         
         top5_query = """
             SELECT 
                 o.razao_social,
                 o.uf,
-                SUM(dc.valor_despesas) as total_despesas
-            FROM operadoras o
-            INNER JOIN despesas_consolidadas dc ON o.id = dc.operadora_id
-            GROUP BY o.id, o.razao_social, o.uf
-            ORDER BY total_despesas DESC
+                t.total_despesas
+            FROM despesas_operadora_total t
+            INNER JOIN operadoras o ON o.id = t.operadora_id
+            ORDER BY t.total_despesas DESC
             LIMIT 5
         """
-        top5 = execute_query(top5_query)
+        top5 = await execute_query(top5_query, preparar=True)
         
         return EstatisticasResponse(
             total_despesas=float(stats['total_despesas']),
@@ -196,20 +288,20 @@ class EstatisticasService:
             )
         )
     
-    def despesas_por_uf(self) -> Dict[str, Any]:
+    async def despesas_por_uf(self) -> Dict[str, Any]:
         # Retorna despesas agregadas por UF (para gráfico)
         query = """
             SELECT 
                 o.uf,
-                SUM(dc.valor_despesas) as total_despesas
+                SUM(t.total_despesas) as total_despesas
             FROM operadoras o
-            INNER JOIN despesas_consolidadas dc ON o.id = dc.operadora_id
+            INNER JOIN despesas_operadora_total t ON o.id = t.operadora_id
             WHERE o.uf IS NOT NULL
             GROUP BY o.uf
             ORDER BY total_despesas DESC
             LIMIT 10
         """
-        results = execute_query(query)
+        results = await execute_query(query, preparar=True)
         
         return {
             'ufs': [row['uf'] for row in results],
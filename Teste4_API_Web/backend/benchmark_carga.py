@@ -0,0 +1,77 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import statistics
+import urllib.request
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Teste de carga contra a API já em execução: python benchmark_carga.py [url] [clientes] [segundos]
+# Cada cliente mantém uma conexão HTTP/1.1 keep-alive e dispara requisições em sequência, sem pausa:
+# 50% listagem (páginas 1 a 50), 25% detalhe e 25% histórico de operadoras reais. Só biblioteca padrão,
+# para o cliente não ser o gargalo nem exigir dependências extras.
+
+PAGINAS = 50
+
+def carregar_cnpjs(url):
+    with urllib.request.urlopen(f"{url}/api/operadoras?limit=100") as resposta:
+        return [op['cnpj'] for op in json.load(resposta)['data']]
+
+def sortear_rota(rng, cnpjs):
+    sorteio = rng.random()
+    if sorteio < 0.5:
+        return f"/api/operadoras?page={rng.randint(1, PAGINAS)}&limit=10"
+    cnpj = rng.choice(cnpjs)
+    return f"/api/operadoras/{cnpj}" if sorteio < 0.75 else f"/api/operadoras/{cnpj}/despesas"
+
+async def requisitar(leitor, escritor, host, rota):
+    escritor.write(f"GET {rota} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await escritor.drain()
+    status = int((await leitor.readline()).split()[1])
+    tamanho = 0
+    while (linha := await leitor.readline()) not in (b"\r\n", b""):
+        nome, _, valor = linha.decode().partition(":")
+        if nome.lower() == "content-length":
+            tamanho = int(valor)
+    await leitor.readexactly(tamanho)
+    return status
+
+async def cliente(indice, url, cnpjs, fim, latencias, status):
+    partes = urlsplit(url)
+    rng = random.Random(indice)
+    leitor, escritor = await asyncio.open_connection(partes.hostname, partes.port or 80)
+    try:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                codigo = await requisitar(leitor, escritor, partes.netloc, sortear_rota(rng, cnpjs))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                status["conexão"] += 1
+                escritor.close()
+                leitor, escritor = await asyncio.open_connection(partes.hostname, partes.port or 80)
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            status[codigo] += 1
+    finally:
+        escritor.close()
+
+async def executar(url, clientes, segundos):
+    cnpjs = carregar_cnpjs(url)
+    latencias, status = [], Counter()
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i, url, cnpjs, inicio + segundos, latencias, status) for i in range(clientes)))
+    duracao = time.perf_counter() - inicio
+
+    percentis = statistics.quantiles(latencias, n=100)
+    print(f"\n{url}: {clientes} clientes por {segundos}s")
+    print(f"  {len(latencias)} requisições, {len(latencias) / duracao:.0f} req/s")
+    print(f"  latência p50 {percentis[49] * 1000:.0f}ms, p99 {percentis[98] * 1000:.0f}ms, máx {max(latencias) * 1000:.0f}ms")
+    print(f"  respostas: {', '.join(f'{codigo}: {qtd}' for codigo, qtd in sorted(status.items(), key=str))}")
+
+if __name__ == "__main__":
+    url = sys.argv[1].rstrip("/") if len(sys.argv) > 1 else "http://localhost:8000"
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    segundos = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    asyncio.run(executar(url, clientes, segundos))
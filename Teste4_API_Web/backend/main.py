@@ -1,18 +1,20 @@
 import os
 import uvicorn
 import logging
-from typing import Optional
+from typing import List, Optional
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Query, Path, BackgroundTasks 
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import get_db_connection, close_db_pool
+from app.database import open_db_pool, close_db_pool, start_import_listener, stop_import_listener, get_db_pool_metrics
 from app.models import (
     OperadoraDetailResponse,
     DespesasHistoricoResponse,
     EstatisticasResponse,
     OperadoraListResponse,
-    DespesasPorUF
+    DespesasPorUF,
+    SugestaoOperadora,
+    MetricasPool
 )
 from app.services import OperadoraService, EstatisticasService
 from app.cache import cache_manager
@@ -29,21 +31,21 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 API iniciada com sucesso!")
     logger.info("📊 Conectando ao banco de dados...")
     try:
-        conn = get_db_connection()
-        conn.close()
+        await open_db_pool()
         logger.info("✅ Banco de dados conectado")
-    except HTTPException as http_e:
-        logger.error("❌ Erro HTTP ao conectar ao banco: %s", http_e.detail, exc_info=True)
-        raise RuntimeError(f"Erro de conexão (HTTP {http_e.status_code}): {http_e.detail}")
     except Exception as e:
         logger.error("❌ Erro ao conectar ao banco: %s", e, exc_info=True)
         raise RuntimeError("Não foi possível conectar ao banco de dados")
     
+    # Cada importação do Teste 3 termina com NOTIFY: o cache (contagens, estatísticas) é descartado
+    start_import_listener(cache_manager.clear)
+    
     yield
     logger.info("👋 API desligada")
+    await stop_import_listener()
 
     try:
-        close_db_pool()
+        await close_db_pool()
         logger.info("✅ Pool de conexões encerrado com sucesso")
     except Exception as e:
         logger.error("⚠️ Erro ao fechar o pool: %s", e, exc_info=True)
@@ -80,20 +82,26 @@ def root():
 
 # Lista operadoras com paginação e busca
 @app.get("/api/operadoras", response_model=OperadoraListResponse)
-def listar_operadoras(
+async def listar_operadoras(
     page: int = Query(1, ge=1, description="Número da página"),
     limit: int = Query(10, ge=1, le=100, description="Itens por página"),
     busca: Optional[str] = Query(
         None, 
         max_length=100,
         description="Busca por razão social ou CNPJ (máx. 100 caracteres)"
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        max_length=512,
+        description="meta.next_cursor da página anterior: paginação keyset, com latência constante em qualquer página (page fica só como rótulo)"
     )
 ):
     try:
-        return operadora_service.listar_operadoras(
+        return await operadora_service.listar_operadoras(
             page=page,
             limit=limit,
-            busca=busca
+            busca=busca,
+            cursor=cursor
         )
     except HTTPException:
         raise
@@ -101,13 +109,37 @@ def listar_operadoras(
         logger.error("❌ Erro ao listar operadoras: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar lista de operadoras")
 
+# Sugestões para o campo de busca (autocompletar). Declarada antes de /api/operadoras/{cnpj}
+@app.get("/api/operadoras/sugestoes", response_model=List[SugestaoOperadora])
+async def sugestoes_operadoras(
+    background_tasks: BackgroundTasks,
+    q: str = Query(..., min_length=1, max_length=100, description="Início ou trecho da razão social, CNPJ ou Registro ANS"),
+    limit: int = Query(8, ge=1, le=20, description="Máximo de sugestões")
+):
+    cache_key = f"sugestoes:{limit}:{q.strip().lower()}"
+    cached = cache_manager.get(cache_key)
+    background_tasks.add_task(cache_manager.cleanup_expired)
+
+    if cached is not None:
+        return cached
+
+    try:
+        sugestoes = await operadora_service.sugerir_operadoras(q, limit)
+        cache_manager.set(cache_key, sugestoes, ttl=CACHE_TTL_DEFAULT)
+        return sugestoes
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Erro ao buscar sugestões de operadoras: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro interno ao processar sugestões")
+
 # Retorna detalhes de uma operadora específica
 @app.get("/api/operadoras/{cnpj}", response_model=OperadoraDetailResponse)
-def detalhe_operadora(
+async def detalhe_operadora(
     cnpj: str = Path(..., pattern=r"^\d{14}$", description="CNPJ da operadora. A validação é estritamente de formato (14 dígitos numéricos).")
 ):
     try:
-        operadora = operadora_service.buscar_por_cnpj(cnpj)
+        operadora = await operadora_service.buscar_por_cnpj(cnpj)
         if not operadora:
             raise HTTPException(status_code=404, detail="Operadora não encontrada")
         return operadora
@@ -119,11 +151,11 @@ def detalhe_operadora(
 
 # Retorna histórico de despesas de uma operadora
 @app.get("/api/operadoras/{cnpj}/despesas", response_model=DespesasHistoricoResponse)
-def historico_despesas(
+async def historico_despesas(
     cnpj: str = Path(..., pattern=r"^\d{14}$", description="CNPJ da operadora. A validação é estritamente de formato (14 dígitos numéricos).")
 ):
     try:
-        historico = operadora_service.buscar_historico_despesas(cnpj)
+        historico = await operadora_service.buscar_historico_despesas(cnpj)
 
         if historico.get('operadora') is None:
             raise HTTPException(status_code=404, detail="Operadora não encontrada")
@@ -137,7 +169,7 @@ def historico_despesas(
 
 # Retorna estatísticas agregadas
 @app.get("/api/estatisticas", response_model=EstatisticasResponse)
-def estatisticas(background_tasks: BackgroundTasks):
+async def estatisticas(background_tasks: BackgroundTasks):
     cache_key = "estatisticas_gerais"
     cached = cache_manager.get(cache_key)
     background_tasks.add_task(cache_manager.cleanup_expired)
@@ -146,16 +178,18 @@ def estatisticas(background_tasks: BackgroundTasks):
         return cached
     
     try:
-        stats = estatisticas_service.calcular_estatisticas()
+        stats = await estatisticas_service.calcular_estatisticas()
         cache_manager.set(cache_key, stats, ttl=CACHE_TTL_DEFAULT)
         return stats
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("❌ Erro ao calcular estatísticas: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar estatísticas")
 
 # Retorna distribuição de despesas por UF (para gráfico)
 @app.get("/api/despesas-por-uf", response_model=DespesasPorUF)
-def despesas_por_uf(background_tasks: BackgroundTasks):
+async def despesas_por_uf(background_tasks: BackgroundTasks):
     cache_key = "despesas_por_uf"
     cached = cache_manager.get(cache_key)
     background_tasks.add_task(cache_manager.cleanup_expired)
@@ -164,13 +198,20 @@ def despesas_por_uf(background_tasks: BackgroundTasks):
         return cached
     
     try:
-        result = estatisticas_service.despesas_por_uf()
+        result = await estatisticas_service.despesas_por_uf()
         cache_manager.set(cache_key, result, ttl=CACHE_TTL_DEFAULT)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("❌ Erro ao calcular despesas por UF: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar despesas por UF")
 
+# Ocupação do pool de conexões e tempo de espera por conexão (monitoramento)
+@app.get("/api/metricas/pool", response_model=MetricasPool)
+async def metricas_pool():
+    return get_db_pool_metrics()
+
 if __name__ == "__main__":
     is_dev = os.getenv("DEBUG", "false").lower() == "true"
     uvicorn.run(
@@ -8,15 +8,27 @@ export function useOperadoras() {
   const loading = ref(false);
   const error = ref<string | null>(null);
 
+  // Cursor (keyset) que leva a cada página já alcançada, válido para a mesma busca e limite;
+  // páginas sem cursor conhecido usam offset
+  let cursores = new Map<number, string>();
+  let consultaCursores = "";
+
   async function carregarOperadoras(page: number = 1, limit: number = 10, busca?: string) {
     loading.value = true;
     error.value = null;
 
+    const consulta = `${limit}|${busca || ""}`;
+    if (consulta !== consultaCursores) {
+      cursores = new Map();
+      consultaCursores = consulta;
+    }
+
     try {
-      const response: PaginatedResponse<Operadora> = await apiService.listarOperadoras(page, limit, busca);
+      const response: PaginatedResponse<Operadora> = await apiService.listarOperadoras(page, limit, busca, cursores.get(page));
 
       operadoras.value = response.data;
       meta.value = response.meta;
+      if (response.meta.next_cursor) cursores.set(page + 1, response.meta.next_cursor);
     } catch (err) {
       error.value = err instanceof Error ? err.message : "Erro ao carregar operadoras";
       operadoras.value = [];
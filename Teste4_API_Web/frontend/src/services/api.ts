@@ -1,5 +1,5 @@
 import axios from "axios";
-import type { Operadora, OperadoraDetail, DespesasHistorico, Estatisticas, DespesasPorUF, PaginatedResponse } from "@/types";
+import type { Operadora, OperadoraDetail, DespesasHistorico, Estatisticas, DespesasPorUF, PaginatedResponse, SugestaoOperadora } from "@/types";
 import { useUI } from "@/composables/useUI";
 
 declare module "axios" {
@@ -85,14 +85,20 @@ api.interceptors.response.use(
 
 // Serviços da API
 export const apiService = {
-  async listarOperadoras(page: number = 1, limit: number = 10, busca?: string): Promise<PaginatedResponse<Operadora>> {
-    const params: { page: number; limit: number; busca?: string } = { page, limit };
+  async listarOperadoras(page: number = 1, limit: number = 10, busca?: string, cursor?: string): Promise<PaginatedResponse<Operadora>> {
+    const params: { page: number; limit: number; busca?: string; cursor?: string } = { page, limit };
     if (busca) params.busca = busca;
+    if (cursor) params.cursor = cursor;
 
     const { data } = await api.get("/api/operadoras", { params, showGlobalAlert: false });
     return data;
   },
 
+  async sugerirOperadoras(q: string, limit: number = 8): Promise<SugestaoOperadora[]> {
+    const { data } = await api.get("/api/operadoras/sugestoes", { params: { q, limit }, showGlobalAlert: false, showGlobalLoading: false });
+    return data;
+  },
+
   async buscarOperadora(cnpj: string): Promise<OperadoraDetail> {
     const { data } = await api.get(`/api/operadoras/${cnpj}`, { showGlobalAlert: false });
     return data;
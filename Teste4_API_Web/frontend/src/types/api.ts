@@ -1,10 +1,11 @@
 export interface PaginationMeta {
   page: number;
   limit: number;
-  total: number;
-  total_pages: number;
+  total: number | null;
+  total_pages: number | null;
   has_next: boolean;
   has_prev: boolean;
+  next_cursor?: string | null;
 }
 
 export interface PaginatedResponse<T> {
@@ -8,6 +8,12 @@ export interface Operadora {
   total_despesas?: number;
 }
 
+export interface SugestaoOperadora {
+  id: number;
+  cnpj: string;
+  razao_social: string;
+}
+
 export interface OperadoraDetail extends Operadora {
   data_cadastro: string | null;
   total_registros: number;
@@ -0,0 +1,3 @@
+"""
+Módulos compartilhados entre os pipelines dos Testes 1, 2 e 3
+"""
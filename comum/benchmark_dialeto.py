@@ -0,0 +1,73 @@
+import sys
+import time
+import tempfile
+import pandas as pd
+from pathlib import Path
+
+# Permite executar como script a partir de qualquer diretório: python comum/benchmark_dialeto.py
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from comum.dialeto import CacheDialetos, ENCODINGS, SEPARADORES, ler_amostra
+
+def leitura_legada(path):
+    # Loop original: até 9 parses completos (3 encodings x 3 separadores)
+    tentativas = 0
+    for enc in ENCODINGS:
+        for sep in SEPARADORES:
+            tentativas += 1
+            try:
+                df = pd.read_csv(path, sep=sep, encoding=enc, on_bad_lines='skip', low_memory=False, dtype=str)
+                if len(df.columns) > 1: return df, tentativas
+            except (UnicodeDecodeError, pd.errors.ParserError):
+                continue
+    return pd.DataFrame(), tentativas
+
+def leitura_com_dialeto(path, cache):
+    # Amostra única para detectar o dialeto e, no caso comum, um só parse completo
+    tentativas = 0
+    for dialeto in cache.candidatos(path.name, lambda: ler_amostra(path)):
+        tentativas += 1
+        try:
+            df = pd.read_csv(path, sep=dialeto.sep, encoding=dialeto.encoding, on_bad_lines='skip', low_memory=False, dtype=str)
+            if len(df.columns) > 1:
+                cache.registrar(path.name, dialeto)
+                return df, tentativas
+        except (UnicodeDecodeError, pd.errors.ParserError):
+            continue
+    return pd.DataFrame(), tentativas
+
+def gerar_arquivo(path, linhas, sep, inicio_acentos):
+    # Demonstração contábil sintética em latin-1: cabeçalho ASCII (como nos arquivos da ANS) e
+    # descrições acentuadas a partir da fração `inicio_acentos` do arquivo
+    cabecalho = sep.join(['DATA', 'REG_ANS', 'CD_CONTA_CONTABIL', 'DESCRICAO', 'VL_SALDO_INICIAL', 'VL_SALDO_FINAL'])
+    primeira_acentuada = int(linhas * inicio_acentos)
+    with open(path, 'w', encoding='iso-8859-1', newline='\n') as f:
+        f.write(cabecalho + '\n')
+        for i in range(linhas):
+            descricao = 'CONTRAPRESTAÇÕES DE ASSISTÊNCIA' if i >= primeira_acentuada else 'EVENTOS CONHECIDOS OU AVISADOS'
+            f.write(sep.join(['2024-01-01', f'{100000 + i % 1000}', '411111', descricao, f'{i},50', f'{i * 2},75']) + '\n')
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    df, tentativas = funcao(*args)
+    return time.perf_counter() - inicio, tentativas, len(df)
+
+if __name__ == "__main__":
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    inicio_acentos = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    with tempfile.TemporaryDirectory() as tmp:
+        for nome, sep in [('latin1_ponto_virgula.csv', ';'), ('latin1_tab.csv', '\t')]:
+            path = Path(tmp) / nome
+            gerar_arquivo(path, linhas, sep, inicio_acentos)
+            tamanho_mb = path.stat().st_size / (1024 * 1024)
+            path.read_bytes()  # aquece o cache de páginas do SO para não favorecer a segunda medição
+
+            t_legado, n_legado, l_legado = medir(leitura_legada, path)
+            cache = CacheDialetos()
+            t_novo, n_novo, l_novo = medir(leitura_com_dialeto, path, cache)
+            t_cache, n_cache, _ = medir(leitura_com_dialeto, path, cache)
+            assert l_legado == l_novo, "As duas leituras devem produzir o mesmo número de linhas"
+
+            print(f"\n{nome} ({linhas} linhas, {tamanho_mb:.1f} MB, acentos a partir de {inicio_acentos:.0%} do arquivo)")
+            print(f"  Loop legado:       {t_legado:6.2f}s ({n_legado} parse(s))")
+            print(f"  Dialeto detectado: {t_novo:6.2f}s ({n_novo} parse(s)) -> {t_legado / t_novo:.1f}x")
+            print(f"  Dialeto em cache:  {t_cache:6.2f}s ({n_cache} parse(s)) -> {t_legado / t_cache:.1f}x")
@@ -0,0 +1,179 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import requests
+from bs4 import BeautifulSoup
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from comum.dialeto import lock_arquivo
+
+logger = logging.getLogger(__name__)
+
+DOMINIO_ANS = "dadosabertos.ans.gov.br"
+URL_CADASTRO_COMPLETO = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude/"
+URL_CADASTRO_ATIVAS = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
+
+# Uma listagem de diretório nunca chega perto disso; protege contra respostas inesperadas
+MAX_BYTES_LISTAGEM = 5 * 1024 * 1024
+
+# Diretório padrão do cache: resolvido a partir da raiz do repositório (o pai de comum/), e não do diretório de
+# trabalho, para que o Teste 2 e o pre_import.py do Teste 3 usem o mesmo cache. Nos containers, comum/ fica em
+# /app/comum e o volume compartilhado é montado em /app/cache_cadastro
+DIR_CACHE_PADRAO = Path(__file__).resolve().parent.parent / "cache_cadastro"
+
+def diretorio_cache() -> Path:
+    # CACHE_CADASTRO_DIR sobrepõe o padrão
+    return Path(os.getenv("CACHE_CADASTRO_DIR") or DIR_CACHE_PADRAO)
+
+class CacheCadastro:
+    # Cache local do cadastro de operadoras, compartilhado pelo Teste 2 e pelo pre_import.py do Teste 3.
+    # Cada resposta (listagem ou CSV) é guardada em objetos/<sha256>, e indice.json associa a URL ao hash
+    # e aos validadores HTTP (ETag/Last-Modified). Numa execução repetida, o servidor responde 304 e
+    # nenhum byte de conteúdo é transferido.
+
+    def __init__(self, diretorio=None, dominio: str = DOMINIO_ANS, timeout_busca: int = 60, timeout_download: int = 300):
+        self.diretorio = Path(diretorio) if diretorio else diretorio_cache()
+        self.objetos = self.diretorio / "objetos"
+        self.objetos.mkdir(parents=True, exist_ok=True)
+        self.caminho_indice = self.diretorio / "indice.json"
+        self.dominio = dominio
+        self.timeout_busca = timeout_busca
+        self.timeout_download = timeout_download
+        self._lock = threading.Lock()
+        self._indice: Dict[str, dict] = self._ler()
+
+    def _ler(self) -> Dict[str, dict]:
+        if not self.caminho_indice.exists(): return {}
+        try:
+            return json.loads(self.caminho_indice.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice do cache do cadastro ignorado: {e}")
+            return {}
+
+    @contextmanager
+    def _travado(self):
+        # O diretório é compartilhado pelo Teste 2 e pelo pre_import.py do Teste 3, que podem rodar ao mesmo tempo:
+        # índice, objetos e limpeza só mudam sob lock entre threads e entre processos
+        with self._lock, lock_arquivo(self.diretorio / "indice.json.lock"):
+            yield
+
+    def obter(self, urls_listagem: Iterable[str], destino, max_bytes: int) -> Optional[Path]:
+        # Copia para `destino` o CSV mais recente da primeira listagem que responder; None se todas falharem
+        destino = Path(destino)
+        for tentativa, url_base in enumerate(urls_listagem, 1):
+            try:
+                _, listagem = self.baixar(url_base, MAX_BYTES_LISTAGEM, self.timeout_busca, Path.read_bytes)
+                soup = BeautifulSoup(listagem, 'html.parser')
+                links = sorted(urljoin(url_base, a['href']) for a in soup.find_all('a', href=True) if a['href'].endswith('.csv'))
+                if not links: continue
+
+                url_csv = links[-1]
+                # Validação estrita do domínio (netloc)
+                if urlparse(url_csv).netloc != self.dominio:
+                    logger.warning(f"URL de download bloqueada (domínio não autorizado): {url_csv}")
+                    continue
+
+                self.baixar(url_csv, max_bytes, self.timeout_download, lambda objeto: self._materializar(objeto, destino))
+                return destino
+            except Exception as e:
+                logger.warning(f"Falha na tentativa {tentativa} ({url_base}): {e}")
+        return None
+
+    def baixar(self, url: str, max_bytes: int, timeout: int, consumir: Optional[Callable[[Path], Any]] = None) -> Tuple[str, Any]:
+        # GET condicional: com 304, reaproveita o objeto em cache; senão grava o conteúdo calculando o hash em streaming.
+        # `consumir(objeto)` roda sob o lock, antes que outro processo possa substituir e remover o objeto; o retorno
+        # é (sha256, resultado de consumir), ou (sha256, objeto) sem ele
+        with self._travado():
+            # Entradas gravadas por outros processos desde a última leitura
+            self._indice = {**self._indice, **self._ler()}
+        entrada = self._indice.get(url)
+        objeto = self.objetos / entrada['sha256'] if entrada else None
+        headers = {}
+        if objeto is not None and objeto.exists():
+            if entrada.get('etag'): headers['If-None-Match'] = entrada['etag']
+            if entrada.get('last_modified'): headers['If-Modified-Since'] = entrada['last_modified']
+
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            inalterado = r.status_code == 304 and bool(headers)
+            if inalterado:
+                if entrada['tamanho'] > max_bytes:
+                    raise ValueError(f"Arquivo excede o limite de segurança ({max_bytes} bytes).")
+                with self._travado():
+                    if objeto.exists():
+                        logger.info(f"Inalterado no servidor (cache): {url.split('/')[-1] or url}")
+                        return entrada['sha256'], consumir(objeto) if consumir else objeto
+            else:
+                r.raise_for_status()
+                logger.info(f"Baixando: {url.split('/')[-1] or url}")
+                sha256, tamanho, tmp = self._gravar_objeto(r.iter_content(chunk_size=64 * 1024), max_bytes)
+                novo = {
+                    'sha256': sha256,
+                    'tamanho': tamanho,
+                    'etag': r.headers.get('ETag', ''),
+                    'last_modified': r.headers.get('Last-Modified', ''),
+                }
+
+        if inalterado:
+            # Outro processo trocou a versão em cache desde a leitura do índice: nova consulta com o índice atual
+            return self.baixar(url, max_bytes, timeout, consumir)
+
+        with self._travado():
+            # O objeto só recebe o nome final junto com a entrada no índice: a limpeza de outro processo nunca o vê
+            # sem referência
+            objeto = self.objetos / sha256
+            tmp.replace(objeto)
+            self._indice = {**self._indice, **self._ler(), url: novo}
+            self._persistir()
+            self._remover_orfaos()
+            return sha256, consumir(objeto) if consumir else objeto
+
+    def _gravar_objeto(self, partes, max_bytes: int) -> Tuple[str, int, Path]:
+        # Grava o conteúdo num temporário próprio do processo e da thread, devolvendo hash, tamanho e o temporário
+        h = hashlib.sha256()
+        tamanho = 0
+        tmp = self.objetos / f".download-{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                for parte in partes:
+                    if not parte: continue
+                    tamanho += len(parte)
+                    if tamanho > max_bytes:
+                        raise ValueError(f"Arquivo excede o limite de segurança ({max_bytes} bytes).")
+                    h.update(parte)
+                    f.write(parte)
+            return h.hexdigest(), tamanho, tmp
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def _materializar(self, objeto: Path, destino: Path):
+        # Cópia (e não hardlink): quem consome o destino pode sobrescrevê-lo sem corromper o cache
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+        shutil.copyfile(objeto, tmp)
+        tmp.replace(destino)
+
+    def _remover_orfaos(self):
+        # Versões antigas do cadastro deixam de ser referenciadas quando o servidor publica uma nova.
+        # Chamado sob o lock, com o índice já mesclado com o de disco
+        referenciados = {e['sha256'] for e in self._indice.values()}
+        for objeto in self.objetos.iterdir():
+            if objeto.name not in referenciados and not objeto.name.endswith('.tmp'):
+                objeto.unlink(missing_ok=True)
+
+    def _persistir(self):
+        # Escrita atômica, chamada sob o lock
+        tmp = self.caminho_indice.with_name(f"{self.caminho_indice.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(self._indice, indent=2, ensure_ascii=False), encoding='utf-8')
+            tmp.replace(self.caminho_indice)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o índice do cache do cadastro: {e}")
+        finally:
+            tmp.unlink(missing_ok=True)
@@ -0,0 +1,146 @@
+import io
+import mmap
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Layout do consolidado de despesas produzido pelo Teste 1
+COLUNAS = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas', 'StatusValidacao']
+PARTICOES = ['Ano', 'Trimestre']
+
+# Colunas gravadas nos ficheiros Parquet (Ano/Trimestre ficam no caminho: Ano=2024/Trimestre=03)
+ESQUEMA_ARQUIVO = pa.schema([
+    ('CNPJ', pa.string()),
+    ('RazaoSocial', pa.string()),
+    ('ValorDespesas', pa.float64()),
+    # Poucos valores distintos em milhões de linhas: dicionário em vez de strings repetidas
+    ('StatusValidacao', pa.dictionary(pa.int32(), pa.string())),
+])
+ESQUEMA_PARTICOES = pa.schema([('Ano', pa.string()), ('Trimestre', pa.string())])
+
+def eh_parquet(caminho) -> bool:
+    # Dataset particionado (diretório) ou ficheiro .parquet isolado
+    caminho = Path(caminho)
+    return caminho.is_dir() or caminho.suffix.lower() == '.parquet'
+
+def _dataset(caminho):
+    return ds.dataset(str(caminho), format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICOES, flavor='hive'))
+
+def diretorio_particao(raiz, ano, trimestre) -> Path:
+    return Path(raiz) / f"Ano={ano}" / f"Trimestre={str(trimestre).zfill(2)}"
+
+def csv_para_parquet(parcial_csv, raiz, ano, trimestre, nome: str, bloco_bytes: int = 16 * 1024 * 1024) -> Optional[Path]:
+    # Converte um CSV parcial (sem cabeçalho, colunas em COLUNAS) num ficheiro da partição Ano/Trimestre.
+    # A leitura é feita em blocos, então a memória não depende do tamanho do parcial.
+    parcial_csv = Path(parcial_csv)
+    if not parcial_csv.exists() or parcial_csv.stat().st_size == 0: return None
+
+    destino_dir = diretorio_particao(raiz, ano, trimestre)
+    destino_dir.mkdir(parents=True, exist_ok=True)
+    destino = destino_dir / f"{nome}.parquet"
+    tmp = destino.with_name(destino.name + '.tmp')
+
+    leitor = pa_csv.open_csv(
+        parcial_csv,
+        read_options=pa_csv.ReadOptions(column_names=COLUNAS, block_size=bloco_bytes),
+        # Campos entre aspas podem conter quebras de linha (razão social em segmentos antigos)
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={campo.name: campo.type for campo in ESQUEMA_ARQUIVO},
+            include_columns=ESQUEMA_ARQUIVO.names,
+            strings_can_be_null=False,
+        ),
+    )
+    with pq.ParquetWriter(tmp, ESQUEMA_ARQUIVO, compression='snappy') as escritor:
+        for lote in leitor:
+            escritor.write_batch(lote)
+    tmp.replace(destino)
+    return destino
+
+def arquivos_parquet(raiz) -> List[Path]:
+    return sorted(Path(raiz).rglob('*.parquet'))
+
+def marcar_status(raiz, cnpjs, status: str, arquivos: Optional[List[Path]] = None) -> int:
+    # Define StatusValidacao=status para os CNPJs informados, reescrevendo apenas os ficheiros afetados
+    # (entre `arquivos`, ou em todo o dataset). Retorna o número de ficheiros reescritos.
+    alvo = pa.array(sorted(cnpjs), type=pa.string())
+    reescritos = 0
+    for arquivo in arquivos if arquivos is not None else arquivos_parquet(raiz):
+        cnpj_col = pq.read_table(arquivo, columns=['CNPJ']).column('CNPJ')
+        if not pc.any(pc.is_in(cnpj_col, value_set=alvo)).as_py(): continue
+
+        tmp = arquivo.with_name(arquivo.name + '.tmp')
+        with pq.ParquetWriter(tmp, ESQUEMA_ARQUIVO, compression='snappy') as escritor:
+            for lote in pq.ParquetFile(arquivo).iter_batches(columns=ESQUEMA_ARQUIVO.names):
+                mascara = pc.fill_null(pc.is_in(lote.column('CNPJ'), value_set=alvo), False)
+                novo = pc.if_else(mascara, status, lote.column('StatusValidacao').cast(pa.string()))
+                colunas = lote.columns[:-1] + [novo.dictionary_encode()]
+                escritor.write_batch(pa.RecordBatch.from_arrays(colunas, schema=ESQUEMA_ARQUIVO))
+        tmp.replace(arquivo)
+        reescritos += 1
+    return reescritos
+
+def iterar_consolidado(caminho, colunas: Optional[List[str]] = None, chunksize: int = 100000, dtype=None) -> Iterator[pd.DataFrame]:
+    # Itera o consolidado em chunks, em CSV ou Parquet, lendo apenas as colunas pedidas
+    if eh_parquet(caminho):
+        colunas = colunas or COLUNAS
+        for lote in _dataset(caminho).to_batches(columns=colunas, batch_size=chunksize):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(caminho, chunksize=chunksize, usecols=colunas, dtype=dtype)
+
+def blocos_consolidado(caminho, linhas_por_bloco: int = 100000) -> List[Tuple]:
+    # Divide o consolidado em blocos contíguos, na ordem do ficheiro, que ler_bloco_consolidado lê de forma
+    # independente (noutro processo): grupos de linhas dos ficheiros Parquet ou intervalos de bytes do CSV com
+    # cerca de linhas_por_bloco linhas. O CSV é cortado só em fins de linha fora de aspas, sem ser interpretado.
+    if eh_parquet(caminho):
+        return [(fragmento.path, grupo.id) for fragmento in _dataset(caminho).get_fragments() for grupo in fragmento.row_groups]
+
+    with open(caminho, 'rb') as f:
+        inicio = len(f.readline())
+        tamanho = f.seek(0, 2)
+        if tamanho <= inicio: return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            amostra = dados[inicio:inicio + 2 ** 20]
+            passo = max(1, int(len(amostra) / max(amostra.count(b'\n'), 1) * linhas_por_bloco))
+            # Posições das aspas, em fatias para não criar uma cópia do ficheiro inteiro
+            aspas = np.concatenate([np.flatnonzero(np.frombuffer(dados[i:i + 2 ** 26], dtype=np.uint8) == ord('"')) + i
+                                    for i in range(0, tamanho, 2 ** 26)])
+            limites = [inicio]
+            while limites[-1] + passo < tamanho:
+                fim = dados.find(b'\n', limites[-1] + passo)
+                while fim != -1 and np.searchsorted(aspas, fim) % 2:
+                    fim = dados.find(b'\n', fim + 1)
+                if fim == -1 or fim + 1 >= tamanho: break
+                limites.append(fim + 1)
+    return list(zip(limites, limites[1:] + [tamanho]))
+
+def ler_bloco_consolidado(caminho, bloco: Tuple, colunas: Optional[List[str]] = None, dtype=None) -> pd.DataFrame:
+    # Lê um bloco de blocos_consolidado com as mesmas colunas e tipos de iterar_consolidado
+    if eh_parquet(caminho):
+        ficheiro, grupo = bloco
+        dataset = _dataset(caminho)
+        fragmento = next(f for f in dataset.get_fragments() if f.path == ficheiro)
+        return fragmento.subset(row_group_ids=[grupo]).to_table(schema=dataset.schema, columns=colunas or COLUNAS).to_pandas()
+
+    inicio, fim = bloco
+    with open(caminho, 'rb') as f:
+        cabecalho = f.readline()
+        f.seek(inicio)
+        dados = f.read(fim - inicio)
+    return pd.read_csv(io.BytesIO(cabecalho + dados), usecols=colunas, dtype=dtype)
+
+def ler_consolidado(caminho, colunas: Optional[List[str]] = None, dtype=None) -> pd.DataFrame:
+    # Carrega o consolidado inteiro (CSV ou Parquet), lendo apenas as colunas pedidas
+    if eh_parquet(caminho):
+        return _dataset(caminho).to_table(columns=colunas or COLUNAS).to_pandas()
+    return pd.read_csv(caminho, usecols=colunas, dtype=dtype)
@@ -0,0 +1,142 @@
+import os
+import re
+import csv
+import json
+import codecs
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows (execução local fora do Docker)
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Ordem de preferência herdada das leituras originais dos pipelines
+ENCODINGS = ('utf-8', 'iso-8859-1', 'cp1252')
+SEPARADORES = (';', ',', '\t')
+AMOSTRA_BYTES = 64 * 1024
+
+@dataclass(frozen=True)
+class Dialeto:
+    encoding: str
+    sep: str
+
+def detectar_dialeto(amostra: bytes) -> Optional[Dialeto]:
+    # Escolhe encoding e separador a partir dos primeiros KB do arquivo, sem parse completo
+    for encoding in ENCODINGS:
+        try:
+            # Decoder incremental tolera um caractere multibyte cortado no fim da amostra
+            texto = codecs.getincrementaldecoder(encoding)().decode(amostra, final=False)
+        except UnicodeDecodeError:
+            continue
+
+        linhas = texto.splitlines()
+        if not linhas: return None
+        cabecalho = linhas[0]
+        for sep in SEPARADORES:
+            if len(next(csv.reader([cabecalho], delimiter=sep))) > 1:
+                return Dialeto(encoding, sep)
+        return None
+    return None
+
+@contextmanager
+def lock_arquivo(caminho: Path):
+    # Lock exclusivo entre processos, mantido num ficheiro auxiliar enquanto o bloco executa
+    with open(caminho, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def chave_padrao(nome: str) -> str:
+    # Agrupa arquivos da mesma fonte: '1T2024.csv' e '3T2023.csv' compartilham a chave '#t#.csv'
+    return re.sub(r'\d+', '#', Path(nome).name.lower())
+
+class CacheDialetos:
+    # Cache de dialetos por padrão de nome de arquivo, opcionalmente persistido em JSON
+
+    def __init__(self, caminho: Optional[Path] = None):
+        self.caminho = Path(caminho) if caminho else None
+        self._dialetos: Dict[str, Dialeto] = {}
+        self._lock = threading.Lock()
+        if self.caminho: self._dialetos = self._ler()
+
+    def _ler(self) -> Dict[str, Dialeto]:
+        if not self.caminho.exists(): return {}
+        try:
+            dados = json.loads(self.caminho.read_text(encoding='utf-8'))
+            return {k: Dialeto(**v) for k, v in dados.items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Cache de dialetos ignorado ({self.caminho}): {e}")
+            return {}
+
+    def obter(self, nome: str) -> Optional[Dialeto]:
+        with self._lock:
+            return self._dialetos.get(chave_padrao(nome))
+
+    def registrar(self, nome: str, dialeto: Dialeto):
+        chave = chave_padrao(nome)
+        with self._lock:
+            if self._dialetos.get(chave) == dialeto: return
+            self._dialetos[chave] = dialeto
+            self._persistir(chave)
+
+    def _persistir(self, chave: str):
+        # Escrita atômica: outro processo nunca lê um JSON pela metade. Os workers de parse (processos) partilham o
+        # ficheiro: sob lock, as entradas que os outros gravaram são incorporadas antes da escrita, e só a chave
+        # registada agora sobrepõe a versão em disco
+        if not self.caminho: return
+        tmp = self.caminho.with_name(f"{self.caminho.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with lock_arquivo(self.caminho.with_name(self.caminho.name + '.lock')):
+                self._dialetos = {**self._dialetos, **self._ler(), chave: self._dialetos[chave]}
+                tmp.write_text(json.dumps({k: vars(v) for k, v in self._dialetos.items()}, indent=2), encoding='utf-8')
+                tmp.replace(self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o cache de dialetos: {e}")
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def candidatos(self, nome: str, obter_amostra: Callable[[], bytes]) -> List[Dialeto]:
+        # Dialeto detectado na amostra primeiro; demais combinações apenas como fallback. A amostra é sempre lida:
+        # o cache vale para um padrão de nome (vários trimestres, ou sempre o mesmo nome local), e um ficheiro UTF-8
+        # lido com o latin-1 de outro trimestre não dá erro, só texto corrompido. O dialeto em cache só desempata
+        # o que a amostra não decide: iso-8859-1 x cp1252 quando o UTF-8 falha, ou tudo quando não há amostra
+        em_cache = self.obter(nome)
+        preferido = None
+        try:
+            preferido = detectar_dialeto(obter_amostra())
+        except OSError as e:
+            logger.warning(f"Amostra indisponível para {nome}: {e}")
+        if preferido is None:
+            preferido = em_cache
+        elif em_cache is not None and 'utf-8' not in (preferido.encoding, em_cache.encoding):
+            preferido = Dialeto(em_cache.encoding, preferido.sep)
+        todos = [Dialeto(enc, sep) for enc in ENCODINGS for sep in SEPARADORES]
+        if preferido is None: return todos
+        # Se o preferido falhar no meio do arquivo (ex.: byte latin-1 após a amostra), o mesmo separador
+        # com os encodings seguintes é o fallback mais provável
+        restantes = sorted((d for d in todos if d != preferido), key=lambda d: d.sep != preferido.sep)
+        return [preferido] + restantes
+
+def ler_amostra(path, tamanho: int = AMOSTRA_BYTES) -> bytes:
+    # Lê apenas o início do arquivo para a detecção do dialeto
+    with open(path, 'rb') as f:
+        return f.read(tamanho)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+# Representação compacta em memória dos DataFrames do consolidado (Teste 1) e das suas etapas no Teste 2.
+# Identificadores, razões sociais, UFs e status têm poucos valores distintos em milhões de linhas:
+# como categóricas, cada linha guarda um código inteiro em vez de um objeto str do Python.
+COLUNAS_CATEGORICAS = [
+    'CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'StatusValidacao', 'UF',
+    'ValidacaoCNPJ', 'ValidacaoValor', 'ValidacaoRazao', 'StatusEnriquecimento',
+]
+
+# Colunas que podem ser categóricas já na leitura do CSV. Ano/Trimestre ficam de fora: precisam da
+# inferência numérica do pandas ('03' -> 3) antes da conversão, para manter a mesma saída.
+COLUNAS_CATEGORICAS_LEITURA = ['CNPJ', 'RazaoSocial', 'StatusValidacao']
+
+# float64: comportamento original. centavos: inteiros (Int64) em centavos, somas exatas em qualquer ordem
+MODOS_VALOR = ('float64', 'centavos')
+
+def dtypes_leitura(colunas: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    # dtype para read_csv / iterar_consolidado: categórico onde possível, str nas demais colunas pedidas
+    colunas = list(colunas) if colunas is not None else COLUNAS_CATEGORICAS_LEITURA
+    return {c: 'category' if c in COLUNAS_CATEGORICAS_LEITURA else str for c in colunas}
+
+def compactar(df: pd.DataFrame, colunas: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    # Converte para categórica (no próprio DataFrame) as colunas do esquema que ainda não são
+    for col in colunas if colunas is not None else COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+def atribuir(serie: pd.Series, mascara, valores) -> pd.Series:
+    # Equivalente a serie[mascara] = valores que aceita categorias novas numa coluna categórica
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        novas = pd.Index(pd.unique(np.asarray(valores, dtype=object)[pd.notna(valores)])).difference(serie.cat.categories)
+        if len(novas): serie = serie.cat.add_categories(novas)
+    serie = serie.copy()
+    serie[mascara] = valores
+    return serie
+
+def converter_valores(serie: pd.Series, modo: str = 'float64') -> pd.Series:
+    # Valores monetários no modo pedido; texto inválido vira nulo (NaN / <NA>)
+    if modo not in MODOS_VALOR:
+        raise ValueError(f"Modo de valores inválido: {modo!r}. Use um de {MODOS_VALOR}.")
+    valores = pd.to_numeric(serie, errors='coerce')
+    if modo == 'float64': return valores
+    return pd.Series(np.round(valores.astype('float64') * 100), index=serie.index).astype('Int64')
+
+def valores_em_reais(serie: pd.Series, modo: str = 'float64') -> pd.Series:
+    # Inverso de converter_valores para escrita: centavos voltam a reais (float64, NaN para nulos)
+    if modo != 'centavos': return serie
+    return serie.astype('Float64').div(100).astype('float64')
+
+def uso_memoria(df: pd.DataFrame) -> pd.Series:
+    # Bytes por coluna, contando o conteúdo das strings (deep=True)
+    return df.memory_usage(deep=True, index=False)
+
+def relatorio_memoria(antes: pd.DataFrame, depois: pd.DataFrame) -> str:
+    # Tabela coluna a coluna com o consumo antes e depois da compactação
+    a, d = uso_memoria(antes), uso_memoria(depois)
+    linhas = [f"{'Coluna':<22}{'Tipo antes':>14}{'Antes (MB)':>12}{'Tipo depois':>14}{'Depois (MB)':>13}"]
+    for col in a.index.union(d.index, sort=False):
+        tipo_a = str(antes[col].dtype) if col in antes.columns else '-'
+        tipo_d = str(depois[col].dtype) if col in depois.columns else '-'
+        linhas.append(f"{col:<22}{tipo_a:>14}{a.get(col, 0) / 2**20:>12.1f}{tipo_d:>14}{d.get(col, 0) / 2**20:>13.1f}")
+    linhas.append(f"{'Total':<22}{'':>14}{a.sum() / 2**20:>12.1f}{'':>14}{d.sum() / 2**20:>13.1f}"
+                  f"  ({a.sum() / max(d.sum(), 1):.1f}x menor)")
+    return "\n".join(linhas)